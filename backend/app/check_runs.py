@@ -1,11 +1,15 @@
 import asyncio
-import json
-import uuid
-from datetime import datetime, timezone
-from typing import Any, Dict
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+import orjson
 
 from .config import settings
-from .incidents import insert_incident
+from .db import get_writer
+from .incidents import incident_card, insert_incidents_batch, new_incident_id
 from .incident_fields import apply_incident_fields
 from .github import GitHubClient
 from .poll_events import RECENT_REPOS
@@ -17,12 +21,43 @@ from .services.signal_pipeline import process_run_logs_for_signals
 from .services.osv_enrichment import maybe_enqueue_enrichment
 from .types.signal import RunContext
 
-FAIL_CONCLUSIONS = {"failure", "timed_out"}
+logger = logging.getLogger(__name__)
+
+FAIL_CONCLUSIONS = frozenset({"failure", "timed_out"})
+# stable query order for the per-conclusion run listings, computed once
+FAIL_CONCLUSIONS_ORDERED = tuple(sorted(FAIL_CONCLUSIONS))
+# runs created before the last check can still complete after it, so look back a bit
+RUNS_LOOKBACK = timedelta(hours=settings.RUNS_LOOKBACK_HOURS)
+
+# (full_name, owner, repo) for every well-formed HIGH_TRAFFIC_REPOS entry
+HIGH_TRAFFIC_SPLIT = [(full, *full.split("/", 1)) for full in settings.HIGH_TRAFFIC_REPOS if "/" in full]
+
+LOG_WORKERS = 2
+LOG_QUEUE_SIZE = 100
+
+# recently handled run ids, so known runs skip the INSERT round trip entirely
+SEEN_RUN_IDS: "OrderedDict[int, None]" = OrderedDict()
+SEEN_RUN_IDS_MAX = 10000
+
+def _mark_seen(run_id: int) -> None:
+    SEEN_RUN_IDS[run_id] = None
+    SEEN_RUN_IDS.move_to_end(run_id)
+    while len(SEEN_RUN_IDS) > SEEN_RUN_IDS_MAX:
+        SEEN_RUN_IDS.popitem(last=False)
+
+async def _prime_seen_run_ids(db_path: str) -> None:
+    rows = await get_writer(db_path).fetchall(
+        "SELECT run_id FROM incidents ORDER BY inserted_at DESC LIMIT ?",
+        (SEEN_RUN_IDS_MAX,),
+    )
+    # oldest first so the newest end up most recently used
+    for (run_id,) in reversed(rows):
+        _mark_seen(run_id)
 
 def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
-def run_to_incident(run: Dict[str, Any], repo_full_name: str) -> Dict[str, Any]:
+def run_to_incident(run: Dict[str, Any], repo_full_name: str, detected_at: Optional[str] = None) -> Dict[str, Any]:
     run_id = int(run["id"])
     workflow_name = run.get("name") or run.get("workflow_name")
     conclusion = run.get("conclusion")
@@ -36,12 +71,12 @@ def run_to_incident(run: Dict[str, Any], repo_full_name: str) -> Dict[str, Any]:
     evidence = {
         "repo": repo_full_name,
         "run": run,
-        "detected_at": now_iso(),
+        "detected_at": detected_at or now_iso(),
         "source": "actions_runs",
     }
 
     return {
-        "incident_id": str(uuid.uuid4()),
+        "incident_id": new_incident_id(),
         "kind": "workflow_failure",
         "run_id": run_id,
         "dedupe_key": None,
@@ -54,8 +89,8 @@ def run_to_incident(run: Dict[str, Any], repo_full_name: str) -> Dict[str, Any]:
         "created_at": run.get("created_at"),
         "updated_at": run.get("updated_at"),
         "title": title,
-        "tags_json": json.dumps(tags),
-        "evidence_json": json.dumps(evidence),
+        "tags_json": orjson.dumps(tags).decode(),
+        "evidence_json": orjson.dumps(evidence).decode(),
         # also return these parsed for SSE card convenience
         "_tags": tags,
         "_evidence": evidence,
@@ -63,118 +98,188 @@ def run_to_incident(run: Dict[str, Any], repo_full_name: str) -> Dict[str, Any]:
 
 async def check_runs_loop(
     broadcaster: IncidentBroadcaster,
+    gh: GitHubClient,
     summary_queue: SummaryQueue,
     enrichment_queue,
     correlator,
     plugins,
 ):
     print("[runs] loop started")
-    gh = GitHubClient(settings.GITHUB_TOKEN)
     scheduler = RepoScheduler(settings.HIGH_TRAFFIC_REPOS, min_interval_seconds=30)
     log_fetcher = RunLogFetcher(gh, per_minute=settings.LOG_FETCH_PER_MIN)
     
-    while True:
-        # feed scheduler from the live RECENT_REPOS buffer
-        # (copy snapshot to avoid weirdness)
-        #recent_snapshot = RECENT_REPOS[-50:]
-        #for r in recent_snapshot:
-            #scheduler.add_recent_repo(r)
-
-        #repos = scheduler.next_batch(settings.MAX_REPOS_PER_CYCLE)
-        repos = settings.HIGH_TRAFFIC_REPOS[: settings.MAX_REPOS_PER_CYCLE]
-        print("[runs] checking HIGH_TRAFFIC only:", repos)
-
-        #print(f"[runs] cycle checking {len(repos)} repos: {repos[:3]}{'...' if len(repos)>3 else ''}")
-
-        emitted = 0
-        
-        for repo_full_name in repos:
-            if "/" not in repo_full_name:
-                continue
-            owner, repo = repo_full_name.split("/", 1)
+    try:
+        await _prime_seen_run_ids(settings.DB_PATH)
+    except Exception as e:
+        logger.warning("seen-run cache priming failed: %s", type(e).__name__)
 
+    sem = asyncio.Semaphore(settings.GH_CONCURRENCY)
+    last_checked: Dict[str, datetime] = {}
+
+    async def scan_repo(repo_full_name: str, owner: str, repo: str, detected_at: str) -> Optional[Dict[str, Any]]:
+        # returns the repo's newest failing run as an incident (v1: one card per repo per cycle)
+
+        async with sem:
             try:
-                data = await gh.list_workflow_runs(owner, repo, per_page=settings.RUNS_PER_REPO)
-                runs = data.get("workflow_runs", []) or []
-
-                for run in runs:
-                    if run.get("conclusion") in FAIL_CONCLUSIONS:
-                        inc = run_to_incident(run, repo_full_name)
-                        apply_incident_fields(inc)
-                        head_sha = run.get("head_sha")
-                        if head_sha:
-                            try:
-                                checks = await gh.get_check_runs(owner, repo, head_sha)
-                                check_runs = []
-                                for c in checks.get("check_runs", [])[:5]:
-                                    check_runs.append({
-                                        "name": c.get("name"),
-                                        "conclusion": c.get("conclusion"),
-                                        "started_at": c.get("started_at"),
-                                        "completed_at": c.get("completed_at"),
-                                    })
-                                inc["_evidence"]["check_runs"] = check_runs
-                                inc["evidence_json"] = json.dumps(inc["_evidence"])
-                            except Exception as e:
-                                print(f"[runs] check-runs fetch failed: {type(e).__name__}")
-
-                        inserted = await insert_incident(settings.DB_PATH, inc)
-                        if inserted:
-                            card = {
-                                "incident_id": inc["incident_id"],
-                                "kind": inc["kind"],
-                                "repo_full_name": inc["repo_full_name"],
-                                "title": inc["title"],
-                                "workflow_name": inc["workflow_name"],
-                                "run_id": inc["run_id"],
-                                "run_number": inc["run_number"],
-                                "conclusion": inc["conclusion"],
-                                "status": inc["status"],
-                                "html_url": inc["html_url"],
-                                "created_at": inc["created_at"],
-                                "tags": inc["_tags"],
-                                "evidence": inc["_evidence"],
-                                "scope": inc.get("scope"),
-                                "surface": inc.get("surface"),
-                                "actor": inc.get("actor"),
-                            }
-                            await broadcaster.publish(card)
-                            await summary_queue.enqueue(inc["incident_id"])
-                            await maybe_enqueue_enrichment(inc, enrichment_queue, settings.DB_PATH)
-                            emitted += 1
-
-                        run_ctx = RunContext(
-                            repo_full_name=repo_full_name,
-                            owner=owner,
-                            run_id=inc["run_id"],
-                            html_url=inc["html_url"],
-                            workflow_name=inc["workflow_name"],
-                            conclusion=inc["conclusion"],
-                            updated_at=inc["updated_at"],
-                        )
-                        logs = await log_fetcher.fetch_run_logs(owner, repo, inc["run_id"]) or []
-                        if logs:
-                            await process_run_logs_for_signals(
-                                run_ctx,
-                                logs,
-                                plugins,
-                                correlator,
-                                settings.DB_PATH,
-                                broadcaster,
-                                source="live",
-                                summary_queue=summary_queue,
-                                enrichment_queue=enrichment_queue,
-                            )
-
-                        # v1: single failure card per repo per cycle
-                        break
+                checked_at = datetime.now(timezone.utc)
+                created = None
+                since = last_checked.get(repo_full_name)
+                if since:
+                    # hour granularity keeps the query stable between cycles so the ETag can match
+                    floor = (since - RUNS_LOOKBACK).replace(minute=0, second=0, microsecond=0)
+                    created = ">=" + floor.strftime("%Y-%m-%dT%H:%M:%SZ")
+                # the status filter accepts conclusions; a page per conclusion so an already-seen
+                # newest run doesn't hide unseen ones behind it
+                results = await asyncio.gather(*[
+                    gh.list_workflow_runs_lite(
+                        owner,
+                        repo,
+                        per_page=settings.RUNS_PER_REPO,
+                        status=conclusion,
+                        created=created,
+                        conditional=True,
+                    )
+                    for conclusion in FAIL_CONCLUSIONS_ORDERED
+                ])
+                last_checked[repo_full_name] = checked_at
+                # None means 304: nothing new for that conclusion since the last cycle
+                runs = [run for data in results if data for run in data.get("workflow_runs") or []]
+                runs = [run for run in runs if int(run["id"]) not in SEEN_RUN_IDS]
+                if not runs:
+                    return None
+                run = max(runs, key=lambda r: r.get("created_at") or "")
+
+                inc = run_to_incident(run, repo_full_name, detected_at)
+                apply_incident_fields(inc)
+                head_sha = run.get("head_sha")
+                if head_sha:
+                    try:
+                        checks = await gh.get_check_runs(owner, repo, head_sha)
+                        check_runs = []
+                        for c in checks.get("check_runs", [])[:5]:
+                            check_runs.append({
+                                "name": c.get("name"),
+                                "conclusion": c.get("conclusion"),
+                                "started_at": c.get("started_at"),
+                                "completed_at": c.get("completed_at"),
+                            })
+                        inc["_evidence"]["check_runs"] = check_runs
+                        inc["evidence_json"] = orjson.dumps(inc["_evidence"]).decode()
+                    except Exception as e:
+                        print(f"[runs] check-runs fetch failed: {type(e).__name__}")
+                return inc
 
             except Exception as e:
                 # keep it quiet; optional for now:
                 # print(f"[runs] {repo_full_name} error: {type(e).__name__}: {e}")
                 print(f"[runs] {repo_full_name} error: {type(e).__name__}: {e}")
 
-        if emitted:
-            print(f"[runs] emitted {emitted} incidents (checked {len(repos)} repos)")
+        return None
+
+    async def scan_run_logs(inc: Dict[str, Any]) -> None:
+        owner, repo = inc["repo_full_name"].split("/", 1)
+        run_ctx = RunContext(
+            repo_full_name=inc["repo_full_name"],
+            owner=owner,
+            run_id=inc["run_id"],
+            html_url=inc["html_url"],
+            workflow_name=inc["workflow_name"],
+            conclusion=inc["conclusion"],
+            updated_at=inc["updated_at"],
+        )
+        try:
+            logs = await log_fetcher.fetch_run_logs(owner, repo, inc["run_id"]) or []
+            if logs:
+                await process_run_logs_for_signals(
+                    run_ctx,
+                    logs,
+                    plugins,
+                    correlator,
+                    settings.DB_PATH,
+                    broadcaster,
+                    source="live",
+                    summary_queue=summary_queue,
+                    enrichment_queue=enrichment_queue,
+                )
+        except Exception as e:
+            logger.warning("%s log scan error: %s: %s", inc["repo_full_name"], type(e).__name__, e)
+
+    # log download + signal matching is slow, so it runs off the cycle path in its own workers
+    log_queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=LOG_QUEUE_SIZE)
+
+    async def log_worker() -> None:
+        while True:
+            inc = await log_queue.get()
+            await scan_run_logs(inc)
+
+    log_workers = [asyncio.create_task(log_worker()) for _ in range(LOG_WORKERS)]
+
+    # the high-traffic list is fixed for the process, so slice and split it once
+    targets = HIGH_TRAFFIC_SPLIT[: settings.MAX_REPOS_PER_CYCLE]
+    repos = [full for full, _owner, _repo in targets]
+    db_path = settings.DB_PATH
+
+    try:
+        while True:
+            # feed scheduler from the live RECENT_REPOS buffer
+            # (copy snapshot to avoid weirdness)
+            #recent_snapshot = RECENT_REPOS[-50:]
+            #for r in recent_snapshot:
+                #scheduler.add_recent_repo(r)
+
+            #repos = scheduler.next_batch(settings.MAX_REPOS_PER_CYCLE)
+            print("[runs] checking HIGH_TRAFFIC only:", repos)
+
+            #print(f"[runs] cycle checking {len(repos)} repos: {repos[:3]}{'...' if len(repos)>3 else ''}")
+
+            cycle_start = time.monotonic()
+            # one timestamp per cycle so incidents from the same sweep line up
+            detected_at = now_iso()
+
+            # repos are independent, so fetch them concurrently (bounded by GH_CONCURRENCY)
+            results = await asyncio.gather(
+                *[scan_repo(full, owner, repo, detected_at) for full, owner, repo in targets],
+                return_exceptions=True,
+            )
+            pending = [inc for inc in results if isinstance(inc, dict)]
+
+            # one transaction for the whole cycle instead of a commit per incident
+            emitted = 0
+            try:
+                inserted = await insert_incidents_batch(db_path, pending)
+            except Exception as e:
+                logger.warning("batch insert failed: %s: %s", type(e).__name__, e)
+                inserted = []
+            else:
+                # inserted or already stored: either way the run is known now
+                for inc in pending:
+                    _mark_seen(inc["run_id"])
+            cards = []
+            enqueue_summary = summary_queue.enqueue
+            for inc in inserted:
+                cards.append(incident_card(inc))
+                await enqueue_summary(inc["incident_id"])
+                await maybe_enqueue_enrichment(inc, enrichment_queue, db_path)
+                emitted += 1
+            # fan out once per cycle
+            broadcaster.publish_many(cards)
+
+            for inc in pending:
+                try:
+                    log_queue.put_nowait(inc)
+                except asyncio.QueueFull:
+                    # best-effort like the other queues; the fetcher's rate limit would drop it anyway
+                    pass
+
+            if emitted:
+                print(f"[runs] emitted {emitted} incidents (checked {len(repos)} repos)")
 
-        await asyncio.sleep(settings.CHECK_RUNS_SECONDS)
+            # sleep out the rest of the interval; stretch it when the rate-limit budget is running low
+            calls = len(repos) * len(FAIL_CONCLUSIONS)
+            interval = max(settings.CHECK_RUNS_SECONDS, gh.limiter.pacing_interval("core", calls))
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - cycle_start)))
+    finally:
+        # they're children of this loop; don't leave them scanning after it's cancelled
+        for worker in log_workers:
+            worker.cancel()
+        await asyncio.gather(*log_workers, return_exceptions=True)
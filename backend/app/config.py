@@ -16,14 +16,26 @@ class Settings:
     CHECK_RUNS_SECONDS = int(os.getenv("CHECK_RUNS_SECONDS", "10"))
     MAX_REPOS_PER_CYCLE = int(os.getenv("MAX_REPOS_PER_CYCLE", "20"))
     RUNS_PER_REPO = int(os.getenv("RUNS_PER_REPO", "25"))
+    # runs created this long before a repo's last check are re-listed, so long runs that finish late are seen;
+    # 6h is the GitHub-hosted job time limit
+    RUNS_LOOKBACK_HOURS = int(os.getenv("RUNS_LOOKBACK_HOURS", "6"))
+    GH_CONCURRENCY = int(os.getenv("GH_CONCURRENCY", "8"))
+    READ_POOL_SIZE = int(os.getenv("READ_POOL_SIZE", "4"))
     HIGH_TRAFFIC_REPOS = [x.strip() for x in os.getenv("HIGH_TRAFFIC_REPOS", "").split(",") if x.strip()]
     MAX_WORKFLOW_FETCHES_PER_CYCLE = int(os.getenv("MAX_WORKFLOW_FETCHES_PER_CYCLE", "5"))
+    # workflow texts at least this large are scanned in a process pool; ANALYZE_WORKERS=0 keeps everything inline
+    ANALYZE_WORKERS = int(os.getenv("ANALYZE_WORKERS", "2"))
+    ANALYZE_OFFLOAD_BYTES = int(os.getenv("ANALYZE_OFFLOAD_BYTES", "65536"))
     GHOSTACTION_SCORE_THRESHOLD = int(os.getenv("GHOSTACTION_SCORE_THRESHOLD", "60"))
     WINDOW_MINUTES = int(os.getenv("WINDOW_MINUTES", "60"))
     MIN_REPOS = int(os.getenv("MIN_REPOS", "5"))
     MIN_OWNERS = int(os.getenv("MIN_OWNERS", "3"))
     COOLDOWN_MINUTES = int(os.getenv("COOLDOWN_MINUTES", "30"))
     LOG_FETCH_PER_MIN = int(os.getenv("LOG_FETCH_PER_MIN", "20"))
+    # incidents older than this many days are purged; 0 (the default) keeps everything
+    RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "0"))
+    RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+    WAL_CHECKPOINT_INTERVAL_SECONDS = int(os.getenv("WAL_CHECKPOINT_INTERVAL_SECONDS", "60"))
     REPLAY_FIXTURES = os.getenv("REPLAY_FIXTURES", "0") == "1"
     REPLAY_ALWAYS = os.getenv("REPLAY_ALWAYS", "0") == "1"
 
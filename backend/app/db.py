@@ -1,5 +1,8 @@
+import asyncio
 import aiosqlite
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
 
 SCHEMA_SQL = """
 PRAGMA journal_mode=WAL;
@@ -75,5 +78,219 @@ async def init_db(db_path: str) -> None:
             await db.execute("ALTER TABLE incidents ADD COLUMN actor_json TEXT")
         await db.commit()
 
-def connect(db_path: str):
-    return aiosqlite.connect(db_path)
+CONNECTION_PRAGMAS = (
+    "PRAGMA busy_timeout=10000",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA temp_store=MEMORY",
+)
+
+READER_PRAGMAS = (
+    "PRAGMA busy_timeout=10000",
+    "PRAGMA query_only=1",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-32000",
+)
+
+# prepared statements kept per connection (sqlite3 defaults to 128); the update column sets and the
+# IN (?, ...) lookups at each batch size are all distinct SQL texts, so give the long-lived connections room
+STATEMENT_CACHE_SIZE = 512
+
+# the writer connection lives for the whole process and serves the loops' reads, so give it a bigger page cache (~64MB)
+# and a 256MB mmap window; wal_autocheckpoint is sqlite's default, made explicit next to the periodic TRUNCATE checkpoint
+WRITER_PRAGMAS = CONNECTION_PRAGMAS + (
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA wal_autocheckpoint=1000",
+)
+
+async def _apply_pragmas(db: aiosqlite.Connection, pragmas=CONNECTION_PRAGMAS) -> None:
+    for pragma in pragmas:
+        await db.execute(pragma)
+
+@asynccontextmanager
+async def connect(db_path: str):
+    async with aiosqlite.connect(db_path) as db:
+        await _apply_pragmas(db)
+        yield db
+
+class DBWriter:
+    """Single long-lived connection per db file; writes (and the background loops' reads) are serialized through one queue."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            # a finished task may mean its event loop went away; a fresh queue binds to the current one,
+            # and anything still waiting in the old one moves over instead of being dropped
+            old, self._queue = self._queue, asyncio.Queue()
+            while not old.empty():
+                self._queue.put_nowait(old.get_nowait())
+            self._task = asyncio.create_task(self._run())
+
+    async def execute(self, sql: str, params: Iterable[Any] = ()) -> int:
+        return await self._submit(sql, params, "one")
+
+    async def executemany(self, sql: str, rows: Iterable[Iterable[Any]]) -> int:
+        return await self._submit(sql, list(rows), "many")
+
+    async def executescript(self, sql: str) -> None:
+        # runs every statement to completion (needed for pragmas like wal_checkpoint)
+        await self._submit(sql, None, "script")
+
+    async def execute_batch(self, sql: str, rows: Iterable[Iterable[Any]]) -> List[int]:
+        # like executemany (one transaction, one commit) but keeps each row's rowcount
+        return await self._submit(sql, list(rows), "batch")
+
+    async def fetchone(self, sql: str, params: Iterable[Any] = ()) -> Optional[tuple]:
+        return await self._submit(sql, params, "fetchone")
+
+    async def fetchall(self, sql: str, params: Iterable[Any] = ()) -> List[tuple]:
+        return await self._submit(sql, params, "fetchall")
+
+    async def _submit(self, sql: str, params: Any, mode: str) -> Any:
+        self.start()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((sql, params, mode, fut))
+        return await fut
+
+    async def close(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        # nothing will drain the queue now, so fail whoever is still waiting on it
+        self._fail_pending(RuntimeError("db writer closed"))
+
+    def _fail_pending(self, exc: BaseException) -> None:
+        while not self._queue.empty():
+            *_rest, fut = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(exc)
+
+    async def _run(self) -> None:
+        try:
+            db = await aiosqlite.connect(self.db_path, cached_statements=STATEMENT_CACHE_SIZE)
+        except Exception as e:
+            self._fail_pending(e)
+            raise
+        fut = None
+        try:
+            await _apply_pragmas(db, WRITER_PRAGMAS)
+            while True:
+                sql, params, mode, fut = await self._queue.get()
+                try:
+                    if mode in ("fetchone", "fetchall"):
+                        # reads reuse the open connection; nothing to commit
+                        cur = await db.execute(sql, params)
+                        result = await cur.fetchone() if mode == "fetchone" else await cur.fetchall()
+                        await cur.close()
+                        if not fut.done():
+                            fut.set_result(result)
+                        continue
+                    if mode == "script":
+                        await db.executescript(sql)
+                        result = None
+                    elif mode == "batch":
+                        result = []
+                        for row in params:
+                            cur = await db.execute(sql, row)
+                            result.append(cur.rowcount or 0)
+                    elif mode == "many":
+                        cur = await db.executemany(sql, params)
+                        result = cur.rowcount or 0
+                    else:
+                        cur = await db.execute(sql, params)
+                        result = cur.rowcount or 0
+                    await db.commit()
+                    if not fut.done():
+                        fut.set_result(result)
+                except Exception as e:
+                    await db.rollback()
+                    if not fut.done():
+                        fut.set_exception(e)
+        finally:
+            # cancelled mid-statement: that caller would otherwise wait forever
+            if fut is not None and not fut.done():
+                fut.set_exception(RuntimeError("db writer closed"))
+            await db.close()
+
+_writers: Dict[str, DBWriter] = {}
+
+def get_writer(db_path: str) -> DBWriter:
+    writer = _writers.get(db_path)
+    if writer is None:
+        writer = DBWriter(db_path)
+        _writers[db_path] = writer
+    writer.start()
+    return writer
+
+async def close_writers() -> None:
+    for writer in list(_writers.values()):
+        await writer.close()
+    _writers.clear()
+
+class ReadPool:
+    """Read-only connections for request handlers; under WAL they read alongside the writer instead of queueing behind it."""
+
+    def __init__(self, db_path: str, size: int = 4):
+        self.db_path = db_path
+        self.size = size
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._conns: List[aiosqlite.Connection] = []
+        self._opening = 0
+
+    async def _open(self) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(
+            Path(self.db_path).absolute().as_uri() + "?mode=ro",
+            uri=True,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        try:
+            await _apply_pragmas(db, READER_PRAGMAS)
+        except Exception:
+            await db.close()
+            raise
+        return db
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self._idle.empty() and len(self._conns) + self._opening < self.size:
+            # opened lazily, up to size; after that callers wait for an idle one
+            self._opening += 1
+            try:
+                db = await self._open()
+            finally:
+                self._opening -= 1
+            self._conns.append(db)
+        else:
+            db = await self._idle.get()
+        try:
+            yield db
+        finally:
+            self._idle.put_nowait(db)
+
+    async def close(self) -> None:
+        for db in self._conns:
+            await db.close()
+        self._conns.clear()
+        self._idle = asyncio.Queue()
+
+_read_pools: Dict[str, ReadPool] = {}
+
+def get_read_pool(db_path: str, size: int = 4) -> ReadPool:
+    pool = _read_pools.get(db_path)
+    if pool is None:
+        pool = ReadPool(db_path, size)
+        _read_pools[db_path] = pool
+    return pool
+
+async def close_read_pools() -> None:
+    for pool in list(_read_pools.values()):
+        await pool.close()
+    _read_pools.clear()
@@ -1,14 +1,97 @@
 import asyncio
+import logging
 import io
 import random
+import time
 import zipfile
+from collections import OrderedDict
 import httpx
+import orjson
 from typing import Any, Dict, Optional, Tuple
 
+logger = logging.getLogger(__name__)
+
 GITHUB_API = "https://api.github.com"
+# stop issuing requests when a resource's remaining quota drops to this many calls
+RATE_LIMIT_RESERVE = 50
+# below this much remaining quota, pollers stretch their cycles to last until the reset
+RATE_LIMIT_PACING_THRESHOLD = 500
+# bodies above this size are parsed off the event loop
+LARGE_BODY_BYTES = 256 * 1024
+ETAG_CACHE_SIZE = 1024
+# contents fetched at a full commit sha never change, so they're kept without revalidation
+CONTENTS_CACHE_SIZE = 256
+_HEX_CHARS = frozenset("0123456789abcdef")
+# the only workflow-run fields the pollers read; everything else is dropped right after parsing
+WORKFLOW_RUN_FIELDS = (
+    "id", "name", "head_sha", "status", "conclusion", "html_url",
+    "run_number", "created_at", "updated_at",
+)
+
+class RateLimiter:
+    def __init__(self, reserve: int = RATE_LIMIT_RESERVE):
+        self.reserve = reserve
+        self._remaining: Dict[str, int] = {}
+        self._reset_ts: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def acquire(self, resource: str) -> None:
+        lock = self._locks.setdefault(resource, asyncio.Lock())
+        async with lock:
+            remaining = self._remaining.get(resource)
+            if remaining is None:
+                return
+            if remaining <= self.reserve:
+                wait = self._reset_ts.get(resource, 0.0) - time.time()
+                if wait > 0:
+                    logger.warning("%s rate limit low (%d left); waiting %.0fs for reset", resource, remaining, wait)
+                    await asyncio.sleep(wait)
+                # unknown until the next response reports it again
+                self._remaining.pop(resource, None)
+                return
+            # spend a token now so concurrent callers see the request in flight
+            self._remaining[resource] = remaining - 1
+
+    def pacing_interval(self, resource: str, calls: int) -> float:
+        # how long a cycle of `calls` requests should take so the remaining quota lasts until reset
+        remaining = self._remaining.get(resource)
+        if remaining is None or remaining <= 0 or remaining >= RATE_LIMIT_PACING_THRESHOLD:
+            return 0.0
+        until_reset = self._reset_ts.get(resource, 0.0) - time.time()
+        if until_reset <= 0:
+            return 0.0
+        return until_reset / remaining * calls
+
+    def update(self, resource: str, headers: httpx.Headers) -> None:
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        try:
+            self._remaining[resource] = int(remaining)
+            self._reset_ts[resource] = float(reset)
+        except ValueError:
+            pass
+
+# shared by every client so all background loops draw from one budget
+rate_limiter = RateLimiter()
+
+def _resource_for(url: str) -> str:
+    return "search" if url.startswith("/search/") else "core"
+
+def _decode_zip(data: bytes) -> str:
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            texts = []
+            for name in zf.namelist():
+                with zf.open(name) as fp:
+                    texts.append(fp.read().decode("utf-8", errors="replace"))
+            return "\n".join(texts)
+    except Exception:
+        return ""
 
 class GitHubClient:
-    def __init__(self, token: str):
+    def __init__(self, token: str, limiter: Optional[RateLimiter] = None):
         headers = {
             "Accept": "application/vnd.github+json",
             "X-GitHub-Api-Version": "2022-11-28",
@@ -19,25 +102,65 @@ class GitHubClient:
         self._client = httpx.AsyncClient(
             base_url=GITHUB_API,
             headers=headers,
-            timeout=httpx.Timeout(15.0),
+            timeout=httpx.Timeout(15.0, connect=5.0),
+            # HTTP/2 multiplexes the concurrent per-repo calls over a few connections
+            http2=True,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=64, keepalive_expiry=30.0),
         )
+        self._limiter = limiter or rate_limiter
+        # (url, params) -> etag of the last 200, for conditional requests
+        self._etags: "OrderedDict[Tuple[str, Any], str]" = OrderedDict()
+        # (owner, repo, path, sha) -> encoded JSON; every hit decodes its own copy, so callers can't
+        # corrupt the cache by mutating what they get back
+        self._contents: "OrderedDict[Tuple[str, str, str, str], bytes]" = OrderedDict()
+
+    @property
+    def limiter(self) -> RateLimiter:
+        return self._limiter
 
     async def close(self):
         await self._client.aclose()
 
-    async def get_json(self, url: str, params: Optional[Dict[str, Any]] = None) -> Tuple[Any, httpx.Headers]:
+    async def _get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        conditional: bool = False,
+    ) -> httpx.Response:
+        resource = _resource_for(url)
+        etag_key = (url, tuple(sorted((params or {}).items())))
+        headers = None
+        if conditional:
+            cached = self._etags.get(etag_key)
+            if cached:
+                headers = {"If-None-Match": cached}
+
         delay = 1.0
         for _ in range(8):
-            resp = await self._client.get(url, params=params)
+            await self._limiter.acquire(resource)
+            resp = await self._client.get(url, params=params, headers=headers)
+            self._limiter.update(resource, resp.headers)
+
+            if resp.status_code == 304 and headers:
+                return resp
 
             if resp.status_code == 200:
-                return resp.json(), resp.headers
+                etag = resp.headers.get("ETag")
+                if conditional and etag:
+                    self._etags[etag_key] = etag
+                    self._etags.move_to_end(etag_key)
+                    if len(self._etags) > ETAG_CACHE_SIZE:
+                        self._etags.popitem(last=False)
+                return resp
 
             # backoff on rate limit / transient errors
             if resp.status_code in (403, 429) or 500 <= resp.status_code < 600:
                 ra = resp.headers.get("Retry-After")
+                reset = resp.headers.get("X-RateLimit-Reset")
                 if ra:
                     sleep_s = float(ra)
+                elif resp.headers.get("X-RateLimit-Remaining") == "0" and reset:
+                    sleep_s = max(float(reset) - time.time(), 1.0)
                 else:
                     sleep_s = delay + random.uniform(0, delay * 0.25)
                 await asyncio.sleep(sleep_s)
@@ -47,62 +170,66 @@ class GitHubClient:
             resp.raise_for_status()
 
         resp.raise_for_status()
+        return resp
 
-    async def get_text(self, url: str, params: Optional[Dict[str, Any]] = None) -> str:
-        delay = 1.0
-        for _ in range(8):
-            resp = await self._client.get(url, params=params)
-
-            if resp.status_code == 200:
-                return resp.text
-
-            if resp.status_code in (403, 429) or 500 <= resp.status_code < 600:
-                ra = resp.headers.get("Retry-After")
-                if ra:
-                    sleep_s = float(ra)
-                else:
-                    sleep_s = delay + random.uniform(0, delay * 0.25)
-                await asyncio.sleep(sleep_s)
-                delay *= 2
-                continue
-
-            resp.raise_for_status()
+    async def get_json(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        conditional: bool = False,
+    ) -> Tuple[Any, httpx.Headers]:
+        # conditional requests return (None, headers) when GitHub answers 304 Not Modified
+        resp = await self._get(url, params=params, conditional=conditional)
+        if resp.status_code == 304:
+            return None, resp.headers
+        if len(resp.content) > LARGE_BODY_BYTES:
+            return await asyncio.to_thread(orjson.loads, resp.content), resp.headers
+        return orjson.loads(resp.content), resp.headers
 
-        resp.raise_for_status()
+    async def get_text(self, url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        resp = await self._get(url, params=params)
+        return resp.text
 
     async def get_bytes(self, url: str, params: Optional[Dict[str, Any]] = None) -> bytes:
-        delay = 1.0
-        for _ in range(8):
-            resp = await self._client.get(url, params=params)
-
-            if resp.status_code == 200:
-                return resp.content
-
-            if resp.status_code in (403, 429) or 500 <= resp.status_code < 600:
-                ra = resp.headers.get("Retry-After")
-                if ra:
-                    sleep_s = float(ra)
-                else:
-                    sleep_s = delay + random.uniform(0, delay * 0.25)
-                await asyncio.sleep(sleep_s)
-                delay *= 2
-                continue
-
-            resp.raise_for_status()
-
-        resp.raise_for_status()
+        resp = await self._get(url, params=params)
+        return resp.content
 
     async def list_global_events(self):
         data, _headers = await self.get_json("/events")
         return data
     
-    async def list_workflow_runs(self, owner: str, repo: str, per_page: int = 5):
+    async def list_workflow_runs(
+        self,
+        owner: str,
+        repo: str,
+        per_page: int = 5,
+        status: Optional[str] = None,
+        created: Optional[str] = None,
+        event: Optional[str] = None,
+        conditional: bool = False,
+    ):
+        # with conditional=True, returns None when nothing changed since the last call
+        params: Dict[str, Any] = {"per_page": per_page}
+        if status:
+            params["status"] = status
+        if created:
+            params["created"] = created
+        if event:
+            params["event"] = event
         data, _headers = await self.get_json(
             f"/repos/{owner}/{repo}/actions/runs",
-            params={"per_page": per_page},
+            params=params,
+            conditional=conditional,
         )
         return data
 
+    async def list_workflow_runs_lite(self, owner: str, repo: str, per_page: int = 5, **filters: Any):
+        data = await self.list_workflow_runs(owner, repo, per_page=per_page, **filters)
+        if data is None:
+            return None
+        runs = [{k: run.get(k) for k in WORKFLOW_RUN_FIELDS} for run in data.get("workflow_runs") or []]
+        return {"total_count": data.get("total_count"), "workflow_runs": runs}
+
     async def get_commit(self, owner: str, repo: str, sha: str):
         data, _headers = await self.get_json(
             f"/repos/{owner}/{repo}/commits/{sha}",
@@ -110,11 +237,19 @@ class GitHubClient:
         return data
 
     async def get_contents(self, owner: str, repo: str, path: str, ref: Optional[str] = None):
+        key = (owner, repo, path, ref) if ref and len(ref) == 40 and _HEX_CHARS.issuperset(ref) else None
+        if key is not None and key in self._contents:
+            self._contents.move_to_end(key)
+            return orjson.loads(self._contents[key])
         params = {"ref": ref} if ref else None
         data, _headers = await self.get_json(
             f"/repos/{owner}/{repo}/contents/{path}",
             params=params,
         )
+        if key is not None and data is not None:
+            self._contents[key] = orjson.dumps(data)
+            if len(self._contents) > CONTENTS_CACHE_SIZE:
+                self._contents.popitem(last=False)
         return data
 
     async def get_repo(self, owner: str, repo: str):
@@ -145,16 +280,11 @@ class GitHubClient:
         data = await self.get_bytes(
             f"/repos/{owner}/{repo}/actions/jobs/{job_id}/logs",
         )
+        # log archives can be several MB; inflate them off the event loop
         if data[:2] == b"PK":
-            try:
-                with zipfile.ZipFile(io.BytesIO(data)) as zf:
-                    texts = []
-                    for name in zf.namelist():
-                        with zf.open(name) as fp:
-                            texts.append(fp.read().decode("utf-8", errors="replace"))
-                    return "\n".join(texts)
-            except Exception:
-                return ""
+            return await asyncio.to_thread(_decode_zip, data)
+        if len(data) > LARGE_BODY_BYTES:
+            return await asyncio.to_thread(data.decode, "utf-8", "replace")
         return data.decode("utf-8", errors="replace")
 
     async def get_check_runs(self, owner: str, repo: str, sha: str):
@@ -1,17 +1,31 @@
-from typing import Any, Dict, List
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Tuple
+
+import orjson
+
+# most kinds decide scope and surface on their own; only the rest look at tags
+_SCOPE_BY_KIND = {"ecosystem_incident": "ecosystem"}
+_SURFACE_BY_KIND = {
+    "ghostaction_risk": "credentials",
+    "personalized_secret_exfiltration": "credentials",
+    "ecosystem_incident": "dependencies",
+}
+_ACTOR_TYPES = frozenset(("user", "bot", "org"))
 
 def derive_scope(kind: str) -> str:
-    if kind in ("ecosystem_incident",):
-        return "ecosystem"
-    if kind in ("ghostaction_risk", "personalized_secret_exfiltration", "workflow_failure"):
-        return "repo"
-    return "repo"
+    return _SCOPE_BY_KIND.get(kind, "repo")
+
+def derive_surface(kind: str, tags: Iterable[str]) -> str:
+    surface = _SURFACE_BY_KIND.get(kind)
+    if surface is not None:
+        return surface
+    return _surface_from_tags(kind, tuple(tags))
 
-def derive_surface(kind: str, tags: list[str]) -> str:
+# tag combinations repeat almost every insert
+@lru_cache(maxsize=1024)
+def _surface_from_tags(kind: str, tags: Tuple[str, ...]) -> str:
     tag_blob = " ".join(tags).lower()
-    if kind in ("ghostaction_risk", "personalized_secret_exfiltration"):
-        return "credentials"
-    if kind == "ecosystem_incident" or "npm" in tag_blob or "dependency" in tag_blob:
+    if "npm" in tag_blob or "dependency" in tag_blob:
         return "dependencies"
     if kind == "workflow_failure":
         return "ops"
@@ -23,12 +37,8 @@ def derive_actor(evidence: Dict[str, Any]) -> Dict[str, Any]:
     actor_type = ctx.get("type")
     if actor_type:
         actor_type = actor_type.lower()
-    is_bot = False
-    if isinstance(login, str) and login.lower().endswith("[bot]"):
-        is_bot = True
-    if actor_type == "bot":
-        is_bot = True
-    if actor_type not in ("user", "bot", "org"):
+    is_bot = actor_type == "bot" or (isinstance(login, str) and login.lower().endswith("[bot]"))
+    if actor_type not in _ACTOR_TYPES:
         actor_type = "unknown"
     return {
         "login": login or "unknown",
@@ -37,18 +47,16 @@ def derive_actor(evidence: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 def apply_incident_fields(inc: Dict[str, Any]) -> Dict[str, Any]:
-    tags: List[str] = inc.get("tags") or []
+    tags: List[str] = inc.get("tags") or inc.get("_tags") or []
     if not tags and isinstance(inc.get("tags_json"), str):
         try:
-            import json
-            tags = json.loads(inc["tags_json"])
+            tags = orjson.loads(inc["tags_json"])
         except Exception:
             tags = []
     evidence = inc.get("evidence") or inc.get("_evidence") or {}
     if not evidence and isinstance(inc.get("evidence_json"), str):
         try:
-            import json
-            evidence = json.loads(inc["evidence_json"])
+            evidence = orjson.loads(inc["evidence_json"])
         except Exception:
             evidence = {}
 
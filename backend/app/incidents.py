@@ -1,67 +1,168 @@
-import json
-from typing import Any, Dict
+import hashlib
+import logging
+import os
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiosqlite
+import orjson
 
 from .incident_fields import derive_scope, derive_surface, derive_actor
 
-from .db import connect
+from .db import get_writer
+
+logger = logging.getLogger(__name__)
+
+INSERT_INCIDENT_SQL = """INSERT OR IGNORE INTO incidents(
+    incident_id, kind, run_id, dedupe_key, repo_full_name, workflow_name, run_number,
+    status, conclusion, html_url, created_at, updated_at,
+    title, tags_json, evidence_json, enrichment_json,
+    why_this_fired, risk_trajectory, risk_trajectory_reason,
+    scope, surface, actor_json
+) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"""
+
+UPDATABLE_COLUMNS = frozenset({
+    "summary_json", "enrichment_json",
+    "why_this_fired", "risk_trajectory", "risk_trajectory_reason",
+    "status", "conclusion", "updated_at",
+})
+
+@lru_cache(maxsize=64)
+def _update_sql(columns: Tuple[str, ...]) -> str:
+    # cached per column set: the same SQL text on every call hits sqlite3's statement cache
+    assignments = ", ".join(f"{col} = ?" for col in columns)
+    return f"UPDATE incidents SET {assignments} WHERE incident_id = ?"
+
+def new_incident_id() -> str:
+    # UUIDv7 layout: unix-ms timestamp in the top 48 bits, so ids (and the PK b-tree) grow in order
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = (value & ~(0xF << 76)) | (0x7 << 76)
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)
+    # format the hex directly rather than going through uuid.UUID's validation and __str__
+    h = f"{value:032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+def dedupe_hash(key: str) -> str:
+    # ids derived from dedupe keys only need to be stable, not cryptographic; blake2b beats sha1 on short keys
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=20).hexdigest()
+
+def stable_run_id(key: str) -> int:
+    # negative so synthetic incidents never collide with real (positive) GitHub run ids
+    value = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big", signed=False)
+    return -int(value % (2**63))
+
+def _to_json(value: Any) -> Optional[str]:
+    # callers pass either already-encoded JSON text or the python value
+    if value is None or isinstance(value, str):
+        return value
+    return orjson.dumps(value).decode()
+
+def _incident_row(inc: Dict[str, Any]) -> Tuple[Any, ...]:
+    kind = inc.get("kind", "")
+    # prefer the parsed copies callers keep around; only decode the JSON text when they're missing
+    tags = inc.get("_tags", inc.get("tags"))
+    evidence = inc.get("_evidence", inc.get("evidence"))
+    tags_json = _to_json(inc.get("tags_json", tags))
+    evidence_json = _to_json(inc.get("evidence_json", evidence))
+
+    scope = inc.get("scope") or derive_scope(kind)
+    surface = inc.get("surface")
+    if not surface:
+        if tags is None:
+            tags = orjson.loads(tags_json) if tags_json else []
+        surface = derive_surface(kind, tags or [])
+    actor = inc.get("actor")
+    if not actor:
+        if evidence is None:
+            evidence = orjson.loads(evidence_json) if evidence_json else {}
+        actor = derive_actor(evidence or {})
+    return (
+        inc["incident_id"], inc["kind"], inc["run_id"], inc.get("dedupe_key"),
+        inc["repo_full_name"], inc["workflow_name"], inc["run_number"],
+        inc["status"], inc["conclusion"], inc["html_url"], inc["created_at"], inc["updated_at"],
+        inc["title"], tags_json, evidence_json, _to_json(inc.get("enrichment_json")),
+        inc.get("why_this_fired"),
+        inc.get("risk_trajectory"),
+        inc.get("risk_trajectory_reason"),
+        scope,
+        surface,
+        _to_json(actor),
+    )
+
+def incident_card(inc: Dict[str, Any]) -> Dict[str, Any]:
+    # the SSE card for a freshly inserted incident
+    return {
+        "incident_id": inc["incident_id"],
+        "kind": inc["kind"],
+        "repo_full_name": inc["repo_full_name"],
+        "title": inc["title"],
+        "workflow_name": inc["workflow_name"],
+        "run_id": inc["run_id"],
+        "run_number": inc["run_number"],
+        "conclusion": inc["conclusion"],
+        "status": inc["status"],
+        "html_url": inc["html_url"],
+        "created_at": inc["created_at"],
+        "tags": inc["_tags"],
+        "evidence": inc["_evidence"],
+        "scope": inc.get("scope"),
+        "surface": inc.get("surface"),
+        "actor": inc.get("actor"),
+    }
 
 async def insert_incident(db_path: str, inc: Dict[str, Any]) -> bool:
-    async with connect(db_path) as db:
-        try:
-            tags = json.loads(inc.get("tags_json")) if isinstance(inc.get("tags_json"), str) else inc.get("tags", [])
-            evidence = json.loads(inc.get("evidence_json")) if isinstance(inc.get("evidence_json"), str) else inc.get("evidence", {})
-            scope = inc.get("scope") or derive_scope(inc.get("kind", ""))
-            surface = inc.get("surface") or derive_surface(inc.get("kind", ""), tags or [])
-            actor = inc.get("actor") or derive_actor(evidence or {})
-            cur = await db.execute(
-                """INSERT OR IGNORE INTO incidents(
-                    incident_id, kind, run_id, dedupe_key, repo_full_name, workflow_name, run_number,
-                    status, conclusion, html_url, created_at, updated_at,
-                    title, tags_json, evidence_json, enrichment_json,
-                    why_this_fired, risk_trajectory, risk_trajectory_reason,
-                    scope, surface, actor_json
-                ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-                (
-                    inc["incident_id"], inc["kind"], inc["run_id"], inc.get("dedupe_key"),
-                    inc["repo_full_name"], inc["workflow_name"], inc["run_number"],
-                    inc["status"], inc["conclusion"], inc["html_url"], inc["created_at"], inc["updated_at"],
-                    inc["title"], inc["tags_json"], inc["evidence_json"], inc.get("enrichment_json"),
-                    inc.get("why_this_fired"),
-                    inc.get("risk_trajectory"),
-                    inc.get("risk_trajectory_reason"),
-                    scope,
-                    surface,
-                    json.dumps(actor),
-                ),
-            )
-            await db.commit()
-            return (cur.rowcount or 0) > 0   # 1 if inserted, 0 if ignored
-        except Exception as e:
-            print(f"[incidents] insert failed: {type(e).__name__}: {e}")
-            return False
+    # derive/encode on the caller's side so the writer connection only runs the INSERT + COMMIT
+    row = _incident_row(inc)
+    try:
+        rowcount = await get_writer(db_path).execute(INSERT_INCIDENT_SQL, row)
+        return rowcount > 0   # 1 if inserted, 0 if ignored
+    except Exception as e:
+        # callers treat any failure (constraint, locked db, ...) as "not inserted"; this never raises
+        logger.warning("insert failed: %s: %s", type(e).__name__, e)
+        return False
+
+async def insert_incidents_batch(db_path: str, incs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # one transaction for the whole batch; returns only the incidents that were new.
+    # unlike insert_incident, anything but a constraint violation (e.g. a locked db) raises, so
+    # callers can tell "nothing new" from "nothing written" (check_runs only marks runs seen on success)
+    if not incs:
+        return []
+    rows = [_incident_row(inc) for inc in incs]
+    try:
+        rowcounts = await get_writer(db_path).execute_batch(INSERT_INCIDENT_SQL, rows)
+    except aiosqlite.IntegrityError as e:
+        logger.warning("batch insert rejected: %s: %s", type(e).__name__, e)
+        return []
+    return [inc for inc, rowcount in zip(incs, rowcounts) if rowcount > 0]
+
+async def update_incident_fields(db_path: str, incident_id: str, **fields: Any) -> int:
+    # one UPDATE (and one commit) for however many columns the caller has ready
+    unknown = set(fields) - UPDATABLE_COLUMNS
+    if unknown:
+        raise ValueError(f"not updatable: {sorted(unknown)}")
+    if not fields:
+        return 0
+    columns = tuple(sorted(fields))
+    params = [_to_json(fields[col]) if col.endswith("_json") else fields[col] for col in columns]
+    return await get_writer(db_path).execute(_update_sql(columns), (*params, incident_id))
 
 async def set_summary(db_path: str, incident_id: str, summary: Dict[str, Any]) -> None:
-    async with connect(db_path) as db:
-        await db.execute(
-            """
-            UPDATE incidents
-            SET summary_json = ?, why_this_fired = ?, risk_trajectory = ?, risk_trajectory_reason = ?
-            WHERE incident_id = ?
-            """,
-            (
-                json.dumps(summary),
-                summary.get("why_this_fired"),
-                summary.get("risk_trajectory"),
-                summary.get("risk_trajectory_reason"),
-                incident_id,
-            ),
-        )
-        await db.commit()
+    await update_incident_fields(
+        db_path,
+        incident_id,
+        summary_json=summary,
+        why_this_fired=summary.get("why_this_fired"),
+        risk_trajectory=summary.get("risk_trajectory"),
+        risk_trajectory_reason=summary.get("risk_trajectory_reason"),
+    )
 
 async def set_enrichment(db_path: str, incident_id: str, enrichment: Dict[str, Any]) -> None:
-    async with connect(db_path) as db:
-        await db.execute(
-            "UPDATE incidents SET enrichment_json = ? WHERE incident_id = ?",
-            (json.dumps(enrichment), incident_id),
-        )
-        await db.commit()
+    await update_incident_fields(db_path, incident_id, enrichment_json=enrichment)
+
+async def set_enrichments(db_path: str, items: List[Tuple[str, Dict[str, Any]]]) -> None:
+    # (incident_id, enrichment) pairs written in one transaction
+    if not items:
+        return
+    rows = [(_to_json(enrichment), incident_id) for incident_id, enrichment in items]
+    await get_writer(db_path).executemany(_update_sql(("enrichment_json",)), rows)
@@ -0,0 +1,40 @@
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# records waiting for the writer thread; past this they're dropped rather than piling up in memory
+LOG_QUEUE_SIZE = 10000
+
+_listener: Optional[QueueListener] = None
+
+class _DroppingQueueHandler(QueueHandler):
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # the listener is behind; never block (or raise on) the event loop for a log line
+            pass
+
+def configure_logging(level: int = logging.INFO) -> None:
+    # handlers on the event loop only enqueue; a listener thread does the actual stream writes.
+    # only the app's own loggers (app.*) are routed here: root stays at WARNING, so library INFO
+    # chatter (httpx logs every request) doesn't start printing
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter("[%(name)s] %(message)s"))
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(level)
+    app_logger.addHandler(_DroppingQueueHandler(log_queue))
+    app_logger.propagate = False
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+def stop_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
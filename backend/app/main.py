@@ -1,30 +1,44 @@
-import json
-import uuid
 import asyncio
+import logging
+import itertools
+import orjson
 from pathlib import Path
+from typing import List
 from .check_runs import check_runs_loop
 from datetime import datetime, timezone
 from fastapi import FastAPI, Query, APIRouter
 from fastapi.staticfiles import StaticFiles
 from .config import settings
-from .db import init_db, connect
-from fastapi.responses import StreamingResponse
-from .sse import IncidentBroadcaster
+from .db import init_db, get_writer, close_writers, get_read_pool, close_read_pools
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from .sse import CONNECTED_FRAME, IncidentBroadcaster
 from .poll_events import poll_events_loop, RECENT_REPOS
 from .github import GitHubClient
 from .check_runs import run_to_incident, FAIL_CONCLUSIONS
-from .incidents import insert_incident
-from .summary_queue import SummaryQueue, RedisSummaryQueue, summary_worker_loop, get_summary_queue
-from .services.osv_enrichment import EnrichmentQueue, osv_worker_loop, maybe_enqueue_enrichment
+from .incidents import insert_incidents_batch, new_incident_id
+from .summary_queue import SummaryQueue, RedisSummaryQueue, summary_worker_loop, get_summary_queue, close_llm_client
+from .services.osv_enrichment import EnrichmentQueue, osv_worker_loop, maybe_enqueue_enrichment, not_applicable_flush_loop, flush_not_applicable
 from .services.correlator import EcosystemCorrelator
 from .plugins.npm_auth_token_expired import NpmAuthTokenExpiredPlugin
 from .replay.fixtures import run_replay_fixtures
+from .retention import retention_loop, wal_checkpoint_loop
+from .signals.workflow_exfiltration import shutdown_analyze_pool
+from .logs import configure_logging, stop_logging
 
+logger = logging.getLogger(__name__)
 
 
 
 
-app = FastAPI(title="Conway GitHub Warning System (v1)")
+
+# bound once; handlers read a module global instead of going through the settings object
+DB_PATH = settings.DB_PATH
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+app = FastAPI(title="Conway GitHub Warning System (v1)", default_response_class=ORJSONResponse)
 api = APIRouter()
 broadcaster = IncidentBroadcaster()
 summary_queue = get_summary_queue()
@@ -41,11 +55,9 @@ signal_plugins = [NpmAuthTokenExpiredPlugin()]
 async def stream():
     async def gen():
         # initial comment so client knows it's connected
-        yield ": connected\n\n"
-        async for card in broadcaster.subscribe():
-            event_name = card.get("_event", "incident")
-            yield f"event: {event_name}\n"
-            yield f"data: {json.dumps(card)}\n\n"
+        yield CONNECTED_FRAME
+        async for frame in broadcaster.subscribe():
+            yield frame
 
     return StreamingResponse(
         gen(),
@@ -56,7 +68,7 @@ async def stream():
 @api.get("/debug/runs_sample")
 async def debug_runs_sample(repo: str = "vercel/next.js", per_page: int = 5):
     owner, name = repo.split("/", 1)
-    gh = GitHubClient(settings.GITHUB_TOKEN)
+    gh: GitHubClient = app.state.gh
     data = await gh.list_workflow_runs(owner, name, per_page=per_page)
     runs = data.get("workflow_runs", []) or []
     return {
@@ -78,106 +90,149 @@ async def debug_runs_sample(repo: str = "vercel/next.js", per_page: int = 5):
 @api.post("/debug/check_repo_once")
 async def debug_check_repo_once(repo: str = "vercel/next.js"):
     owner, name = repo.split("/", 1)
-    gh = GitHubClient(settings.GITHUB_TOKEN)
+    gh: GitHubClient = app.state.gh
     data = await gh.list_workflow_runs(owner, name, per_page=10)
     runs = data.get("workflow_runs", []) or []
 
-    failures = []
-    inserted = 0
-    for run in runs:
-        if run.get("conclusion") in FAIL_CONCLUSIONS:
-            inc = run_to_incident(run, repo)
-            ok = await insert_incident(settings.DB_PATH, inc)
-            failures.append({"run_id": run.get("id"), "conclusion": run.get("conclusion"), "inserted": ok})
-            if ok:
-                inserted += 1
+    incs = [run_to_incident(run, repo) for run in runs if run.get("conclusion") in FAIL_CONCLUSIONS]
+    # one transaction for all failing runs instead of a commit per row
+    new_ids = {inc["incident_id"] for inc in await insert_incidents_batch(DB_PATH, incs)}
+    failures = [
+        {"run_id": inc["run_id"], "conclusion": inc["conclusion"], "inserted": inc["incident_id"] in new_ids}
+        for inc in incs
+    ]
+
+    return {"repo": repo, "runs_checked": len(runs), "failures": failures, "inserted": len(new_ids)}
 
-    return {"repo": repo, "runs_checked": len(runs), "failures": failures, "inserted": inserted}
+async def _cancel_tasks(tasks: List[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.warning("background task error on shutdown: %s: %s", type(result).__name__, result)
 
 @app.on_event("startup")
 async def on_startup():
-    await init_db(settings.DB_PATH)
-    asyncio.create_task(poll_events_loop(broadcaster, summary_queue, enrichment_queue))
-    asyncio.create_task(check_runs_loop(broadcaster, summary_queue, enrichment_queue, correlator, signal_plugins))
-    asyncio.create_task(summary_worker_loop(settings.DB_PATH, summary_queue, broadcaster))
-    asyncio.create_task(osv_worker_loop(settings.DB_PATH, enrichment_queue, broadcaster))
+    configure_logging()
+    await init_db(DB_PATH)
+    # one client (and connection pool / rate-limit state) shared by every loop and endpoint
+    gh = GitHubClient(settings.GITHUB_TOKEN)
+    app.state.gh = gh
+    # kept so shutdown can stop them before closing the writers they'd otherwise restart
+    app.state.tasks = [
+        asyncio.create_task(poll_events_loop(broadcaster, gh, summary_queue, enrichment_queue)),
+        asyncio.create_task(check_runs_loop(broadcaster, gh, summary_queue, enrichment_queue, correlator, signal_plugins)),
+        asyncio.create_task(summary_worker_loop(DB_PATH, summary_queue, broadcaster)),
+        asyncio.create_task(osv_worker_loop(DB_PATH, enrichment_queue, broadcaster, gh)),
+        asyncio.create_task(not_applicable_flush_loop(DB_PATH, enrichment_queue)),
+        asyncio.create_task(wal_checkpoint_loop(DB_PATH)),
+    ]
+    if settings.RETENTION_DAYS > 0:
+        app.state.tasks.append(asyncio.create_task(retention_loop(DB_PATH)))
     if settings.REPLAY_FIXTURES:
-        asyncio.create_task(run_replay_fixtures(signal_plugins, correlator, broadcaster, settings.DB_PATH, summary_queue, enrichment_queue))
+        app.state.tasks.append(asyncio.create_task(
+            run_replay_fixtures(signal_plugins, correlator, broadcaster, DB_PATH, summary_queue, enrichment_queue)
+        ))
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    # loops first: nothing may touch the GitHub client or the writers once they're closed, and the
+    # final not_applicable flush below must be the only one left
+    await _cancel_tasks(getattr(app.state, "tasks", []))
+    gh = getattr(app.state, "gh", None)
+    if gh is not None:
+        await gh.close()
+    await close_llm_client()
+    await flush_not_applicable(DB_PATH, enrichment_queue, force=True)
+    await close_writers()
+    await close_read_pools()
+    shutdown_analyze_pool()
+    stop_logging()
 
 @api.get("/debug/recent_repos")
 async def debug_recent_repos(limit: int = 20):
-    return {"recent_repos": list(reversed(RECENT_REPOS[-limit:]))}
+    return {"recent_repos": list(itertools.islice(reversed(RECENT_REPOS), max(limit, 0)))}
 
 @api.get("/health")
 async def health():
     return {"ok": True}
 
+INVALID_JSON = '{"_invalid":true}'
+
+def _checked_json(col: str) -> str:
+    # Fragments are spliced in unvalidated, so a corrupt column would break the whole response;
+    # json_valid checks in SQLite's C code and swaps in a marker instead
+    return f"CASE WHEN {col} IS NULL OR json_valid({col}) THEN {col} ELSE '{INVALID_JSON}' END"
+
+SUMMARY_SQL = f"""
+SELECT
+  incident_id, kind, run_id, repo_full_name, workflow_name, run_number,
+  status, conclusion, html_url, created_at, updated_at, title,
+  {_checked_json("tags_json")}, {_checked_json("evidence_json")},
+  {_checked_json("summary_json")}, {_checked_json("enrichment_json")},
+  why_this_fired, risk_trajectory, risk_trajectory_reason,
+  scope, surface, {_checked_json("actor_json")}, inserted_at
+FROM incidents
+WHERE inserted_at >= ?
+ORDER BY inserted_at DESC
+LIMIT ?
+"""
+
+def _summary_card(r) -> bytes:
+    (
+        incident_id, kind, run_id, repo_full_name, workflow_name, run_number,
+        status, conclusion, html_url, created_at, updated_at, title,
+        tags_json, evidence_json, summary_json, enrichment_json,
+        why_this_fired, risk_trajectory, risk_trajectory_reason,
+        scope, surface, actor_json, inserted_at
+    ) = r
+
+    return orjson.dumps({
+        "incident_id": incident_id,
+        "kind": kind,
+        "run_id": run_id,
+        "repo_full_name": repo_full_name,
+        "workflow_name": workflow_name,
+        "run_number": run_number,
+        "status": status,
+        "conclusion": conclusion,
+        "html_url": html_url,
+        "created_at": created_at,
+        "updated_at": updated_at,
+        "title": title,
+        # stored columns are already JSON; Fragment splices them into the response unparsed
+        "tags": orjson.Fragment(tags_json),
+        "evidence": orjson.Fragment(evidence_json),
+        "summary": orjson.Fragment(summary_json) if summary_json else None,
+        "enrichment": orjson.Fragment(enrichment_json) if enrichment_json else None,
+        "why_this_fired": why_this_fired,
+        "risk_trajectory": risk_trajectory,
+        "risk_trajectory_reason": risk_trajectory_reason,
+        "scope": scope,
+        "surface": surface,
+        "actor": orjson.Fragment(actor_json) if actor_json else None,
+        "inserted_at": inserted_at,
+    })
+
 @api.get("/summary")
 async def summary(
     since: str = Query(..., description="SQLite datetime string OR ISO string; v1 uses inserted_at >= since"),
     limit: int = Query(100, ge=1, le=500),
 ):
-    async with connect(settings.DB_PATH) as db:
-        cur = await db.execute(
-            """
-            SELECT
-              incident_id, kind, run_id, repo_full_name, workflow_name, run_number,
-              status, conclusion, html_url, created_at, updated_at, title,
-              tags_json, evidence_json, summary_json, enrichment_json,
-              why_this_fired, risk_trajectory, risk_trajectory_reason,
-              scope, surface, actor_json, inserted_at
-            FROM incidents
-            WHERE inserted_at >= ?
-            ORDER BY inserted_at DESC
-            LIMIT ?
-            """,
-            (since, limit),
-        )
+    # at most 500 rows: read them all and hand the connection back before anything goes out, so a slow
+    # client can't hold a pool slot; the body is built whole, so a failure is a 500 rather than cut-off JSON
+    async with get_read_pool(DB_PATH, settings.READ_POOL_SIZE).acquire() as db:
+        cur = await db.execute(SUMMARY_SQL, (since, limit))
         rows = await cur.fetchall()
+    body = b'{"cards":[' + b",".join(map(_summary_card, rows)) + b"]}"
+    return Response(content=body, media_type="application/json")
 
-    cards = []
-    for r in rows:
-        (
-            incident_id, kind, run_id, repo_full_name, workflow_name, run_number,
-            status, conclusion, html_url, created_at, updated_at, title,
-            tags_json, evidence_json, summary_json, enrichment_json,
-            why_this_fired, risk_trajectory, risk_trajectory_reason,
-            scope, surface, actor_json, inserted_at
-        ) = r
-
-        cards.append({
-            "incident_id": incident_id,
-            "kind": kind,
-            "run_id": run_id,
-            "repo_full_name": repo_full_name,
-            "workflow_name": workflow_name,
-            "run_number": run_number,
-            "status": status,
-            "conclusion": conclusion,
-            "html_url": html_url,
-            "created_at": created_at,
-            "updated_at": updated_at,
-            "title": title,
-            "tags": json.loads(tags_json),
-            "evidence": json.loads(evidence_json),
-            "summary": json.loads(summary_json) if summary_json else None,
-            "enrichment": json.loads(enrichment_json) if enrichment_json else None,
-            "why_this_fired": why_this_fired,
-            "risk_trajectory": risk_trajectory,
-            "risk_trajectory_reason": risk_trajectory_reason,
-            "scope": scope,
-            "surface": surface,
-            "actor": json.loads(actor_json) if actor_json else None,
-            "inserted_at": inserted_at,
-        })
-
-    return {"cards": cards}
 @api.post("/dev/seed_failure")
 async def seed_failure():
     if not settings.DEV_MODE:
         return {"error": "DEV_MODE is false"}
 
-    incident_id = str(uuid.uuid4())
+    incident_id = new_incident_id()
     run_id = int(datetime.now().timestamp())  # unique enough for dev
 
     repo_full_name = "vercel/next.js"
@@ -210,37 +265,39 @@ async def seed_failure():
         "source": "dev_seed",
     }
 
+    # encode once: the same text goes into the row and is spliced into the SSE card
+    tags_json = orjson.dumps(tags).decode()
+    evidence_json = orjson.dumps(evidence).decode()
+
     # 1) Insert into DB
-    async with connect(settings.DB_PATH) as db:
-        await db.execute(
-            """
-            INSERT INTO incidents(
-                incident_id, kind, run_id, dedupe_key, repo_full_name, workflow_name, run_number,
-                status, conclusion, html_url,
-                created_at, updated_at,
-                title, tags_json, evidence_json, enrichment_json
-            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-            """,
-            (
-                incident_id,
-                "workflow_failure",
-                run_id,
-                None,
-                repo_full_name,
-                workflow_name,
-                1,
-                status,
-                conclusion,
-                html_url,
-                created_at,
-                created_at,
-                title,
-                json.dumps(tags),
-                json.dumps(evidence),
-                None,
-            ),
-        )
-        await db.commit()
+    await get_writer(DB_PATH).execute(
+        """
+        INSERT INTO incidents(
+            incident_id, kind, run_id, dedupe_key, repo_full_name, workflow_name, run_number,
+            status, conclusion, html_url,
+            created_at, updated_at,
+            title, tags_json, evidence_json, enrichment_json
+        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+        """,
+        (
+            incident_id,
+            "workflow_failure",
+            run_id,
+            None,
+            repo_full_name,
+            workflow_name,
+            1,
+            status,
+            conclusion,
+            html_url,
+            created_at,
+            created_at,
+            title,
+            tags_json,
+            evidence_json,
+            None,
+        ),
+    )
 
     # 2) Queue summary generation
     await summary_queue.enqueue(incident_id)
@@ -253,7 +310,7 @@ async def seed_failure():
             "evidence": evidence,
         },
         enrichment_queue,
-        settings.DB_PATH,
+        DB_PATH,
     )
 
     # 3) Build SSE card
@@ -269,12 +326,12 @@ async def seed_failure():
         "html_url": html_url,
         "created_at": created_at,
         "title": title,
-        "tags": tags,
-        "evidence": evidence,
+        "tags": orjson.Fragment(tags_json),
+        "evidence": orjson.Fragment(evidence_json),
     }
 
     # 4) Publish to SSE
-    await broadcaster.publish(card)
+    broadcaster.publish(card)
 
     return {
         "ok": True,
@@ -284,7 +341,7 @@ async def seed_failure():
 
 @api.post("/debug/replay_now")
 async def replay_now():
-    emitted = await run_replay_fixtures(signal_plugins, correlator, broadcaster, settings.DB_PATH, summary_queue, enrichment_queue)
+    emitted = await run_replay_fixtures(signal_plugins, correlator, broadcaster, DB_PATH, summary_queue, enrichment_queue)
     return {"ok": True, "emitted": emitted}
 
 app.include_router(api, prefix="/api")
@@ -1,45 +1,64 @@
 import re
-from typing import Optional
+from typing import Optional, Tuple
 
 from ..types.signal import RunContext, SignalMatch
 
-_EXPIRED_RE = re.compile(r"access token expired or revoked", re.IGNORECASE)
-_UNABLE_AUTH_RE = re.compile(r"npm ERR!\s+Unable to authenticate", re.IGNORECASE)
-_E401_CODE_RE = re.compile(r"npm ERR!\s+code\s+E401", re.IGNORECASE)
-_E401_UNAUTHORIZED_RE = re.compile(r"E401\s+Unauthorized", re.IGNORECASE)
+# [^\S\n] keeps each match on a single line; the first two are high confidence
+_HI_PATTERNS = (r"access token expired or revoked", r"npm ERR![^\S\n]+Unable to authenticate")
+_LO_PATTERNS = (r"npm ERR![^\S\n]+code[^\S\n]+E401", r"E401[^\S\n]+Unauthorized")
+
+# every pattern contains one of these (lowercased); a log with none of them can't match
+_GATE_WORDS = ("token expired", "unable to authenticate", "e401")
+
+# one alternation scanned over the whole log
+_COMBINED_RE = re.compile(
+    rf"(?P<hi>{'|'.join(_HI_PATTERNS)})|(?P<lo>{'|'.join(_LO_PATTERNS)})",
+    re.IGNORECASE,
+)
+
 _TS_RE = re.compile(
     r"^\s*(\[[^\]]+\]|\d{4}-\d{2}-\d{2}T[^\s]+|\d{4}-\d{2}-\d{2}\s+[0-9:.]+)\s*"
 )
 
 def _normalize_line(line: str) -> str:
-    line = _TS_RE.sub("", line)
-    line = re.sub(r"\s+", " ", line).strip()
+    line = _TS_RE.sub("", line, count=1)
+    # split/join collapses and trims whitespace in one C pass (same whitespace set as \s)
+    line = " ".join(line.split())
     if len(line) > 200:
         line = line[:197] + "..."
     return line
 
+def _line_at(text: str, start: int, end: int) -> str:
+    line_start = text.rfind("\n", 0, start) + 1
+    line_end = text.find("\n", end)
+    return text[line_start:line_end if line_end != -1 else len(text)]
+
+def _scan_re(log_text: str) -> Optional[Tuple[str, float]]:
+    # lower() plus substring checks run far faster than an IGNORECASE scan, and most logs miss
+    log_lower = log_text.lower()
+    if not any(word in log_lower for word in _GATE_WORDS):
+        return None
+    hit = None
+    confidence = None
+    for m in _COMBINED_RE.finditer(log_text):
+        if m.lastgroup == "hi":
+            hit, confidence = m, 0.9
+            break
+        if hit is None:
+            hit, confidence = m, 0.7
+    if hit is None:
+        return None
+    return _line_at(log_text, hit.start(), hit.end()), confidence
+
 class NpmAuthTokenExpiredPlugin:
     name = "npm_auth_token_expired"
 
     def match(self, run_context: RunContext, log_text: str) -> Optional[SignalMatch]:
-        matched_line = None
-        confidence = None
-
-        for raw_line in log_text.splitlines():
-            line = raw_line.strip()
-            if not line:
-                continue
-            if _EXPIRED_RE.search(line) or _UNABLE_AUTH_RE.search(line):
-                matched_line = _normalize_line(line)
-                confidence = 0.9
-                break
-            if _E401_CODE_RE.search(line) or _E401_UNAUTHORIZED_RE.search(line):
-                matched_line = _normalize_line(line)
-                confidence = 0.7
-                break
-
-        if not matched_line:
+        found = _scan_re(log_text)
+        if found is None:
             return None
+        line, confidence = found
+        matched_line = _normalize_line(line)
 
         evidence = {
             "matched_line": matched_line,
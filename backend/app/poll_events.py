@@ -1,16 +1,22 @@
-import json
 import asyncio
-from typing import Any, Dict, Optional
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
 from datetime import datetime, timezone
 
+import orjson
+
 from .config import settings
-from .db import connect
+from .db import get_writer
 from .github import GitHubClient
-from .incidents import insert_incident
+from .repos import is_repo_full_name
+from .incidents import incident_card, insert_incidents_batch
 from .incident_fields import apply_incident_fields
 from .signals.workflow_exfiltration import detect_ghostaction_risk, detect_personalized_exfiltration, FetchBudget
 from .services.osv_enrichment import maybe_enqueue_enrichment
 
+logger = logging.getLogger(__name__)
+
 def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
@@ -23,85 +29,93 @@ def normalize_event(ev: Dict[str, Any]) -> Dict[str, Any]:
         "repo_full_name": repo.get("name"),
         "actor_login": actor.get("login"),
         "created_at": ev.get("created_at") or now_iso(),
-        "raw_json": json.dumps(ev, separators=(",", ":")),
+        "raw_json": orjson.dumps(ev).decode(),
     }
 
+INSERT_EVENT_SQL = (
+    "INSERT OR IGNORE INTO events(event_id,event_type,repo_full_name,actor_login,created_at,raw_json) "
+    "VALUES (?,?,?,?,?,?)"
+)
+
+def _event_params(row: Dict[str, Any]) -> tuple:
+    return (
+        row["event_id"],
+        row["event_type"],
+        row["repo_full_name"],
+        row["actor_login"],
+        row["created_at"],
+        row["raw_json"],
+    )
+
 async def insert_event(row: Dict[str, Any]) -> bool:
     # True if inserted (i.e., new), False if duplicate
-    async with connect(settings.DB_PATH) as db:
-        try:
-            await db.execute(
-                "INSERT INTO events(event_id,event_type,repo_full_name,actor_login,created_at,raw_json) VALUES (?,?,?,?,?,?)",
-                (
-                    row["event_id"],
-                    row["event_type"],
-                    row["repo_full_name"],
-                    row["actor_login"],
-                    row["created_at"],
-                    row["raw_json"],
-                ),
-            )
-            await db.commit()
-            return True
-        except Exception:
-            return False
+    return await get_writer(settings.DB_PATH).execute(INSERT_EVENT_SQL, _event_params(row)) > 0
+
+async def insert_events_batch(rows: List[Dict[str, Any]]) -> List[bool]:
+    # one transaction per poll; OR IGNORE turns duplicates into rowcount 0 instead of an exception
+    if not rows:
+        return []
+    rowcounts = await get_writer(settings.DB_PATH).execute_batch(INSERT_EVENT_SQL, [_event_params(r) for r in rows])
+    return [rowcount > 0 for rowcount in rowcounts]
 
 # simple in-memory “recent repos” buffer for next step
-RECENT_REPOS: list[str] = []
+# bounded: append drops the oldest once full
+RECENT_REPOS: Deque[str] = deque(maxlen=500)
 
 def add_recent_repo(repo_full_name: Optional[str]) -> None:
-    if not repo_full_name or "/" not in repo_full_name:
+    if not is_repo_full_name(repo_full_name):
         return
     RECENT_REPOS.append(repo_full_name)
-    # cap size
-    if len(RECENT_REPOS) > 500:
-        del RECENT_REPOS[:250]
 
-async def poll_events_loop(broadcaster, summary_queue, enrichment_queue):
-    gh = GitHubClient(settings.GITHUB_TOKEN)
+async def poll_events_loop(broadcaster, gh: GitHubClient, summary_queue, enrichment_queue):
+    # settings don't change at runtime; read them once
+    db_path = settings.DB_PATH
+    max_fetches = settings.MAX_WORKFLOW_FETCHES_PER_CYCLE
+    sleep_s = settings.POLL_EVENTS_SECONDS
+    # bounds how many events run their detectors (and GitHub fetches) at once
+    sem = asyncio.Semaphore(settings.GH_CONCURRENCY)
+
+    async def detect(ev: Dict[str, Any], budget: FetchBudget) -> List[Dict[str, Any]]:
+        async with sem:
+            # the two detectors are independent round-trips; run them side by side
+            ghost, personalized = await asyncio.gather(
+                detect_ghostaction_risk(ev, gh, budget),
+                detect_personalized_exfiltration(ev, gh, budget),
+            )
+        return [*ghost, *personalized]
 
     while True:
         try:
-            budget = FetchBudget(settings.MAX_WORKFLOW_FETCHES_PER_CYCLE)
+            budget = FetchBudget(max_fetches)
             events = await gh.list_global_events()
-            new_count = 0
-            for ev in events:
-                row = normalize_event(ev)
-                if not row["event_id"]:
-                    continue
-                inserted = await insert_event(row)
-                if inserted:
-                    new_count += 1
-                    add_recent_repo(row.get("repo_full_name"))
-
-                    incidents = []
-                    incidents.extend(await detect_ghostaction_risk(ev, gh, budget))
-                    incidents.extend(await detect_personalized_exfiltration(ev, gh, budget))
-                    for inc in incidents:
-                        apply_incident_fields(inc)
-                        ok = await insert_incident(settings.DB_PATH, inc)
-                        if ok:
-                            card = {
-                                "incident_id": inc["incident_id"],
-                                "kind": inc["kind"],
-                                "repo_full_name": inc["repo_full_name"],
-                                "title": inc["title"],
-                                "workflow_name": inc["workflow_name"],
-                                "run_id": inc["run_id"],
-                                "run_number": inc["run_number"],
-                                "conclusion": inc["conclusion"],
-                                "status": inc["status"],
-                                "html_url": inc["html_url"],
-                                "created_at": inc["created_at"],
-                                "tags": inc["_tags"],
-                                "evidence": inc["_evidence"],
-                                "scope": inc.get("scope"),
-                                "surface": inc.get("surface"),
-                                "actor": inc.get("actor"),
-                            }
-                            await broadcaster.publish(card)
-                            await summary_queue.enqueue(inc["incident_id"])
-                            await maybe_enqueue_enrichment(inc, enrichment_queue, settings.DB_PATH)
+            pairs = [(ev, normalize_event(ev)) for ev in events]
+            pairs = [(ev, row) for ev, row in pairs if row["event_id"]]
+            inserted = await insert_events_batch([row for _, row in pairs])
+            new_events = [(ev, row) for (ev, row), is_new in zip(pairs, inserted) if is_new]
+            new_count = len(new_events)
+            for _, row in new_events:
+                add_recent_repo(row.get("repo_full_name"))
+            results = await asyncio.gather(
+                *[detect(ev, budget) for ev, _ in new_events],
+                return_exceptions=True,
+            )
+            detected: List[Dict[str, Any]] = []
+            for res in results:
+                if isinstance(res, Exception):
+                    logger.warning("detector error: %s", type(res).__name__)
+                else:
+                    detected.extend(res)
+            # one transaction and one publish for everything this cycle found
+            for inc in detected:
+                apply_incident_fields(inc)
+            new_incidents = await insert_incidents_batch(db_path, detected)
+            if new_incidents:
+                broadcaster.publish_many([incident_card(inc) for inc in new_incidents])
+                # independent round-trips with the redis-backed queue; overlap them
+                await asyncio.gather(
+                    *[summary_queue.enqueue(inc["incident_id"]) for inc in new_incidents],
+                    *[maybe_enqueue_enrichment(inc, enrichment_queue, db_path) for inc in new_incidents],
+                )
             # small visible signal in logs
             if new_count:
                 print(f"[poll] inserted {new_count} new events; recent_repos={len(RECENT_REPOS)}")
@@ -109,4 +123,4 @@ async def poll_events_loop(broadcaster, summary_queue, enrichment_queue):
             # keep logs light; no secrets
             print(f"[poll] error: {type(e).__name__}")
 
-        await asyncio.sleep(settings.POLL_EVENTS_SECONDS)
+        await asyncio.sleep(sleep_s)
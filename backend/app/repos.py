@@ -2,15 +2,19 @@ import time
 from collections import deque
 from typing import Deque, Dict, List, Optional, Set
 
+def is_repo_full_name(name: Optional[str]) -> bool:
+    # "owner/name"; the substring test is a C-level memchr on a short string, cheaper than any cache lookup
+    return bool(name) and "/" in name
+
 class RepoScheduler:
     def __init__(self, high_traffic: List[str], min_interval_seconds: int = 120):
-        self.high_traffic = [r for r in high_traffic if "/" in r]
+        self.high_traffic = [r for r in high_traffic if is_repo_full_name(r)]
         self.queue: Deque[str] = deque()
         self.last_checked: Dict[str, float] = {}
         self.min_interval = min_interval_seconds
 
     def add_recent_repo(self, repo_full_name: Optional[str]) -> None:
-        if not repo_full_name or "/" not in repo_full_name:
+        if not is_repo_full_name(repo_full_name):
             return
         self.queue.append(repo_full_name)
 
@@ -0,0 +1,49 @@
+import asyncio
+import logging
+
+from .config import settings
+from .db import get_writer
+
+logger = logging.getLogger(__name__)
+
+# small batches keep each write transaction (and the lock it holds) short
+PURGE_BATCH_SIZE = 1000
+
+PURGE_INCIDENTS_SQL = """
+DELETE FROM incidents WHERE rowid IN (
+  SELECT rowid FROM incidents WHERE inserted_at < datetime('now', ?) LIMIT ?
+)
+"""
+
+async def purge_old_incidents(db_path: str, days: int) -> int:
+    if days <= 0:
+        # retention is off; "-0 days" would otherwise match every row
+        return 0
+    writer = get_writer(db_path)
+    total = 0
+    while True:
+        deleted = await writer.execute(PURGE_INCIDENTS_SQL, (f"-{days} days", PURGE_BATCH_SIZE))
+        total += deleted
+        if deleted < PURGE_BATCH_SIZE:
+            break
+    # freed pages go on sqlite's freelist and are reused by later inserts
+    return total
+
+async def retention_loop(db_path: str) -> None:
+    while True:
+        try:
+            purged = await purge_old_incidents(db_path, settings.RETENTION_DAYS)
+            if purged:
+                logger.info("purged %d incidents older than %d days", purged, settings.RETENTION_DAYS)
+        except Exception as e:
+            logger.warning("purge error: %s", type(e).__name__)
+        await asyncio.sleep(settings.RETENTION_INTERVAL_SECONDS)
+
+async def wal_checkpoint_loop(db_path: str) -> None:
+    # autocheckpoint never shrinks the -wal file; TRUNCATE resets it once readers let go
+    while True:
+        await asyncio.sleep(settings.WAL_CHECKPOINT_INTERVAL_SECONDS)
+        try:
+            await get_writer(db_path).executescript("PRAGMA wal_checkpoint(TRUNCATE);")
+        except Exception as e:
+            logger.warning("checkpoint error: %s", type(e).__name__)
@@ -1,12 +1,22 @@
 from __future__ import annotations
 
-import hashlib
-import json
-from collections import defaultdict
-from dataclasses import dataclass
+import heapq
+import itertools
+from array import array
+from bisect import bisect_right
+from collections import Counter
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Optional, Callable
 
+import orjson
+
+try:
+    from ciso8601 import parse_datetime as _parse_iso  # optional C parser
+except ImportError:
+    # 3.11's fromisoformat already accepts a trailing "Z"
+    _parse_iso = datetime.fromisoformat
+
+from ..incidents import dedupe_hash, stable_run_id
 from ..types.signal import SignalMatch
 
 def _now_utc() -> datetime:
@@ -16,24 +26,72 @@ def _parse_time(value: Optional[str]) -> datetime:
     if not value:
         return _now_utc()
     try:
-        if value.endswith("Z"):
-            value = value[:-1] + "+00:00"
-        return datetime.fromisoformat(value)
-    except Exception:
+        return _parse_iso(value)
+    except ValueError:
         return _now_utc()
 
-def _stable_run_id(key: str) -> int:
-    digest = hashlib.sha1(key.encode("utf-8")).digest()
-    value = int.from_bytes(digest[:8], "big", signed=False)
-    return -int(value % (2**63))
-
-@dataclass
-class CorrelatorEntry:
-    repo_full_name: str
-    owner: str
-    occurred_at: datetime
-    match: SignalMatch
-    source_ids: Dict[str, Any]
+# the canned write-up is the same for every emit; only the counts and samples vary
+_ROOT_CAUSE = (
+    "Widespread npm authentication failures consistent with token expiration/revocation "
+    "(often from tokens stored in .npmrc or short-lived tokens in CI)."
+)
+_IMPACT = "CI fails during npm install / npm ci across multiple repositories in a short window."
+_NEXT_STEPS = (
+    "Rotate/regenerate npm token used in CI secrets.",
+    "Avoid committing tokens to .npmrc; use CI secrets or automation tokens.",
+    "Re-run failed workflows after updating credentials.",
+)
+_FIXED_TAGS = ("ecosystem", "incident")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_US = timedelta(microseconds=1)
+
+def _to_us(ts: datetime) -> int:
+    # exact integer microseconds since the epoch; naive times are taken as UTC
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (ts - _EPOCH) // _ONE_US
+
+def _discard(counts: Counter, key: str) -> None:
+    counts[key] -= 1
+    if counts[key] <= 0:
+        del counts[key]
+
+class _SignatureWindow:
+    # parallel columns, sorted by occurred_at; rows before `head` have expired and
+    # are dropped in bulk once they make up half the columns
+    __slots__ = ("occurred_us", "repos", "owners", "matches", "head", "repo_counts", "owner_counts")
+
+    def __init__(self) -> None:
+        self.occurred_us = array("q")
+        self.repos: List[str] = []
+        self.owners: List[str] = []
+        self.matches: List[SignalMatch] = []
+        self.head = 0
+        # multisets over the live rows; len() gives the unique counts in O(1)
+        self.repo_counts: Counter = Counter()
+        self.owner_counts: Counter = Counter()
+
+    def expire(self, cutoff_us: int) -> None:
+        occurred_us, head, end = self.occurred_us, self.head, len(self.occurred_us)
+        while head < end and occurred_us[head] < cutoff_us:
+            _discard(self.repo_counts, self.repos[head])
+            _discard(self.owner_counts, self.owners[head])
+            head += 1
+        if head and head * 2 >= end:
+            del occurred_us[:head], self.repos[:head], self.owners[:head], self.matches[:head]
+            head = 0
+        self.head = head
+
+    def add(self, occurred_us: int, repo_full_name: str, owner: str, match: SignalMatch) -> None:
+        # signals arrive nearly in time order, so this is almost always an append
+        pos = bisect_right(self.occurred_us, occurred_us, self.head)
+        self.occurred_us.insert(pos, occurred_us)
+        self.repos.insert(pos, repo_full_name)
+        self.owners.insert(pos, owner)
+        self.matches.insert(pos, match)
+        self.repo_counts[repo_full_name] += 1
+        self.owner_counts[owner] += 1
 
 class EcosystemCorrelator:
     def __init__(
@@ -48,10 +106,23 @@ class EcosystemCorrelator:
         self.min_repos = min_repos
         self.min_owners = min_owners
         self.cooldown = timedelta(minutes=cooldown_minutes) if cooldown_minutes > 0 else None
-        self._entries: Dict[str, List[CorrelatorEntry]] = defaultdict(list)
+        # fixed for the correlator's lifetime; computed once instead of per emit
+        self._cooldown_s = self.cooldown.total_seconds() if self.cooldown is not None else None
+        self._window_minutes = int(self.window.total_seconds() / 60)
+        self._window_us = self.window // _ONE_US
+        # signatures interned to small ints indexing _windows
+        self._sig_ids: Dict[str, int] = {}
+        self._windows: List[_SignatureWindow] = []
         self._last_emit: Dict[str, datetime] = {}
         self._now = now_fn or _now_utc
 
+    def _window(self, signature: str) -> _SignatureWindow:
+        sig_id = self._sig_ids.get(signature)
+        if sig_id is None:
+            sig_id = self._sig_ids[signature] = len(self._windows)
+            self._windows.append(_SignatureWindow())
+        return self._windows[sig_id]
+
     def ingest(
         self,
         match: SignalMatch,
@@ -64,24 +135,11 @@ class EcosystemCorrelator:
         ts = _parse_time(occurred_at)
         signature = match.signature
 
-        entries = self._entries[signature]
-        cutoff = self._now() - self.window
-        entries[:] = [e for e in entries if e.occurred_at >= cutoff]
+        window = self._window(signature)
+        window.expire(_to_us(self._now()) - self._window_us)
+        window.add(_to_us(ts), repo_full_name, owner, match)
 
-        entries.append(
-            CorrelatorEntry(
-                repo_full_name=repo_full_name,
-                owner=owner,
-                occurred_at=ts,
-                match=match,
-                source_ids=source_ids,
-            )
-        )
-
-        unique_repos = {e.repo_full_name for e in entries}
-        unique_owners = {e.owner for e in entries}
-
-        if len(unique_repos) < self.min_repos or len(unique_owners) < self.min_owners:
+        if len(window.repo_counts) < self.min_repos or len(window.owner_counts) < self.min_owners:
             return None
 
         now = self._now()
@@ -91,81 +149,71 @@ class EcosystemCorrelator:
                 return None
 
         self._last_emit[signature] = now
-        return self._build_incident(signature, entries, source, now)
+        return self._build_incident(signature, window, source, now)
 
     def _build_incident(
         self,
         signature: str,
-        entries: List[CorrelatorEntry],
+        window: _SignatureWindow,
         source: str,
         now: datetime,
     ) -> Dict[str, Any]:
-        unique_repos = sorted({e.repo_full_name for e in entries})
-        unique_owners = sorted({e.owner for e in entries})
-        sample_repos = unique_repos[:10]
+        repo_count = len(window.repo_counts)
+        owner_count = len(window.owner_counts)
+        # same first-10-alphabetically sample without sorting every repo in the window
+        sample_repos = heapq.nsmallest(10, window.repo_counts)
 
         evidence_samples = []
-        for e in entries[:5]:
+        head = window.head
+        for repo, match in zip(window.repos[head:head + 5], window.matches[head:head + 5]):
             sample = {
-                "repo": e.repo_full_name,
-                "matched_line": e.match.evidence.get("matched_line"),
-                "run_id": e.match.evidence.get("run_id"),
-                "job_name": e.match.evidence.get("job_name"),
+                "repo": repo,
+                "matched_line": match.evidence.get("matched_line"),
+                "run_id": match.evidence.get("run_id"),
+                "job_name": match.evidence.get("job_name"),
             }
             evidence_samples.append(sample)
 
-        confidence = max((e.match.confidence for e in entries), default=0.0)
-
-        root_cause_hypothesis = (
-            "Widespread npm authentication failures consistent with token expiration/revocation "
-            "(often from tokens stored in .npmrc or short-lived tokens in CI)."
-        )
-        impact = "CI fails during npm install / npm ci across multiple repositories in a short window."
-        next_steps = [
-            "Rotate/regenerate npm token used in CI secrets.",
-            "Avoid committing tokens to .npmrc; use CI secrets or automation tokens.",
-            "Re-run failed workflows after updating credentials.",
-        ]
+        confidence = max((m.confidence for m in itertools.islice(window.matches, head, None)), default=0.0)
 
         payload = {
             "type": "ECOSYSTEM_INCIDENT",
             "signature": signature,
             "plugin": signature,
             "confidence": confidence,
-            "window_minutes": int(self.window.total_seconds() / 60),
-            "affected_repos_count": len(unique_repos),
-            "unique_owners_count": len(unique_owners),
+            "window_minutes": self._window_minutes,
+            "affected_repos_count": repo_count,
+            "unique_owners_count": owner_count,
             "sample_repos": sample_repos,
             "evidence_samples": evidence_samples,
-            "root_cause_hypothesis": root_cause_hypothesis,
-            "impact": impact,
-            "next_steps": next_steps,
+            "root_cause_hypothesis": _ROOT_CAUSE,
+            "impact": _IMPACT,
+            "next_steps": _NEXT_STEPS,
             "source": source,
         }
 
         summary = {
-            "root_cause": [root_cause_hypothesis],
-            "impact": [impact],
-            "next_steps": next_steps,
+            "root_cause": [_ROOT_CAUSE],
+            "impact": [_IMPACT],
+            "next_steps": _NEXT_STEPS,
         }
 
-        if self.cooldown is None:
+        if self._cooldown_s is None:
             bucket = int(now.timestamp())
         else:
-            bucket = int(now.timestamp() // self.cooldown.total_seconds())
+            bucket = int(now.timestamp() // self._cooldown_s)
         dedupe_key = f"ecosystem:{signature}:{bucket}"
-        run_id = _stable_run_id(dedupe_key)
+        run_id = stable_run_id(dedupe_key)
         tags = [
-            "ecosystem",
-            "incident",
+            *_FIXED_TAGS,
             f"signature:{signature}",
-            f"repos:{len(unique_repos)}",
-            f"owners:{len(unique_owners)}",
+            f"repos:{repo_count}",
+            f"owners:{owner_count}",
             f"source:{source}",
         ]
 
         incident = {
-            "incident_id": hashlib.sha1(dedupe_key.encode("utf-8")).hexdigest(),
+            "incident_id": dedupe_hash(dedupe_key),
             "kind": "ecosystem_incident",
             "run_id": run_id,
             "dedupe_key": dedupe_key,
@@ -178,8 +226,8 @@ class EcosystemCorrelator:
             "created_at": now.isoformat(),
             "updated_at": now.isoformat(),
             "title": f"Ecosystem incident: {signature}",
-            "tags_json": json.dumps(tags),
-            "evidence_json": json.dumps(payload),
+            "tags_json": orjson.dumps(tags).decode(),
+            "evidence_json": orjson.dumps(payload).decode(),
             "_tags": tags,
             "_evidence": payload,
         }
@@ -1,23 +1,49 @@
 import asyncio
-import json
+import logging
+import base64
+import itertools
+import re
 import time
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import httpx
+import orjson
 
-from ..config import settings
-from ..db import connect
+from ..db import get_writer
 from ..github import GitHubClient
-from ..incidents import set_enrichment
+from ..incidents import set_enrichments
 
-OSV_ENDPOINT = "https://api.osv.dev/v1/query"
+logger = logging.getLogger(__name__)
+
+OSV_BATCH_ENDPOINT = "https://api.osv.dev/v1/querybatch"
+OSV_VULN_ENDPOINT = "https://api.osv.dev/v1/vulns/{}"
+# _normalize_osv_response keeps at most this many vulns per package; don't fetch details past it
+OSV_VULNS_PER_PACKAGE = 5
 OSV_TTL_SECONDS = 24 * 60 * 60
+ENRICH_BATCH_SIZE = 16
+# not_applicable markers are flushed in one write per this many ids (or every NA_FLUSH_SECONDS)
+NA_FLUSH_SIZE = 32
+NA_FLUSH_SECONDS = 2.0
+NA_CACHE_SIZE = 4096
+_NOT_APPLICABLE: Dict[str, Any] = {"osv": {"status": "not_applicable"}}
+OSV_CACHE_PREFIX = "osv:npm:"
+OSV_VULN_CACHE_PREFIX = "osv:vuln:"
+_NO_VULNS: Dict[str, Any] = {"top_vulns": ()}
+
+_RANGE_CHARS = frozenset("^~><*x")
+PKG_VERSION_RE = re.compile(r"(@?[\w.-]+(?:/[\w.-]+)?)@([0-9]+\.[0-9]+\.[0-9]+[\w.-]*)")
 
 class EnrichmentQueue:
     def __init__(self, maxsize: int = 500):
         self._queue: asyncio.Queue[str] = asyncio.Queue(maxsize=maxsize)
+        # ids already marked not_applicable (bounded LRU) and the ones not yet written
+        self._na_cache: "OrderedDict[str, bool]" = OrderedDict()
+        self._na_pending: List[str] = []
 
-    async def enqueue(self, incident_id: str) -> None:
+    def enqueue(self, incident_id: str) -> None:
+        # put_nowait never suspends, so this doesn't need to be a coroutine
         try:
             self._queue.put_nowait(incident_id)
         except asyncio.QueueFull:
@@ -26,9 +52,45 @@ class EnrichmentQueue:
     async def dequeue(self) -> str:
         return await self._queue.get()
 
+    async def dequeue_batch(self, limit: int) -> List[str]:
+        # wait for one id, then take whatever else is already queued (up to limit)
+        batch = [await self._queue.get()]
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return list(dict.fromkeys(batch))
+
+    def mark_not_applicable(self, incident_id: str, defer: bool = True) -> bool:
+        # False if this id was already marked, so a repeat doesn't cost another write;
+        # defer=False leaves the write to the caller instead of the pending flush
+        if incident_id in self._na_cache:
+            self._na_cache.move_to_end(incident_id)
+            return False
+        self._na_cache[incident_id] = True
+        if len(self._na_cache) > NA_CACHE_SIZE:
+            self._na_cache.popitem(last=False)
+        if defer:
+            self._na_pending.append(incident_id)
+        return True
+
+    def take_not_applicable(self, force: bool = False) -> List[str]:
+        if not self._na_pending or (not force and len(self._na_pending) < NA_FLUSH_SIZE):
+            return []
+        pending, self._na_pending = self._na_pending, []
+        return pending
+
+    def restore_not_applicable(self, incident_ids: List[str]) -> None:
+        # a flush whose write failed hands its ids back so the next flush retries them
+        # (they stay in _na_cache, so nothing else would ever mark them again)
+        self._na_pending[:0] = incident_ids
+
 class OsvCache:
-    def __init__(self):
-        self._cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+    # LRU with a TTL: bounded like RunLogFetcher's cache, and stale entries still expire on read
+    def __init__(self, maxsize: int = 2048):
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._maxsize = maxsize
 
     def get(self, key: str) -> Optional[Dict[str, Any]]:
         item = self._cache.get(key)
@@ -38,64 +100,77 @@ class OsvCache:
         if time.time() - ts > OSV_TTL_SECONDS:
             self._cache.pop(key, None)
             return None
+        self._cache.move_to_end(key)
         return value
 
     def set(self, key: str, value: Dict[str, Any]) -> None:
         self._cache[key] = (time.time(), value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._maxsize:
+            self._cache.popitem(last=False)
+
+_now_iso_cache: List[Any] = [-1, ""]
 
-def _extract_candidates(texts: Iterable[str]) -> List[Tuple[str, str]]:
-    import re
-    candidates = []
-    pattern = re.compile(r"(@?[\w.-]+(?:/[\w.-]+)?)@([0-9]+\.[0-9]+\.[0-9]+[\w.-]*)")
-    for text in texts:
-        for match in pattern.finditer(text):
-            name = match.group(1)
-            version = match.group(2)
-            candidates.append((name, version))
-    return candidates
+def _now_iso() -> str:
+    # a drained batch lands within the same second; format once per second, not once per incident
+    t = int(time.time())
+    if t != _now_iso_cache[0]:
+        _now_iso_cache[0] = t
+        _now_iso_cache[1] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t))
+    return _now_iso_cache[1]
 
 def _is_exact_version(version: str) -> bool:
-    if any(ch in version for ch in ["^", "~", ">", "<", "*", "x"]):
-        return False
-    return True
+    # one C-level pass over the string instead of a substring scan per range character
+    return _RANGE_CHARS.isdisjoint(version)
+
+def _iter_texts(evidence: Dict[str, Any], summary: Dict[str, Any]) -> Iterator[Any]:
+    yield from evidence.get("evidence_lines") or ()
+    yield from evidence.get("snippets") or ()
+    for sample in evidence.get("evidence_samples") or ():
+        matched_line = sample.get("matched_line")
+        if matched_line:
+            yield matched_line
+    for section in ("root_cause", "impact", "next_steps"):
+        yield from summary.get(section) or ()
 
 def _extract_packages_from_incident(incident: Dict[str, Any]) -> List[Tuple[str, str]]:
     evidence = incident.get("evidence") or incident.get("_evidence") or {}
     summary = incident.get("summary") or {}
-    texts: List[str] = []
-
-    for key in ("evidence_lines", "snippets"):
-        lines = evidence.get(key) or []
-        texts.extend([str(line) for line in lines])
-
-    samples = evidence.get("evidence_samples") or []
-    texts.extend([str(s.get("matched_line")) for s in samples if s.get("matched_line")])
-
-    for section in ("root_cause", "impact", "next_steps"):
-        items = summary.get(section) or []
-        texts.extend([str(item) for item in items])
 
     structured = []
-    if evidence.get("package"):
-        structured.append((evidence.get("package"), evidence.get("package_version")))
-    if evidence.get("affected_packages"):
-        for pkg in evidence.get("affected_packages"):
-            if isinstance(pkg, dict):
-                structured.append((pkg.get("name"), pkg.get("version")))
-
-    candidates = _extract_candidates(texts)
-    for name, version in structured:
-        if name and version:
-            candidates.append((name, version))
-
+    if (name := evidence.get("package")) and (version := evidence.get("package_version")):
+        structured.append((name, version))
+    for pkg in evidence.get("affected_packages") or ():
+        if isinstance(pkg, dict) and (name := pkg.get("name")) and (version := pkg.get("version")):
+            structured.append((name, version))
+
+    # one findall over the joined texts; the pattern can't cross a newline, so no match spans two texts
+    blob = "\n".join(text if isinstance(text, str) else str(text) for text in _iter_texts(evidence, summary))
+    found = PKG_VERSION_RE.findall(blob)
+    seen = set()
     exact = []
-    for name, version in candidates:
-        if name and version and _is_exact_version(version):
+    for name, version in itertools.chain(found, structured):
+        if name and version and _is_exact_version(version) and (name, version) not in seen:
+            seen.add((name, version))
             exact.append((name, version))
-    return list(dict.fromkeys(exact))
-
-def _normalize_osv_response(name: str, version: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    vulns = data.get("vulns") or []
+    return exact
+
+@dataclass(frozen=True, slots=True)
+class VulnRecord:
+    # what the cache holds per vuln; orjson encodes it as the same JSON object the dicts produced
+    package: str
+    version: str
+    osv_id: Optional[str]
+    summary: Optional[str]
+    severity: str
+    affected_ranges: Tuple[Any, ...]
+    references: Tuple[str, ...]
+
+def _normalize_osv_response(name: str, version: str, data: Dict[str, Any]) -> List[VulnRecord]:
+    vulns = data.get("vulns")
+    if not vulns:
+        # the common case for a healthy package
+        return []
     top_vulns = []
     for v in vulns[:5]:
         affected = v.get("affected") or []
@@ -111,17 +186,74 @@ def _normalize_osv_response(name: str, version: str, data: Dict[str, Any]) -> Li
         if v.get("severity"):
             sev = v.get("severity")[0]
             severity = sev.get("score") or sev.get("type") or "UNKNOWN"
-        top_vulns.append({
-            "package": name,
-            "version": version,
-            "osv_id": v.get("id"),
-            "summary": v.get("summary"),
-            "severity": severity,
-            "affected_ranges": ranges[:3],
-            "references": references[:3],
-        })
+        top_vulns.append(VulnRecord(
+            package=name,
+            version=version,
+            osv_id=v.get("id"),
+            summary=v.get("summary"),
+            severity=severity,
+            affected_ranges=tuple(ranges[:3]),
+            references=tuple(references[:3]),
+        ))
     return top_vulns
 
+async def _osv_querybatch(client: httpx.AsyncClient, pairs: List[Tuple[str, str]]) -> List[List[str]]:
+    # one round-trip for every package; querybatch only returns vuln ids, in query order
+    payload = {
+        "queries": [
+            {"package": {"name": name, "ecosystem": "npm"}, "version": version}
+            for name, version in pairs
+        ]
+    }
+    resp = await client.post(OSV_BATCH_ENDPOINT, json=payload)
+    resp.raise_for_status()
+    results = resp.json().get("results") or []
+    return [[v["id"] for v in (r.get("vulns") or []) if v.get("id")] for r in results]
+
+async def _osv_fetch_vuln(client: httpx.AsyncClient, sem: asyncio.Semaphore, vuln_id: str) -> Optional[Dict[str, Any]]:
+    async with sem:
+        resp = await client.get(OSV_VULN_ENDPOINT.format(vuln_id))
+    if resp.status_code != 200:
+        return None
+    return resp.json()
+
+async def _osv_query_packages(
+    client: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+    pairs: List[Tuple[str, str]],
+    vuln_cache: Optional[OsvCache] = None,
+) -> Dict[Tuple[str, str], List[VulnRecord]]:
+    async with sem:
+        ids_per_pair = await _osv_querybatch(client, pairs)
+    # details only for the ids we'll keep, each fetched once even if several packages share it
+    wanted = list(dict.fromkeys(vid for ids in ids_per_pair for vid in ids[:OSV_VULNS_PER_PACKAGE]))
+    by_id: Dict[str, Dict[str, Any]] = {}
+    if vuln_cache is not None:
+        # the same advisories recur across packages and batches
+        for vid in wanted:
+            cached = vuln_cache.get(OSV_VULN_CACHE_PREFIX + vid)
+            if cached is not None:
+                by_id[vid] = cached
+        wanted = [vid for vid in wanted if vid not in by_id]
+    details = await asyncio.gather(*[_osv_fetch_vuln(client, sem, vid) for vid in wanted], return_exceptions=True)
+    for vid, d in zip(wanted, details):
+        if isinstance(d, dict):
+            by_id[vid] = d
+            if vuln_cache is not None:
+                vuln_cache.set(OSV_VULN_CACHE_PREFIX + vid, d)
+
+    results: Dict[Tuple[str, str], List[VulnRecord]] = {}
+    for (name, version), ids in zip(pairs, ids_per_pair):
+        if not ids:
+            results[(name, version)] = []
+            continue
+        kept = ids[:OSV_VULNS_PER_PACKAGE]
+        if not all(vid in by_id for vid in kept):
+            # a detail fetch failed; leave the package out (and uncached) like a failed query
+            continue
+        results[(name, version)] = _normalize_osv_response(name, version, {"vulns": [by_id[vid] for vid in kept]})
+    return results
+
 def _is_osv_relevant(incident: Dict[str, Any]) -> bool:
     kind = incident.get("kind") or ""
     tags = incident.get("tags") or incident.get("_tags") or []
@@ -134,66 +266,89 @@ def _is_osv_relevant(incident: Dict[str, Any]) -> bool:
         return True
     return False
 
-async def _fetch_incident(db_path: str, incident_id: str) -> Optional[Dict[str, Any]]:
-    async with connect(db_path) as db:
-        cur = await db.execute(
-            """
-            SELECT
-              incident_id, kind, repo_full_name, workflow_name, run_id,
-              status, conclusion, html_url, created_at, updated_at, title,
-              tags_json, evidence_json, summary_json, enrichment_json,
-              why_this_fired, risk_trajectory, risk_trajectory_reason,
-              scope, surface, actor_json
-            FROM incidents
-            WHERE incident_id = ?
-            """,
-            (incident_id,),
-        )
-        row = await cur.fetchone()
-        if not row:
-            return None
-
-    (
-        incident_id, kind, repo_full_name, workflow_name, run_id,
-        status, conclusion, html_url, created_at, updated_at, title,
-        tags_json, evidence_json, summary_json, enrichment_json,
-        why_this_fired, risk_trajectory, risk_trajectory_reason,
-        scope, surface, actor_json
-    ) = row
-
+async def _fetch_incident_headers(db_path: str, incident_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    # just what _is_osv_relevant looks at; SQLite pulls the signature out of evidence_json without us decoding it
+    placeholders = ",".join("?" * len(incident_ids))
+    rows = await get_writer(db_path).fetchall(
+        f"""
+        SELECT
+          incident_id, kind, tags_json,
+          CASE WHEN json_valid(evidence_json) THEN json_extract(evidence_json, '$.signature') END
+        FROM incidents
+        WHERE incident_id IN ({placeholders})
+        """,
+        incident_ids,
+    )
     return {
-        "incident_id": incident_id,
-        "kind": kind,
-        "repo_full_name": repo_full_name,
-        "workflow_name": workflow_name,
-        "run_id": run_id,
-        "status": status,
-        "conclusion": conclusion,
-        "html_url": html_url,
-        "created_at": created_at,
-        "updated_at": updated_at,
-        "title": title,
-        "tags": json.loads(tags_json),
-        "evidence": json.loads(evidence_json),
-        "summary": json.loads(summary_json) if summary_json else {},
-        "enrichment": json.loads(enrichment_json) if enrichment_json else None,
-        "why_this_fired": why_this_fired,
-        "risk_trajectory": risk_trajectory,
-        "risk_trajectory_reason": risk_trajectory_reason,
-        "scope": scope,
-        "surface": surface,
-        "actor": json.loads(actor_json) if actor_json else None,
+        incident_id: {
+            "incident_id": incident_id,
+            "kind": kind,
+            "tags": orjson.loads(tags_json) if tags_json else [],
+            "evidence": {"signature": signature},
+        }
+        for incident_id, kind, tags_json, signature in rows
     }
 
+async def _fetch_incidents(db_path: str, incident_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    # one query for a whole batch of dequeued ids
+    placeholders = ",".join("?" * len(incident_ids))
+    rows = await get_writer(db_path).fetchall(
+        f"""
+        SELECT
+          incident_id, kind, repo_full_name, workflow_name, run_id,
+          status, conclusion, html_url, created_at, updated_at, title,
+          tags_json, evidence_json, summary_json, enrichment_json,
+          why_this_fired, risk_trajectory, risk_trajectory_reason,
+          scope, surface, actor_json
+        FROM incidents
+        WHERE incident_id IN ({placeholders})
+        """,
+        incident_ids,
+    )
+
+    incidents: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        (
+            incident_id, kind, repo_full_name, workflow_name, run_id,
+            status, conclusion, html_url, created_at, updated_at, title,
+            tags_json, evidence_json, summary_json, enrichment_json,
+            why_this_fired, risk_trajectory, risk_trajectory_reason,
+            scope, surface, actor_json
+        ) = row
+
+        incidents[incident_id] = {
+            "incident_id": incident_id,
+            "kind": kind,
+            "repo_full_name": repo_full_name,
+            "workflow_name": workflow_name,
+            "run_id": run_id,
+            "status": status,
+            "conclusion": conclusion,
+            "html_url": html_url,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "title": title,
+            "tags": orjson.loads(tags_json),
+            "evidence": orjson.loads(evidence_json),
+            "summary": orjson.loads(summary_json) if summary_json else {},
+            "enrichment": orjson.loads(enrichment_json) if enrichment_json else None,
+            "why_this_fired": why_this_fired,
+            "risk_trajectory": risk_trajectory,
+            "risk_trajectory_reason": risk_trajectory_reason,
+            "scope": scope,
+            "surface": surface,
+            "actor": orjson.loads(actor_json) if actor_json else None,
+        }
+    return incidents
+
 async def _fetch_package_json(gh: GitHubClient, owner: str, repo: str, sha: str) -> Dict[str, Any]:
     data = await gh.get_contents(owner, repo, "package.json", ref=sha)
     content = data.get("content")
     if not content or data.get("encoding") != "base64":
         return {}
-    import base64
     raw = base64.b64decode(content)
     try:
-        return json.loads(raw.decode("utf-8"))
+        return orjson.loads(raw)
     except Exception:
         return {}
 
@@ -204,94 +359,140 @@ def _deps_from_package_json(payload: Dict[str, Any]) -> List[Tuple[str, str]]:
     items = sorted(combined.items(), key=lambda x: x[0])[:10]
     return [(name, version) for name, version in items if _is_exact_version(version)]
 
+async def flush_not_applicable(db_path: str, queue: EnrichmentQueue, force: bool = False) -> None:
+    pending = queue.take_not_applicable(force)
+    if pending:
+        try:
+            await set_enrichments(db_path, [(incident_id, _NOT_APPLICABLE) for incident_id in pending])
+        except Exception:
+            queue.restore_not_applicable(pending)
+            raise
+
+async def not_applicable_flush_loop(db_path: str, queue: EnrichmentQueue) -> None:
+    # picks up stragglers that never fill a batch
+    while True:
+        await asyncio.sleep(NA_FLUSH_SECONDS)
+        try:
+            await flush_not_applicable(db_path, queue, force=True)
+        except Exception as e:
+            logger.warning("not_applicable flush error: %s", type(e).__name__)
+
 async def maybe_enqueue_enrichment(incident: Dict[str, Any], queue: EnrichmentQueue, db_path: str) -> None:
     if not _is_osv_relevant(incident):
-        enrichment = {"osv": {"status": "not_applicable"}}
-        await set_enrichment(db_path, incident["incident_id"], enrichment)
+        if queue.mark_not_applicable(incident["incident_id"]):
+            await flush_not_applicable(db_path, queue)
         return
-    await queue.enqueue(incident["incident_id"])
+    queue.enqueue(incident["incident_id"])
 
-async def osv_worker_loop(db_path: str, queue: EnrichmentQueue, broadcaster) -> None:
+async def osv_worker_loop(db_path: str, queue: EnrichmentQueue, broadcaster, gh: GitHubClient) -> None:
     cache = OsvCache()
-    sem = asyncio.Semaphore(5)
-    gh = GitHubClient(settings.GITHUB_TOKEN)
-
-    while True:
-        incident_id = await queue.dequeue()
-        incident = await _fetch_incident(db_path, incident_id)
-        if not incident:
-            continue
-
-        if not _is_osv_relevant(incident):
-            enrichment = {"osv": {"status": "not_applicable"}}
-            await set_enrichment(db_path, incident_id, enrichment)
-            continue
+    vuln_cache = OsvCache()
+    sem = asyncio.Semaphore(16)
 
+    async def resolve_packages(incident: Dict[str, Any]) -> Tuple[List[Tuple[str, str]], str]:
         packages = _extract_packages_from_incident(incident)
-        status = "ok"
-
-        if not packages:
-            evidence = incident.get("evidence") or {}
-            sha = evidence.get("sha")
-            repo_full_name = evidence.get("repo_full_name") or incident.get("repo_full_name")
-            if incident.get("kind") == "ecosystem_incident" and repo_full_name and sha and "/" in repo_full_name:
-                owner, repo = repo_full_name.split("/", 1)
-                try:
-                    pkg_json = await _fetch_package_json(gh, owner, repo, sha)
-                    packages = _deps_from_package_json(pkg_json)
-                except Exception:
-                    packages = []
-            else:
-                status = "skipped_no_package_context"
-
-        packages_queried: List[str] = []
-        top_vulns: List[Dict[str, Any]] = []
-
-        async def query_one(name: str, version: str) -> None:
-            key = f"osv:npm:{name}@{version}"
-            cached = cache.get(key)
-            if cached is not None:
-                top_vulns.extend(cached.get("top_vulns", []))
-                packages_queried.append(f"{name}@{version}")
-                return
-
-            payload = {"package": {"name": name, "ecosystem": "npm"}, "version": version}
-            async with sem:
-                async with httpx.AsyncClient(timeout=15.0) as client:
-                    resp = await client.post(OSV_ENDPOINT, json=payload)
-                    if resp.status_code != 200:
-                        return
-                    data = resp.json()
-            norm = _normalize_osv_response(name, version, data)
-            cache.set(key, {"top_vulns": norm})
-            top_vulns.extend(norm)
-            packages_queried.append(f"{name}@{version}")
-
-        for name, version in packages[:10]:
+        if packages:
+            return packages[:10], "ok"
+        evidence = incident.get("evidence") or {}
+        sha = evidence.get("sha")
+        repo_full_name = evidence.get("repo_full_name") or incident.get("repo_full_name")
+        if incident.get("kind") == "ecosystem_incident" and repo_full_name and sha and "/" in repo_full_name:
+            owner, repo = repo_full_name.split("/", 1)
             try:
-                await query_one(name, version)
+                pkg_json = await _fetch_package_json(gh, owner, repo, sha)
+                packages = _deps_from_package_json(pkg_json)
             except Exception:
-                continue
-
-        enrichment = {
-            "osv": {
-                "status": status,
-                "queried_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-                "packages_queried": packages_queried,
-                "vuln_count_total": len(top_vulns),
-                "top_vulns": top_vulns[:5],
+                packages = []
+            return packages[:10], "ok"
+        return [], "skipped_no_package_context"
+
+    async def enrich_batch(incidents: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        resolved = await asyncio.gather(*[resolve_packages(incident) for incident in incidents])
+
+        # one querybatch for every uncached package across the whole drain
+        to_query = list(dict.fromkeys(
+            pair for packages, _ in resolved for pair in packages
+            if cache.get(OSV_CACHE_PREFIX + f"{pair[0]}@{pair[1]}") is None
+        ))
+        if to_query:
+            try:
+                results = await _osv_query_packages(client, sem, to_query, vuln_cache)
+            except Exception:
+                results = {}
+            for (name, version), norm in results.items():
+                # clean packages all share one (read-only) cache entry
+                cache.set(OSV_CACHE_PREFIX + f"{name}@{version}", {"top_vulns": norm} if norm else _NO_VULNS)
+
+        out = []
+        for incident, (packages, status) in zip(incidents, resolved):
+            packages_queried: List[str] = []
+            top_vulns: List[VulnRecord] = []
+            for name, version in packages:
+                label = f"{name}@{version}"
+                cached = cache.get(OSV_CACHE_PREFIX + label)
+                if cached is None:
+                    continue
+                top_vulns.extend(cached.get("top_vulns", []))
+                packages_queried.append(label)
+
+            enrichment = {
+                "osv": {
+                    "status": status,
+                    "queried_at": _now_iso(),
+                    "packages_queried": packages_queried,
+                    "vuln_count_total": len(top_vulns),
+                    "top_vulns": top_vulns[:5],
+                }
             }
-        }
-
-        await set_enrichment(db_path, incident_id, enrichment)
-        await broadcaster.publish({
-            "_event": "incident_enriched",
-            "incident_id": incident_id,
-            "enrichment": enrichment,
-            "why_this_fired": incident.get("why_this_fired"),
-            "risk_trajectory": incident.get("risk_trajectory"),
-            "risk_trajectory_reason": incident.get("risk_trajectory_reason"),
-            "scope": incident.get("scope"),
-            "surface": incident.get("surface"),
-            "actor": incident.get("actor"),
-        })
+            out.append((enrichment, {
+                "_event": "incident_enriched",
+                "incident_id": incident["incident_id"],
+                "enrichment": enrichment,
+                "why_this_fired": incident.get("why_this_fired"),
+                "risk_trajectory": incident.get("risk_trajectory"),
+                "risk_trajectory_reason": incident.get("risk_trajectory_reason"),
+                "scope": incident.get("scope"),
+                "surface": incident.get("surface"),
+                "actor": incident.get("actor"),
+            }))
+        return out
+
+    # one pooled client for the worker's lifetime; keep-alive connections skip the per-request TLS handshake
+    client = httpx.AsyncClient(
+        timeout=15.0,
+        http2=True,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+    )
+    try:
+        while True:
+            batch = await queue.dequeue_batch(ENRICH_BATCH_SIZE)
+            try:
+                # decide relevance from a few columns first; only relevant incidents get the full fetch and decode
+                headers = await _fetch_incident_headers(db_path, batch)
+                relevant = []
+                # written in one transaction and published in one call per batch
+                updates: List[Tuple[str, Dict[str, Any]]] = []
+                events: List[Dict[str, Any]] = []
+                for incident_id in batch:
+                    header = headers.get(incident_id)
+                    if not header:
+                        continue
+                    if _is_osv_relevant(header):
+                        relevant.append(incident_id)
+                    elif queue.mark_not_applicable(incident_id, defer=False):
+                        # written with the rest of this batch below
+                        updates.append((incident_id, _NOT_APPLICABLE))
+                if relevant:
+                    incidents = await _fetch_incidents(db_path, relevant)
+                    found = [incidents[i] for i in relevant if incidents.get(i)]
+                    for incident, (enrichment, event) in zip(found, await enrich_batch(found)):
+                        updates.append((incident["incident_id"], enrichment))
+                        events.append(event)
+                await set_enrichments(db_path, updates)
+                if events:
+                    broadcaster.publish_many(events)
+            except Exception as e:
+                # one bad batch shouldn't stop enrichment for the rest
+                logger.warning("worker error: %s", type(e).__name__)
+    finally:
+        await client.aclose()
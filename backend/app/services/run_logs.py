@@ -1,22 +1,28 @@
+import asyncio
 import time
-from collections import OrderedDict, deque
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional
 
 class RunLogFetcher:
-    def __init__(self, gh, per_minute: int = 20, cache_size: int = 200):
+    def __init__(self, gh, per_minute: int = 20, cache_size: int = 200, job_concurrency: int = 4):
         self._gh = gh
-        self._per_minute = per_minute
-        self._timestamps = deque()
+        self._job_sem = asyncio.Semaphore(job_concurrency)
+        # token bucket: up to per_minute fetches in a burst, refilled at per_minute/60 per second
+        self._capacity = float(per_minute)
+        self._refill_per_s = per_minute / 60.0
+        self._tokens = float(per_minute)
+        self._last_refill = time.monotonic()
         self._cache: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
         self._cache_size = cache_size
 
     def _allow(self) -> bool:
-        now = time.time()
-        while self._timestamps and now - self._timestamps[0] > 60:
-            self._timestamps.popleft()
-        if len(self._timestamps) >= self._per_minute:
+        # O(1) per decision; non-blocking so callers can skip a run instead of waiting
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._last_refill) * self._refill_per_s)
+        self._last_refill = now
+        if self._tokens < 1.0:
             return False
-        self._timestamps.append(now)
+        self._tokens -= 1.0
         return True
 
     def _cache_put(self, run_id: int, logs: List[Dict[str, Any]]) -> None:
@@ -25,6 +31,10 @@ class RunLogFetcher:
         if len(self._cache) > self._cache_size:
             self._cache.popitem(last=False)
 
+    async def _fetch_job_log(self, owner: str, repo: str, job_id: int) -> Optional[str]:
+        async with self._job_sem:
+            return await self._gh.get_job_logs(owner, repo, job_id)
+
     async def fetch_run_logs(self, owner: str, repo: str, run_id: int) -> Optional[List[Dict[str, Any]]]:
         if run_id in self._cache:
             return self._cache[run_id]
@@ -37,21 +47,24 @@ class RunLogFetcher:
             return None
 
         jobs = jobs_data.get("jobs") or []
-        results: List[Dict[str, Any]] = []
-
+        # take the rate tokens up front, in job order, then fetch those jobs' logs concurrently
+        allowed = []
         for job in jobs:
-            job_id = job.get("id")
-            job_name = job.get("name")
-            if not job_id:
+            if not job.get("id"):
                 continue
             if not self._allow():
                 break
-            try:
-                log_text = await self._gh.get_job_logs(owner, repo, int(job_id))
-            except Exception:
-                continue
-            if log_text:
-                results.append({"job_name": job_name, "log_text": log_text})
+            allowed.append(job)
+
+        texts = await asyncio.gather(
+            *[self._fetch_job_log(owner, repo, int(job["id"])) for job in allowed],
+            return_exceptions=True,
+        )
+        results: List[Dict[str, Any]] = [
+            {"job_name": job.get("name"), "log_text": text}
+            for job, text in zip(allowed, texts)
+            if text and not isinstance(text, BaseException)
+        ]
 
         self._cache_put(run_id, results)
         return results
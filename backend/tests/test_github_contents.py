@@ -0,0 +1,31 @@
+import pytest
+
+from app.github import GitHubClient
+
+SHA = "0123456789abcdef0123456789abcdef01234567"
+
+@pytest.mark.asyncio
+async def test_get_contents_caches_only_sha_refs_and_returns_copies():
+    gh = GitHubClient("")
+    calls = []
+
+    async def fake_get_json(url, params=None, conditional=False):
+        calls.append((url, params))
+        return {"encoding": "base64", "content": "b246IHB1c2gK"}, {}
+
+    gh.get_json = fake_get_json
+    try:
+        first = await gh.get_contents("org", "repo", ".github/workflows/ci.yml", ref=SHA)
+        first["content"] = "mutated"
+        second = await gh.get_contents("org", "repo", ".github/workflows/ci.yml", ref=SHA)
+        assert len(calls) == 1
+        # a caller's mutation doesn't leak into later reads
+        assert second["content"] == "b246IHB1c2gK"
+
+        for ref in ("main", "v1", SHA[:7]):
+            await gh.get_contents("org", "repo", ".github/workflows/ci.yml", ref=ref)
+            await gh.get_contents("org", "repo", ".github/workflows/ci.yml", ref=ref)
+        # branches, tags and short shas can move, so each call goes to GitHub
+        assert len(calls) == 1 + 6
+    finally:
+        await gh.close()
@@ -0,0 +1,34 @@
+import time
+
+import httpx
+import pytest
+
+from app.github import RateLimiter
+
+@pytest.mark.asyncio
+async def test_rate_limiter_spends_tokens_from_headers():
+    limiter = RateLimiter(reserve=2)
+    limiter.update("core", httpx.Headers({
+        "X-RateLimit-Remaining": "10",
+        "X-RateLimit-Reset": str(int(time.time()) + 60),
+    }))
+    await limiter.acquire("core")
+    assert limiter._remaining["core"] == 9
+
+@pytest.mark.asyncio
+async def test_rate_limiter_releases_after_reset_passed():
+    limiter = RateLimiter(reserve=5)
+    limiter.update("core", httpx.Headers({
+        "X-RateLimit-Remaining": "1",
+        "X-RateLimit-Reset": str(int(time.time()) - 1),
+    }))
+    await limiter.acquire("core")
+    assert "core" not in limiter._remaining
+
+def test_rate_limiter_paces_only_when_budget_low():
+    limiter = RateLimiter()
+    reset = str(int(time.time()) + 100)
+    limiter.update("core", httpx.Headers({"X-RateLimit-Remaining": "4000", "X-RateLimit-Reset": reset}))
+    assert limiter.pacing_interval("core", 10) == 0.0
+    limiter.update("core", httpx.Headers({"X-RateLimit-Remaining": "100", "X-RateLimit-Reset": reset}))
+    assert 5.0 < limiter.pacing_interval("core", 10) <= 10.0
@@ -0,0 +1,40 @@
+import pytest
+
+from app.check_runs import run_to_incident
+from app.db import close_writers
+from app.incidents import insert_incident
+
+@pytest.mark.asyncio
+async def test_insert_incident_reports_failure_instead_of_raising(tmp_path):
+    run = {
+        "id": 1,
+        "name": "CI",
+        "conclusion": "failure",
+        "status": "completed",
+        "html_url": "https://example.com/runs/1",
+        "run_number": 1,
+        "created_at": "2024-01-01T00:00:00Z",
+        "updated_at": "2024-01-01T00:00:00Z",
+    }
+    try:
+        # no schema: the INSERT fails with OperationalError, not a constraint violation
+        assert await insert_incident(str(tmp_path / "empty.db"), run_to_incident(run, "owner/repo")) is False
+    finally:
+        await close_writers()
+
+def test_run_to_incident_keeps_run_links_in_evidence():
+    run = {
+        "id": 2,
+        "name": "CI",
+        "head_sha": "abc123",
+        "conclusion": "failure",
+        "status": "completed",
+        "html_url": "https://example.com/runs/2",
+        "run_number": 2,
+        "created_at": "2024-01-01T00:00:00Z",
+        "updated_at": "2024-01-01T00:05:00Z",
+    }
+    evidence = run_to_incident(run, "owner/repo")["_evidence"]
+    assert evidence["run"]["html_url"] == "https://example.com/runs/2"
+    assert evidence["run"]["head_sha"] == "abc123"
+    assert evidence["run"]["created_at"] == "2024-01-01T00:00:00Z"
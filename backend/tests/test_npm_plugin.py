@@ -19,3 +19,37 @@ def test_npm_plugin_matches_and_normalizes():
     assert match.signature == "npm_auth_token_expired"
     assert "2024-01-01" not in match.evidence["matched_line"]
     assert len(match.evidence["matched_line"]) <= 200
+
+def test_npm_plugin_prefers_high_confidence_line():
+    plugin = NpmAuthTokenExpiredPlugin()
+    ctx = RunContext(
+        repo_full_name="org/repo",
+        owner="org",
+        run_id=123,
+        html_url="https://example.com",
+        workflow_name="CI",
+        conclusion="failure",
+        updated_at="2024-01-01T00:00:00Z",
+    )
+    log_text = "npm ERR! code E401\nsetup\nnpm ERR! Unable to authenticate, need: Basic\n"
+    match = plugin.match(ctx, log_text)
+    assert match is not None
+    assert match.confidence == 0.9
+    assert match.evidence["matched_line"] == "npm ERR! Unable to authenticate, need: Basic"
+    assert plugin.match(ctx, "npm ERR!\ncode E401\n") is None
+
+def test_npm_plugin_matches_case_insensitively_past_literal_gate():
+    plugin = NpmAuthTokenExpiredPlugin()
+    ctx = RunContext(
+        repo_full_name="org/repo",
+        owner="org",
+        run_id=123,
+        html_url="https://example.com",
+        workflow_name="CI",
+        conclusion="failure",
+        updated_at="2024-01-01T00:00:00Z",
+    )
+    match = plugin.match(ctx, "setup\nERROR: ACCESS TOKEN EXPIRED OR REVOKED\n")
+    assert match is not None
+    assert match.confidence == 0.9
+    assert plugin.match(ctx, "npm ERR! code E403\nForbidden\n") is None
@@ -1,4 +1,11 @@
-from app.services.osv_enrichment import _extract_packages_from_incident, _normalize_osv_response
+import asyncio
+
+import httpx
+import orjson
+import pytest
+
+from app.services import osv_enrichment
+from app.services.osv_enrichment import EnrichmentQueue, OsvCache, _extract_packages_from_incident, _normalize_osv_response, _osv_query_packages
 
 def test_extract_packages_from_incident():
     incident = {
@@ -37,6 +44,173 @@ def test_normalize_osv_response():
         ]
     }
     top = _normalize_osv_response("lodash", "4.17.21", data)
-    assert top[0]["package"] == "lodash"
-    assert top[0]["osv_id"] == "OSV-2024-123"
-    assert top[0]["severity"] == "9.8"
+    assert top[0].package == "lodash"
+    assert top[0].osv_id == "OSV-2024-123"
+    assert top[0].severity == "9.8"
+    assert orjson.loads(orjson.dumps(top[0]))["affected_ranges"] == [[{"introduced": "0"}, {"fixed": "4.17.22"}]]
+
+@pytest.mark.asyncio
+async def test_osv_query_packages_batches_and_dedupes_details():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append((request.method, request.url.path))
+        if request.url.path == "/v1/querybatch":
+            return httpx.Response(200, json={"results": [
+                {"vulns": [{"id": "GHSA-1"}, {"id": "GHSA-2"}]},
+                {},
+                {"vulns": [{"id": "GHSA-2"}]},
+            ]})
+        vid = request.url.path.rsplit("/", 1)[-1]
+        return httpx.Response(200, json={
+            "id": vid,
+            "summary": f"{vid} summary",
+            "affected": [{"package": {"name": "lodash"}, "ranges": []}],
+        })
+
+    pairs = [("lodash", "4.17.20"), ("react", "18.2.0"), ("lodash", "4.17.21")]
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        results = await _osv_query_packages(client, asyncio.Semaphore(5), pairs)
+
+    assert requests.count(("POST", "/v1/querybatch")) == 1
+    assert sorted(path for method, path in requests if method == "GET") == ["/v1/vulns/GHSA-1", "/v1/vulns/GHSA-2"]
+    assert [v.osv_id for v in results[("lodash", "4.17.20")]] == ["GHSA-1", "GHSA-2"]
+    assert results[("react", "18.2.0")] == []
+    assert [v.osv_id for v in results[("lodash", "4.17.21")]] == ["GHSA-2"]
+
+@pytest.mark.asyncio
+async def test_osv_query_packages_reuses_cached_vuln_details():
+    fetched = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/v1/querybatch":
+            return httpx.Response(200, json={"results": [{"vulns": [{"id": "GHSA-1"}]}]})
+        fetched.append(request.url.path)
+        return httpx.Response(200, json={"id": "GHSA-1", "summary": "s"})
+
+    vuln_cache = OsvCache()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        first = await _osv_query_packages(client, asyncio.Semaphore(5), [("a", "1.0.0")], vuln_cache)
+        second = await _osv_query_packages(client, asyncio.Semaphore(5), [("b", "2.0.0")], vuln_cache)
+
+    assert fetched == ["/v1/vulns/GHSA-1"]
+    assert [v.osv_id for v in first[("a", "1.0.0")]] == ["GHSA-1"]
+    assert [v.osv_id for v in second[("b", "2.0.0")]] == ["GHSA-1"]
+
+def test_osv_cache_evicts_least_recently_used():
+    cache = OsvCache(maxsize=2)
+    cache.set("a", {"top_vulns": []})
+    cache.set("b", {"top_vulns": []})
+    assert cache.get("a") is not None
+    cache.set("c", {"top_vulns": []})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+@pytest.mark.asyncio
+async def test_osv_query_packages_fetches_details_concurrently():
+    in_flight = 0
+    peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        if request.url.path == "/v1/querybatch":
+            return httpx.Response(200, json={"results": [
+                {"vulns": [{"id": f"GHSA-{i}"}]} for i in range(4)
+            ]})
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json={"id": request.url.path.rsplit("/", 1)[-1]})
+
+    pairs = [(f"pkg-{i}", "1.0.0") for i in range(4)]
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        results = await _osv_query_packages(client, asyncio.Semaphore(3), pairs)
+
+    assert len(results) == 4
+    # bounded by the semaphore, but more than one at a time
+    assert peak == 3
+
+@pytest.mark.asyncio
+async def test_enrichment_queue_dequeue_batch_drains_without_waiting():
+    queue = EnrichmentQueue()
+    for incident_id in ("a", "b", "a", "c"):
+        queue.enqueue(incident_id)
+
+    assert await queue.dequeue_batch(3) == ["a", "b"]
+    assert await queue.dequeue_batch(3) == ["c"]
+
+@pytest.mark.asyncio
+async def test_not_applicable_marks_are_deduped_and_batched(monkeypatch):
+    written = []
+
+    async def fake_set_enrichments(db_path, items):
+        written.append([incident_id for incident_id, _ in items])
+
+    monkeypatch.setattr(osv_enrichment, "set_enrichments", fake_set_enrichments)
+    queue = EnrichmentQueue()
+    irrelevant = {"kind": "workflow_failure", "tags": ["ci"], "evidence": {}}
+
+    for i in range(osv_enrichment.NA_FLUSH_SIZE - 1):
+        await osv_enrichment.maybe_enqueue_enrichment({**irrelevant, "incident_id": f"i{i}"}, queue, "db")
+        await osv_enrichment.maybe_enqueue_enrichment({**irrelevant, "incident_id": f"i{i}"}, queue, "db")
+    assert written == []
+
+    await osv_enrichment.maybe_enqueue_enrichment({**irrelevant, "incident_id": "last"}, queue, "db")
+    assert len(written) == 1 and len(written[0]) == osv_enrichment.NA_FLUSH_SIZE
+
+    await osv_enrichment.maybe_enqueue_enrichment({**irrelevant, "incident_id": "straggler"}, queue, "db")
+    await osv_enrichment.flush_not_applicable("db", queue, force=True)
+    assert written[-1] == ["straggler"]
+
+@pytest.mark.asyncio
+async def test_not_applicable_flush_keeps_ids_when_write_fails(monkeypatch):
+    written = []
+    fail = True
+
+    async def flaky_set_enrichments(db_path, items):
+        if fail:
+            raise RuntimeError("database is locked")
+        written.append([incident_id for incident_id, _ in items])
+
+    monkeypatch.setattr(osv_enrichment, "set_enrichments", flaky_set_enrichments)
+    queue = EnrichmentQueue()
+    queue.mark_not_applicable("a")
+    queue.mark_not_applicable("b")
+
+    with pytest.raises(RuntimeError):
+        await osv_enrichment.flush_not_applicable("db", queue, force=True)
+    # already marked, so this doesn't re-add "a"; only the restored pending list can still write it
+    assert queue.mark_not_applicable("a") is False
+    queue.mark_not_applicable("c")
+
+    fail = False
+    await osv_enrichment.flush_not_applicable("db", queue, force=True)
+    assert written == [["a", "b", "c"]]
+
+@pytest.mark.asyncio
+async def test_osv_worker_survives_a_failing_batch(monkeypatch):
+    calls = []
+    second_batch = asyncio.Event()
+
+    async def flaky_headers(db_path, batch):
+        calls.append(list(batch))
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        second_batch.set()
+        return {}
+
+    monkeypatch.setattr(osv_enrichment, "_fetch_incident_headers", flaky_headers)
+    queue = EnrichmentQueue()
+    queue.enqueue("a")
+    task = asyncio.create_task(osv_enrichment.osv_worker_loop("db", queue, None, None))
+    try:
+        await asyncio.sleep(0)
+        queue.enqueue("b")
+        await asyncio.wait_for(second_batch.wait(), timeout=2)
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    assert calls == [["a"], ["b"]]
@@ -1,4 +1,4 @@
-import base64
+import binascii
 
 import pytest
 
@@ -6,7 +6,10 @@ from app.signals.workflow_exfiltration import FetchBudget, detect_personalized_e
 
 class DummyGitHub:
     def __init__(self, contents_map, repo_meta):
-        self._contents = contents_map
+        # path -> ref -> blob
+        self._contents = {}
+        for (path, ref), blob in contents_map.items():
+            self._contents.setdefault(path, {})[ref] = blob
         self._repo_meta = repo_meta
 
     async def get_repo(self, owner, repo):
@@ -16,10 +19,10 @@ class DummyGitHub:
         return {"files": [{"filename": ".github/workflows/ci.yml"}]}
 
     async def get_contents(self, owner, repo, path, ref=None):
-        return self._contents[(path, ref)]
+        return self._contents[path][ref]
 
 def _b64(text: str) -> str:
-    return base64.b64encode(text.encode("utf-8")).decode("utf-8")
+    return binascii.b2a_base64(text.encode("utf-8"), newline=False).decode("ascii")
 
 @pytest.mark.asyncio
 async def test_personalized_exfiltration_emits_incident():
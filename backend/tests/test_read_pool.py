@@ -0,0 +1,28 @@
+import asyncio
+
+import aiosqlite
+import pytest
+
+from app.db import ReadPool, init_db
+
+@pytest.mark.asyncio
+async def test_read_pool_reuses_and_caps_connections(tmp_path):
+    db_path = str(tmp_path / "app.db")
+    await init_db(db_path)
+    pool = ReadPool(db_path, size=2)
+    try:
+        async def read():
+            async with pool.acquire() as db:
+                cur = await db.execute("SELECT count(*) FROM incidents")
+                (count,) = await cur.fetchone()
+                await asyncio.sleep(0.01)
+                return count
+
+        assert await asyncio.gather(*(read() for _ in range(6))) == [0] * 6
+        assert len(pool._conns) == 2
+
+        async with pool.acquire() as db:
+            with pytest.raises(aiosqlite.OperationalError):
+                await db.execute("DELETE FROM incidents")
+    finally:
+        await pool.close()
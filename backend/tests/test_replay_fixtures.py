@@ -11,7 +11,7 @@ class DummyBroadcaster:
     def __init__(self):
         self.cards = []
 
-    async def publish(self, card):
+    def publish(self, card):
         self.cards.append(card)
 
 @pytest.mark.asyncio
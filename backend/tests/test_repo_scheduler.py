@@ -0,0 +1,16 @@
+from app.repos import RepoScheduler
+
+def test_scheduler_picks_due_high_traffic_in_order_then_recent(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.repos.time.time", lambda: now[0])
+    scheduler = RepoScheduler(["a/one", "b/two", "c/three", "a/one"], min_interval_seconds=30)
+    scheduler.add_recent_repo("a/one")
+    scheduler.add_recent_repo("d/four")
+
+    assert scheduler.next_batch(2) == ["a/one", "b/two"]
+    # a/one was just checked, so its recent-queue entry is skipped
+    assert scheduler.next_batch(5) == ["c/three", "d/four"]
+    assert scheduler.next_batch(5) == []
+
+    now[0] += 30
+    assert scheduler.next_batch(5) == ["a/one", "b/two", "c/three"]
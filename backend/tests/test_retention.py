@@ -0,0 +1,29 @@
+import pytest
+
+from app.check_runs import run_to_incident
+from app.db import close_writers, get_writer, init_db
+from app.incidents import insert_incident
+from app.retention import purge_old_incidents
+
+@pytest.mark.asyncio
+async def test_purge_is_disabled_for_non_positive_days(tmp_path):
+    db_path = str(tmp_path / "app.db")
+    await init_db(db_path)
+    run = {
+        "id": 1,
+        "name": "CI",
+        "conclusion": "failure",
+        "status": "completed",
+        "html_url": "https://example.com/runs/1",
+        "run_number": 1,
+        "created_at": "2024-01-01T00:00:00Z",
+        "updated_at": "2024-01-01T00:00:00Z",
+    }
+    assert await insert_incident(db_path, run_to_incident(run, "owner/repo"))
+    try:
+        assert await purge_old_incidents(db_path, 0) == 0
+        assert await purge_old_incidents(db_path, -5) == 0
+        assert await purge_old_incidents(db_path, 30) == 0
+        assert (await get_writer(db_path).fetchone("SELECT COUNT(*) FROM incidents"))[0] == 1
+    finally:
+        await close_writers()
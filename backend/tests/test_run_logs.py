@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from app.services.run_logs import RunLogFetcher
+
+class FakeGitHub:
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.in_flight = 0
+        self.peak = 0
+
+    async def list_jobs_for_workflow_run(self, owner, repo, run_id):
+        return {"jobs": self.jobs}
+
+    async def get_job_logs(self, owner, repo, job_id):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if job_id == 3:
+            raise RuntimeError("gone")
+        return f"log {job_id}"
+
+@pytest.mark.asyncio
+async def test_fetch_run_logs_fetches_jobs_concurrently_in_order():
+    gh = FakeGitHub([{"id": i, "name": f"job-{i}"} for i in range(1, 6)])
+    fetcher = RunLogFetcher(gh, per_minute=100, job_concurrency=2)
+
+    logs = await fetcher.fetch_run_logs("org", "repo", 42)
+
+    assert [entry["job_name"] for entry in logs] == ["job-1", "job-2", "job-4", "job-5"]
+    assert gh.peak == 2
+    # cached: no second round of fetches
+    assert await fetcher.fetch_run_logs("org", "repo", 42) is logs
+
+@pytest.mark.asyncio
+async def test_fetch_run_logs_stops_at_rate_limit():
+    gh = FakeGitHub([{"id": i, "name": f"job-{i}"} for i in range(1, 6)])
+    # one token for the jobs listing, two for logs
+    fetcher = RunLogFetcher(gh, per_minute=3)
+
+    logs = await fetcher.fetch_run_logs("org", "repo", 42)
+
+    assert [entry["job_name"] for entry in logs] == ["job-1", "job-2"]
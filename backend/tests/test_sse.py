@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+
+from app.sse import IncidentBroadcaster, encode_frame
+
+@pytest.mark.asyncio
+async def test_subscriber_catches_up_in_one_frame():
+    broadcaster = IncidentBroadcaster(queue_size=4)
+    stream = broadcaster.subscribe()
+    first = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0)
+
+    broadcaster.publish({"incident_id": "a"})
+    assert await first == encode_frame({"incident_id": "a"})
+
+    # three frames published while the client wasn't reading arrive together, in order
+    cards = [{"incident_id": i} for i in ("b", "c", "d")]
+    broadcaster.publish_many(cards)
+    assert await stream.__anext__() == b"".join(encode_frame(c) for c in cards)
+
+    # a client that fell off the ring only gets what's still in it
+    broadcaster.publish_many([{"incident_id": str(i)} for i in range(6)])
+    assert await stream.__anext__() == b"".join(encode_frame({"incident_id": str(i)}) for i in range(2, 6))
+    await stream.aclose()
@@ -0,0 +1,47 @@
+import aiosqlite
+import orjson
+import pytest
+
+from app import main
+from app.check_runs import run_to_incident
+from app.db import close_read_pools, close_writers, get_read_pool, init_db
+from app.incidents import insert_incident
+from app.main import SUMMARY_SQL
+
+@pytest.mark.asyncio
+async def test_summary_query_walks_inserted_at_index(tmp_path):
+    db_path = str(tmp_path / "app.db")
+    await init_db(db_path)
+    async with aiosqlite.connect(db_path) as db:
+        cur = await db.execute("EXPLAIN QUERY PLAN " + SUMMARY_SQL, ("2000-01-01", 100))
+        plan = " ".join(row[3] for row in await cur.fetchall())
+    assert "USING INDEX idx_incidents_inserted" in plan
+    # the index order serves ORDER BY inserted_at DESC; no separate sort pass
+    assert "TEMP B-TREE" not in plan
+
+@pytest.mark.asyncio
+async def test_summary_returns_whole_body_and_releases_connection(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "app.db")
+    await init_db(db_path)
+    run = {
+        "id": 123,
+        "name": "CI",
+        "conclusion": "failure",
+        "status": "completed",
+        "html_url": "https://example.com/runs/123",
+        "run_number": 7,
+        "created_at": "2024-01-01T00:00:00Z",
+        "updated_at": "2024-01-01T00:00:00Z",
+    }
+    assert await insert_incident(db_path, run_to_incident(run, "owner/repo"))
+    monkeypatch.setattr(main, "DB_PATH", db_path)
+
+    try:
+        resp = await main.summary(since="2000-01-01", limit=10)
+        # the pool slot is back before the client reads a byte
+        assert get_read_pool(db_path)._idle.qsize() == 1
+        cards = orjson.loads(resp.body)["cards"]
+        assert [c["repo_full_name"] for c in cards] == ["owner/repo"]
+    finally:
+        await close_read_pools()
+        await close_writers()
@@ -3,19 +3,22 @@ import json
 from contextlib import suppress
 
 import pytest
+import redis.asyncio as redis
 
 from app.check_runs import run_to_incident
 from app.config import settings
 from app.incidents import insert_incident
 from app.db import connect, init_db
-from app.summary_queue import SummaryQueue, summary_worker_loop
+from app.summary_queue import RedisSummaryQueue, SummaryQueue, summary_worker_loop
 
 class DummyBroadcaster:
     def __init__(self):
         self.cards = []
+        self.published = asyncio.Event()
 
-    async def publish(self, incident):
+    def publish(self, incident):
         self.cards.append(incident)
+        self.published.set()
 
 @pytest.mark.asyncio
 async def test_summary_worker_persists_summary(tmp_path):
@@ -33,6 +36,7 @@ async def test_summary_worker_persists_summary(tmp_path):
         "updated_at": "2024-01-01T00:00:00Z",
     }
     inc = run_to_incident(run, "owner/repo")
+    inc["why_this_fired"] = "set at insert"
     inserted = await insert_incident(str(db_path), inc)
     assert inserted is True
 
@@ -43,22 +47,23 @@ async def test_summary_worker_persists_summary(tmp_path):
 
     task = asyncio.create_task(summary_worker_loop(str(db_path), queue, broadcaster))
 
-    summary_json = None
-    for _ in range(20):
-        async with connect(str(db_path)) as db:
-            cur = await db.execute(
-                "SELECT summary_json FROM incidents WHERE incident_id = ?",
-                (inc["incident_id"],),
-            )
-            row = await cur.fetchone()
-            summary_json = row[0] if row else None
-        if summary_json:
-            break
-        await asyncio.sleep(0.05)
-
-    task.cancel()
-    with suppress(asyncio.CancelledError):
-        await task
+    # the worker publishes only after the UPDATE, so one read afterwards sees the summary
+    try:
+        await asyncio.wait_for(broadcaster.published.wait(), timeout=2)
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+    async with connect(str(db_path)) as db:
+        cur = await db.execute(
+            "SELECT summary_json, why_this_fired FROM incidents WHERE incident_id = ?",
+            (inc["incident_id"],),
+        )
+        row = await cur.fetchone()
+    summary_json = row[0] if row else None
+    # the worker writes summary_json only
+    assert row[1] == "set at insert"
 
     assert summary_json is not None
     summary = json.loads(summary_json)
@@ -74,3 +79,110 @@ async def test_summary_queue_fifo():
     await queue.enqueue("b")
     assert await queue.dequeue() == "a"
     assert await queue.dequeue() == "b"
+
+@pytest.mark.asyncio
+async def test_summary_queue_dequeue_batch():
+    queue = SummaryQueue()
+    for incident_id in ("a", "b", "a", "c"):
+        await queue.enqueue(incident_id)
+    assert await queue.dequeue_batch(3) == ["a", "b"]
+    assert await queue.dequeue_batch(3) == ["c"]
+
+@pytest.mark.asyncio
+async def test_summary_queue_wakes_waiting_consumer_and_drops_when_full():
+    queue = SummaryQueue(maxsize=2)
+    waiter = asyncio.create_task(queue.dequeue())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    await queue.enqueue("a")
+    assert await asyncio.wait_for(waiter, 1) == "a"
+
+    for incident_id in ("b", "c", "d"):
+        await queue.enqueue(incident_id)
+    assert await queue.dequeue_batch(5) == ["b", "c"]
+
+class FakeStreamRedis:
+    # just enough of XADD / XGROUP CREATE / XREADGROUP / XAUTOCLAIM / XACK for one stream and group
+    def __init__(self):
+        self.entries = []
+        self.group_offset = None
+        self.pending = {}   # entry id -> (consumer, delivered at)
+        self.acked = []
+        self.clock = 0.0
+        self.lists = {}
+
+    async def rpop(self, name):
+        items = self.lists.get(name)
+        return items.pop() if items else None
+
+    async def xadd(self, stream, fields, maxlen=None, approximate=True):
+        entry_id = f"{len(self.entries) + 1}-0"
+        self.entries.append((entry_id, dict(fields)))
+        return entry_id
+
+    async def xgroup_create(self, stream, group, id="$", mkstream=False):
+        if self.group_offset is not None:
+            raise redis.ResponseError("BUSYGROUP Consumer Group name already exists")
+        self.group_offset = 0 if id == "0" else len(self.entries)
+
+    async def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        new = self.entries[self.group_offset:self.group_offset + count]
+        self.group_offset += len(new)
+        for entry_id, _fields in new:
+            self.pending[entry_id] = (consumer, self.clock)
+        return [("summary_stream", new)] if new else []
+
+    async def xautoclaim(self, stream, group, consumer, min_idle_time, start_id="0-0", count=None):
+        fields = dict(self.entries)
+        claimed = []
+        for entry_id, (_owner, delivered) in list(self.pending.items()):
+            if (self.clock - delivered) * 1000 >= min_idle_time and len(claimed) < count:
+                self.pending[entry_id] = (consumer, self.clock)
+                claimed.append((entry_id, fields[entry_id]))
+        return ["0-0", claimed, []]
+
+    async def xack(self, stream, group, *entry_ids):
+        self.acked.extend(entry_ids)
+        for entry_id in entry_ids:
+            self.pending.pop(entry_id, None)
+        return len(entry_ids)
+
+def _redis_queue(fake, consumer):
+    queue = RedisSummaryQueue("redis://localhost:6379/0")
+    queue._redis = fake
+    queue._consumer = consumer
+    return queue
+
+@pytest.mark.asyncio
+async def test_redis_summary_queue_delivers_reclaims_and_acks():
+    fake = FakeStreamRedis()
+    # already in the stream before any queue (or group) exists, e.g. from before a restart
+    await fake.xadd("summary_stream", {"incident_id": "old"})
+
+    worker = _redis_queue(fake, "worker-1")
+    for incident_id in ("a", "b", "a"):
+        await worker.enqueue(incident_id)
+
+    # enqueued before the first dequeue, yet delivered; the repeated "a" comes back once
+    assert await worker.dequeue_batch(10) == ["old", "a", "b"]
+    await worker.ack(["a"])
+    assert fake.acked == ["2-0", "4-0"]
+
+    # worker-1 dies holding "old" and "b"; once idle long enough another worker claims them
+    other = _redis_queue(fake, "worker-2")
+    fake.clock += 61
+    assert await other.dequeue_batch(10) == ["old", "b"]
+    await other.ack(["old", "b"])
+    assert fake.acked == ["2-0", "4-0", "1-0", "3-0"]
+    assert not fake.pending
+
+@pytest.mark.asyncio
+async def test_redis_summary_queue_drains_legacy_list_once():
+    fake = FakeStreamRedis()
+    # the old queue LPUSHed, so the oldest job is at the right end
+    fake.lists["summary_jobs"] = ["newer", "older"]
+
+    worker = _redis_queue(fake, "worker-1")
+    await worker.enqueue("fresh")
+    assert fake.lists["summary_jobs"] == []
+    assert await worker.dequeue_batch(10) == ["older", "newer", "fresh"]